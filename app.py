@@ -1,26 +1,74 @@
 import os
+import time
 import logging
 import json
 from datetime import datetime
-from flask import Flask, render_template, jsonify, request
-from mt5_connector import MT5Connector
-from data_manager import DataManager
+from flask import Flask, Response, g, render_template, jsonify, request, stream_with_context
+from data_manager import data_manager_from_env
+from recorder_service import Recorder, RecorderClient, parse_address, recorder_authkey
+from resampler import CandleResampler
+from downsample import DEFAULT_PAGE_POINTS, chart_page
+from indicators import IndicatorEngine
+from quality import QualityScanner
+from candle_stream import CandleBroadcaster
+from metrics import REGISTRY, HTTP_REQUEST_SECONDS, WEB_METRICS
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
 # Create Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "fallback_secret_key")
 
-# Initialize MT5 connector and data manager
-mt5_connector = None
-data_manager = DataManager()
+# Reads go straight to the data files, from every web process; only the
+# process that records replays the write-ahead log
+data_manager = data_manager_from_env(writer=not os.environ.get("RECORDER_ADDRESS"))
 
-# Global variable to track recording status
-recording = False
-current_symbol = None
+# With RECORDER_ADDRESS set, the MT5 connection and recording live in the
+# separate recorder process (python recorder_service.py, started by
+# gunicorn.conf.py) and this process forwards commands to it. Otherwise the
+# recorder runs in this process, as for the development server.
+if os.environ.get("RECORDER_ADDRESS"):
+    recorder = RecorderClient(parse_address(os.environ["RECORDER_ADDRESS"]), recorder_authkey())
+    
+    # Candles saved by the recorder still reach this process's listeners
+    recorder.follow(data_manager)
+else:
+    recorder = Recorder(data_manager)
+
+# Higher timeframes are rolled up from the recorded M1 data on demand
+candle_resampler = CandleResampler(data_manager)
+
+# Indicators of every recorded stream are updated as its candles arrive
+indicator_engine = IndicatorEngine(data_manager)
+
+# Gaps, duplicates and out-of-order bars, checked incrementally on request
+quality_scanner = QualityScanner(data_manager)
+
+# New candles are pushed to dashboards over Server-Sent Events
+candle_broadcaster = CandleBroadcaster(data_manager)
+
+REGISTRY.gauge_callback('mt5_stream_subscribers', 'Connected Server-Sent Events clients', (),
+                        lambda: {(): candle_broadcaster.subscriber_count()})
+
+if data_manager.query_cache is not None:
+    REGISTRY.gauge_callback('mt5_query_cache', 'Historical query cache entries, bytes, hits and misses', ('stat',),
+                            lambda: {(name,): value for name, value in data_manager.query_cache.stats().items()})
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    """Observe the request latency per route template"""
+    if 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(
+            time.perf_counter() - g.request_start
+        )
+    return response
 
 @app.route('/')
 def index():
@@ -30,33 +78,20 @@ def index():
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """Return the current connection and recording status"""
-    global mt5_connector, recording
+    global recorder
     
-    connected = mt5_connector is not None and mt5_connector.is_connected()
-    
-    return jsonify({
-        'connected': connected,
-        'recording': recording,
-        'current_symbol': current_symbol,
-        'last_update': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    })
+    status = recorder.status()
+    status['last_update'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return jsonify(status)
 
 @app.route('/api/connect', methods=['POST'])
 def connect_mt5():
     """Connect to MT5 terminal"""
-    global mt5_connector
+    global recorder
     
     try:
         data = request.json
-        path = data.get('path', '')
-        
-        mt5_connector = MT5Connector(path)
-        success = mt5_connector.connect()
-        
-        if success:
-            return jsonify({'success': True, 'message': 'Connected to MT5 successfully'})
-        else:
-            return jsonify({'success': False, 'message': 'Failed to connect to MT5'})
+        return jsonify(recorder.connect(data.get('path', '')))
     except Exception as e:
         logger.error(f"Error connecting to MT5: {str(e)}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
@@ -64,18 +99,11 @@ def connect_mt5():
 @app.route('/api/disconnect', methods=['POST'])
 def disconnect_mt5():
     """Disconnect from MT5 terminal"""
-    global mt5_connector, recording
+    global recorder
     
     try:
-        if mt5_connector:
-            if recording:
-                stop_recording()
-            
-            mt5_connector.disconnect()
-            mt5_connector = None
-            return jsonify({'success': True, 'message': 'Disconnected from MT5'})
-        else:
-            return jsonify({'success': False, 'message': 'Not connected to MT5'})
+        # Disconnecting also stops every active recording stream
+        return jsonify(recorder.disconnect())
     except Exception as e:
         logger.error(f"Error disconnecting from MT5: {str(e)}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
@@ -83,14 +111,10 @@ def disconnect_mt5():
 @app.route('/api/symbols', methods=['GET'])
 def get_symbols():
     """Get available symbols from MT5"""
-    global mt5_connector
-    
-    if not mt5_connector or not mt5_connector.is_connected():
-        return jsonify({'success': False, 'message': 'Not connected to MT5'})
+    global recorder
     
     try:
-        symbols = mt5_connector.get_symbols()
-        return jsonify({'success': True, 'symbols': symbols})
+        return jsonify(recorder.symbols())
     except Exception as e:
         logger.error(f"Error getting symbols: {str(e)}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
@@ -113,76 +137,254 @@ def get_timeframes():
 
 @app.route('/api/start_recording', methods=['POST'])
 def start_recording():
-    """Start recording price data for a specific symbol and timeframe"""
-    global mt5_connector, recording, current_symbol, data_manager
+    """Start recording price data for a specific symbol and timeframe
     
-    if not mt5_connector or not mt5_connector.is_connected():
-        return jsonify({'success': False, 'message': 'Not connected to MT5'})
+    With source 'ticks' the symbol's tick stream is recorded instead, and
+    bars for every timeframe in the timeframes list are built from it.
+    """
+    global recorder
     
     try:
         data = request.json
         symbol = data.get('symbol', '')
-        timeframe = data.get('timeframe', 'M1')
         
         if not symbol:
             return jsonify({'success': False, 'message': 'Symbol is required'})
         
-        # Start the recording process
-        success = mt5_connector.start_recording(symbol, timeframe, data_manager)
-        
-        if success:
-            recording = True
-            current_symbol = symbol
-            return jsonify({'success': True, 'message': f'Started recording {symbol} ({timeframe})'})
-        else:
-            return jsonify({'success': False, 'message': 'Failed to start recording'})
+        return jsonify(recorder.start_recording(
+            symbol, data.get('timeframe', 'M1'), data.get('source'), data.get('timeframes')
+        ))
     except Exception as e:
         logger.error(f"Error starting recording: {str(e)}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
 
 @app.route('/api/stop_recording', methods=['POST'])
 def stop_recording():
-    """Stop recording price data"""
-    global mt5_connector, recording, current_symbol
-    
-    if not mt5_connector or not mt5_connector.is_connected():
-        return jsonify({'success': False, 'message': 'Not connected to MT5'})
+    """Stop recording price data for one stream, one symbol, or all streams"""
+    global recorder
     
     try:
-        if recording:
-            mt5_connector.stop_recording()
-            recording = False
-            current_symbol = None
-            return jsonify({'success': True, 'message': 'Stopped recording'})
-        else:
-            return jsonify({'success': False, 'message': 'Not currently recording'})
+        # An empty body stops every stream
+        data = request.get_json(silent=True) or {}
+        symbol = data.get('symbol') or None
+        timeframe = data.get('timeframe') or None
+        
+        return jsonify(recorder.stop_recording(symbol, timeframe, data.get('source')))
     except Exception as e:
         logger.error(f"Error stopping recording: {str(e)}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
 
+@app.route('/api/backfill', methods=['POST'])
+def start_backfill():
+    """Download history for symbols and timeframes between start and end"""
+    global recorder
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        symbols = data.get('symbols') or []
+        timeframes = data.get('timeframes') or ['M1']
+        start = data.get('start')
+        end = data.get('end') or None
+        
+        if not symbols or not start:
+            return jsonify({'success': False, 'message': 'Symbols and start are required'})
+        
+        return jsonify(recorder.start_backfill(symbols, timeframes, start, end))
+    except Exception as e:
+        logger.error(f"Error starting backfill: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+@app.route('/api/backfill', methods=['GET'])
+def get_backfill_status():
+    """Get the progress of the current or last backfill"""
+    global recorder
+    
+    return jsonify({'success': True, 'backfill': recorder.backfill_status()})
+
+@app.route('/api/backfill/stop', methods=['POST'])
+def stop_backfill():
+    """Stop the running backfill"""
+    global recorder
+    
+    return jsonify(recorder.stop_backfill())
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose recorder, storage and API metrics in the Prometheus text format
+    
+    API metrics are this process's own; the rest come from the recorder.
+    """
+    global recorder
+    
+    return Response(recorder.metrics() + REGISTRY.render(names=WEB_METRICS), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/latest_data', methods=['GET'])
 def get_latest_data():
-    """Get the latest recorded data"""
-    global data_manager
+    """Get the latest recorded data, optionally for one symbol/timeframe
+    
+    indicators=1 adds the configured indicator values to every candle.
+    """
+    global recorder
     
     try:
-        latest_data = data_manager.get_latest_data(10)  # Get the latest 10 candles
+        symbol = request.args.get('symbol') or None
+        timeframe = request.args.get('timeframe') or None
+        count = request.args.get('count', 10, type=int)  # Default to the latest 10 candles
+        
+        # The recent-candle rings are filled by the recorder
+        latest_data = recorder.latest_data(count, symbol, timeframe)
+        if request.args.get('indicators') == '1':
+            latest_data = indicator_engine.annotate_latest(latest_data)
         return jsonify({'success': True, 'data': latest_data})
     except Exception as e:
         logger.error(f"Error getting latest data: {str(e)}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
 
+@app.route('/api/stream', methods=['GET'])
+def stream_candles():
+    """Stream newly recorded candles as Server-Sent Events
+    
+    Optional comma-separated symbols and timeframes query parameters limit
+    the stream to those candles. Answers 503 once STREAM_MAX_SUBSCRIBERS
+    streams are open in this process.
+    """
+    global candle_broadcaster
+    
+    symbols = [s for s in request.args.get('symbols', '').split(',') if s]
+    timeframes = [t for t in request.args.get('timeframes', '').split(',') if t]
+    subscriber = candle_broadcaster.subscribe(symbols, timeframes)
+    if subscriber is None:
+        # Every stream holds a server thread; refuse rather than starve the API
+        return jsonify({'success': False, 'message': 'Too many open candle streams'}), 503
+    
+    def generate():
+        try:
+            yield from subscriber.messages()
+        finally:
+            # Runs when the client disconnects or the stream is closed
+            candle_broadcaster.unsubscribe(subscriber)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/saved_files', methods=['GET'])
 def get_saved_files():
-    """Get list of saved CSV files"""
+    """Get saved files, newest first
+    
+    Optional symbol and timeframe query parameters filter the list, and
+    offset/limit select a page of it.
+    """
     global data_manager
     
     try:
-        files = data_manager.get_saved_files()
-        return jsonify({'success': True, 'files': files})
+        symbol = request.args.get('symbol') or None
+        timeframe = request.args.get('timeframe') or None
+        offset = max(0, request.args.get('offset', 0, type=int))
+        limit = request.args.get('limit', type=int)
+        
+        result = data_manager.query_saved_files(symbol, timeframe, offset, limit)
+        return jsonify({
+            'success': True,
+            'files': result['files'],
+            'total': result['total'],
+            'offset': offset,
+            'limit': limit
+        })
     except Exception as e:
         logger.error(f"Error getting saved files: {str(e)}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
 
+@app.route('/api/candles', methods=['GET'])
+def get_candles():
+    """Get candles for a symbol, resampled from M1 to the requested timeframe
+    
+    indicators=1 adds indicator values computed over the timeframe's full
+    history.
+    """
+    global candle_resampler
+    
+    try:
+        symbol = request.args.get('symbol', '')
+        timeframe = request.args.get('timeframe', 'M1')
+        start = request.args.get('start') or None
+        end = request.args.get('end') or None
+        
+        if not symbol:
+            return jsonify({'success': False, 'message': 'Symbol is required'})
+        
+        candles = candle_resampler.get_candles(symbol, timeframe, start, end)
+        if request.args.get('indicators') == '1':
+            candles = indicator_engine.annotate_frame(candle_resampler.get_frame(symbol, timeframe), candles)
+        return jsonify({'success': True, 'symbol': symbol, 'timeframe': timeframe, 'candles': candles})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    except Exception as e:
+        logger.error(f"Error getting candles: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+@app.route('/api/chart', methods=['GET'])
+def get_chart():
+    """Get a downsampled candle series for charting
+    
+    width is the number of points wanted for the whole start/end range,
+    method is 'lttb' or 'minmax', and cursor continues from the next_cursor
+    of a previous page. Candles are returned as columns with unix times.
+    """
+    global data_manager
+    
+    try:
+        symbol = request.args.get('symbol', '')
+        timeframe = request.args.get('timeframe', 'M1')
+        if not symbol:
+            return jsonify({'success': False, 'message': 'Symbol is required'})
+        
+        page = chart_page(
+            data_manager,
+            symbol,
+            timeframe,
+            request.args.get('width', 1000, type=int),
+            method=request.args.get('method', 'lttb'),
+            start_date=request.args.get('start') or None,
+            end_date=request.args.get('end') or None,
+            cursor=request.args.get('cursor', type=int),
+            page_points=request.args.get('limit', DEFAULT_PAGE_POINTS, type=int)
+        )
+        if page is None:
+            return jsonify({'success': False, 'message': f'No data for {symbol} ({timeframe})'})
+        return jsonify({'success': True, **page})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    except Exception as e:
+        logger.error(f"Error getting chart data: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+@app.route('/api/quality', methods=['GET', 'POST'])
+def get_quality():
+    """Get gap, duplicate and ordering checks of the stored streams
+    
+    GET returns the last findings without reading any data. POST, or GET
+    with scan=1, scans the streams from where the previous scan stopped;
+    rescan=1 starts over from their first rows. symbol and timeframe limit
+    the streams.
+    """
+    try:
+        params = request.args.to_dict()
+        if request.method == 'POST':
+            params.update(request.get_json(silent=True) or {})
+        
+        symbol = params.get('symbol') or None
+        timeframe = params.get('timeframe') or None
+        if request.method == 'POST' or params.get('scan') == '1':
+            streams = quality_scanner.scan(symbol, timeframe, rescan=params.get('rescan') in ('1', 1, True))
+        else:
+            streams = quality_scanner.reports(symbol, timeframe)
+        return jsonify({'success': True, 'streams': streams})
+    except Exception as e:
+        logger.error(f"Error checking data quality: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
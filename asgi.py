@@ -0,0 +1,249 @@
+import os
+import sys
+import asyncio
+import logging
+import threading
+from io import BytesIO
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+import app as web
+from recorder_service import Recorder
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Answered on the event loop; with an in-process recorder they only read memory
+MEMORY_ROUTES = ('/api/status', '/api/latest_data', '/api/timeframes')
+
+# Historical queries and file scans, run in the bounded query pool
+QUERY_ROUTES = ('/api/candles', '/api/chart', '/api/quality', '/api/saved_files')
+
+# Query parameters that make a memory route read stored history, such as
+# indicators warmed up from a stream's candles; those requests use the query pool
+HISTORY_PARAMS = {'indicators': '1'}
+
+# Threads for historical queries; more would only contend for the GIL and the disk
+QUERY_WORKERS = int(os.environ.get('ASGI_QUERY_WORKERS', str(os.cpu_count() or 1)))
+
+# Threads for every other request, including one per open event stream
+IO_WORKERS = int(os.environ.get('ASGI_IO_WORKERS', '128'))
+
+# io threads kept for recorder commands and other requests; event streams may
+# use the rest unless STREAM_MAX_SUBSCRIBERS sets another limit
+IO_RESERVED_WORKERS = 16
+
+# Queued after the last chunk of a response body
+_END = object()
+
+def _environ(scope, body):
+    """WSGI environ for an ASGI HTTP request"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    
+    # The body has been read in full, so its length is known even if it was chunked
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+def _reads_history(scope):
+    """Check whether a request asks a memory route for stored history"""
+    params = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return any(value in params.get(name, ()) for name, value in HISTORY_PARAMS.items())
+
+def _start_message(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    }
+
+class AsyncApp:
+    """ASGI front end for the Flask app
+    
+    Every response still comes from the Flask routes, so the JSON contract
+    is the same as under WSGI; only where a request runs differs. Cheap
+    in-memory routes are answered on the event loop unless HISTORY_PARAMS
+    ask them for stored history; historical queries and file scans run in
+    a bounded thread pool so a slow read cannot hold up
+    other clients, and the remaining requests (recorder commands, event
+    streams) run in a second pool, where each open event stream occupies a
+    thread for its whole life. A streamed response is closed at its next
+    chunk after the client disconnects.
+    """
+    
+    def __init__(self, wsgi_app, inline_routes=(), query_routes=QUERY_ROUTES,
+                 query_workers=QUERY_WORKERS, io_workers=IO_WORKERS):
+        self.wsgi_app = wsgi_app
+        self.inline_routes = set(inline_routes)
+        self.query_routes = set(query_routes)
+        self.query_pool = ThreadPoolExecutor(max_workers=query_workers, thread_name_prefix='asgi-query')
+        self.io_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix='asgi-io')
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+        
+        body = await self._read_body(receive)
+        environ = _environ(scope, body)
+        
+        reads_history = _reads_history(scope)
+        if scope['method'] == 'GET' and scope['path'] in self.inline_routes and not reads_history:
+            status, headers, content = self._respond(environ)
+            await send(_start_message(status, headers))
+            await send({'type': 'http.response.body', 'body': content})
+            return
+        
+        query = scope['path'] in self.query_routes or reads_history
+        pool = self.query_pool if query else self.io_pool
+        await self._stream(environ, pool, receive, send)
+    
+    async def _read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        return b''.join(chunks)
+    
+    def _respond(self, environ):
+        """Run the WSGI app to completion; returns (status, headers, body)"""
+        response = []
+        
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+        
+        result = self.wsgi_app(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response[0], response[1], content
+    
+    async def _stream(self, environ, pool, receive, send):
+        """Run the WSGI app in a pool thread and send its body as it is produced"""
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        disconnected = threading.Event()
+        
+        def put(item):
+            loop.call_soon_threadsafe(chunks.put_nowait, item)
+        
+        def produce():
+            response = []
+            
+            def start_response(status, headers, exc_info=None):
+                response[:] = [status, headers]
+            
+            result = None
+            try:
+                result = self.wsgi_app(environ, start_response)
+                started = False
+                for chunk in result:
+                    if not started:
+                        put(('start', *response))
+                        started = True
+                    if chunk:
+                        put(('body', chunk))
+                    if disconnected.is_set():
+                        break
+                if not started:
+                    put(('start', *response))
+            
+            except Exception as e:
+                logger.error(f"Error serving {environ['PATH_INFO']}: {str(e)}")
+            
+            finally:
+                # Closing ends generators such as the event stream's subscription
+                if result is not None and hasattr(result, 'close'):
+                    result.close()
+                put(_END)
+        
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+        
+        producer = loop.run_in_executor(pool, produce)
+        watcher = asyncio.ensure_future(watch_disconnect())
+        started = False
+        try:
+            while True:
+                item = await chunks.get()
+                if item is _END:
+                    break
+                if item[0] == 'start':
+                    await send(_start_message(item[1], item[2]))
+                    started = True
+                else:
+                    await send({'type': 'http.response.body', 'body': item[1], 'more_body': True})
+            
+            if not started:
+                await send(_start_message('500 Internal Server Error', [('Content-Type', 'text/plain')]))
+            await send({'type': 'http.response.body', 'body': b''})
+        
+        finally:
+            disconnected.set()
+            watcher.cancel()
+            await producer
+    
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.query_pool.shutdown(wait=False)
+                self.io_pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+# uvicorn asgi:application
+#
+# With the recorder in another process the memory routes ask it over a
+# socket, so they are run in the pool instead of on the event loop.
+#
+# Every open /api/stream keeps one io thread busy until the client leaves,
+# so streams beyond the cap below are answered with 503.
+if not os.environ.get('STREAM_MAX_SUBSCRIBERS'):
+    web.candle_broadcaster.max_subscribers = max(IO_WORKERS - IO_RESERVED_WORKERS, 1)
+
+application = AsyncApp(
+    web.app,
+    inline_routes=MEMORY_ROUTES if isinstance(web.recorder, Recorder) else ()
+)
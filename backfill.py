@@ -0,0 +1,277 @@
+import os
+import time
+import zlib
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from market_simulator import SyntheticMarket
+from mt5_connector import (
+    TIMEFRAME_D1, TIMEFRAME_W1, TIMEFRAME_MN1,
+    next_boundary, format_bar_times, parse_bar_time
+)
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Bars generated per task; also the size of each batch written to storage
+DEFAULT_CHUNK_BARS = 100_000
+
+def bar_times(tf_minutes, start, end):
+    """Open times of the bars in [start, end) while the forex market is open
+    
+    The market is treated as closed from Friday 22:00 to Sunday 22:00 UTC,
+    so intraday and daily bars in that window are skipped.
+    """
+    if tf_minutes in (TIMEFRAME_W1, TIMEFRAME_MN1):
+        # Calendar timeframes: walk the few boundaries one by one
+        times = []
+        current = next_boundary(start - 1, tf_minutes)
+        while current < end:
+            times.append(current)
+            current = next_boundary(current, tf_minutes)
+        return np.array(times, dtype='<i8')
+    
+    period = tf_minutes * 60
+    first = -(-int(start) // period) * period
+    times = np.arange(first, end, period, dtype='<i8')
+    
+    # Monday is day 0; the epoch fell on a Thursday
+    weekday = (times // 86400 + 3) % 7
+    hour = times % 86400 // 3600
+    closed = (weekday == 5) | ((weekday == 4) & (hour >= 22)) | ((weekday == 6) & (hour < 22))
+    if tf_minutes >= TIMEFRAME_D1:
+        closed = weekday >= 5
+    return times[~closed]
+
+def generate_rates(seed, symbol, price, tf_minutes, start, end):
+    """Simulate the bars in [start, end) as a CANDLE_DTYPE array
+    
+    Bars come from a SyntheticMarket of the one symbol opening at its base
+    price, and are returned relative to an opening price of 1.0 so callers
+    scale them to the price they continue from. Module level so it can run
+    in a worker process.
+    """
+    market = SyntheticMarket([symbol], {symbol: price}, seed=seed)
+    records = market.generate_bars(tf_minutes, bar_times(tf_minutes, start, end))[symbol]
+    for field in ('open', 'high', 'low', 'close'):
+        records[field] /= price
+    return records
+
+class BackfillTask:
+    """One chunk of one stream's history"""
+    
+    __slots__ = ('symbol', 'timeframe', 'tf_minutes', 'start', 'end', 'last', 'before')
+    
+    def __init__(self, symbol, timeframe, tf_minutes, start, end, last, before=False):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.tf_minutes = tf_minutes
+        self.start = start
+        self.end = end
+        
+        # Whether this is the final chunk of its stream
+        self.last = last
+        
+        # Whether the chunk precedes the stream's stored history
+        self.before = before
+    
+    def seed(self):
+        """Deterministic seed so a chunk is reproducible"""
+        return zlib.crc32(f"{self.symbol}_{self.timeframe}_{self.start}".encode())
+
+class HistoryBackfill:
+    """Fills stored history for many symbols and timeframes in bulk
+    
+    Each stream is split into chunks of chunk_bars bars that are generated
+    in a process pool. The range after a stream's stored history is written
+    oldest chunk first through DataManager.save_candles, continuing from the
+    last stored close. The range before it is written newest chunk first
+    through DataManager.prepend_candles, each chunk priced backwards so it
+    closes at the open of the candle after it. An interrupted backfill
+    therefore resumes at both ends of what is stored.
+    
+    Streams must not be recorded live while they are backfilled; see
+    MT5Connector.start_backfill.
+    """
+    
+    def __init__(self, data_manager, streams, start, end, base_prices,
+                 max_workers=None, chunk_bars=DEFAULT_CHUNK_BARS):
+        """streams maps (symbol, timeframe) to the timeframe in minutes;
+        start and end are unix times"""
+        self.data_manager = data_manager
+        self.streams = streams
+        self.start = int(start)
+        self.end = int(end)
+        self.base_prices = base_prices
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        self.chunk_bars = chunk_bars
+        
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.state = 'pending'
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.chunks_total = 0
+        self.chunks_done = 0
+        self.candles_written = 0
+        self.resumed = {}
+    
+    def _plan(self):
+        """Split every stream into tasks for the ranges before and after its stored history
+        
+        Returns the tasks and the price each chain of chunks continues from,
+        keyed by (symbol, timeframe, before): the first stored open for the
+        chunks before the history, the last stored close for those after it.
+        """
+        tasks = []
+        prices = {}
+        for (symbol, timeframe), tf_minutes in self.streams.items():
+            start = self.start
+            step = self.chunk_bars * tf_minutes * 60
+            prices[(symbol, timeframe, False)] = self.base_prices.get(symbol, 1.0)
+            
+            stats = self.data_manager.get_stream_stats(symbol, timeframe)
+            if stats['rows']:
+                first_time = parse_bar_time(stats['first'])
+                if start < first_time:
+                    first_candle = self.data_manager.get_dataframe(symbol, timeframe, stats['first'], stats['first'])
+                    prices[(symbol, timeframe, True)] = float(first_candle['open'].iloc[0])
+                    
+                    # Newest chunk first, so each is priced back from the one after it
+                    chunk_ends = list(range(min(first_time, self.end), start, -step))
+                    for i, chunk_end in enumerate(chunk_ends):
+                        tasks.append(BackfillTask(symbol, timeframe, tf_minutes, max(chunk_end - step, start),
+                                                  chunk_end, i == len(chunk_ends) - 1, before=True))
+                
+                last_candle = self.data_manager.get_last_candle(symbol, timeframe)
+                prices[(symbol, timeframe, False)] = float(last_candle['close'])
+                last_time = parse_bar_time(last_candle['datetime'])
+                if last_time >= start:
+                    start = last_time + 1
+                    self.resumed[f"{symbol}_{timeframe}"] = last_candle['datetime']
+            
+            chunk_starts = list(range(start, self.end, step))
+            for i, chunk_start in enumerate(chunk_starts):
+                chunk_end = min(chunk_start + step, self.end)
+                tasks.append(BackfillTask(symbol, timeframe, tf_minutes, chunk_start, chunk_end,
+                                          i == len(chunk_starts) - 1))
+        return tasks, prices
+    
+    def run(self):
+        """Run the backfill to completion, or until stop() is called"""
+        with self.lock:
+            self.state = 'running'
+            self.started = time.time()
+        
+        try:
+            tasks, prices = self._plan()
+            self.chunks_total = len(tasks)
+            logger.info(f"Backfilling {len(self.streams)} streams in {len(tasks)} chunks")
+            
+            # Spawned workers avoid forking a process that runs other threads; they
+            # import only this module and __main__, which must not start the app
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context) as executor:
+                # Keep a bounded window of chunks in flight and write them in
+                # submission order, which keeps each chain of a stream's chunks
+                # in the order _plan priced them
+                window = self.max_workers * 2
+                pending = []
+                next_task = 0
+                while next_task < len(tasks) or pending:
+                    while next_task < len(tasks) and len(pending) < window and not self.stop_event.is_set():
+                        task = tasks[next_task]
+                        pending.append((task, executor.submit(
+                            generate_rates, task.seed(), task.symbol, self.base_prices.get(task.symbol, 1.0),
+                            task.tf_minutes, task.start, task.end
+                        )))
+                        next_task += 1
+                    
+                    if self.stop_event.is_set():
+                        for _, future in pending:
+                            future.cancel()
+                        break
+                    
+                    task, future = pending.pop(0)
+                    key = (task.symbol, task.timeframe, task.before)
+                    prices[key] = self._write_chunk(task, future.result(), prices[key])
+            
+            with self.lock:
+                self.state = 'stopped' if self.stop_event.is_set() else 'completed'
+        
+        except Exception as e:
+            logger.error(f"Backfill failed: {str(e)}")
+            with self.lock:
+                self.state = 'failed'
+                self.error = str(e)
+        
+        finally:
+            self.finished = time.time()
+            logger.info(f"Backfill {self.state}: {self.candles_written} candles in {self.chunks_done} chunks")
+        
+        return self.state == 'completed'
+    
+    def _write_chunk(self, task, records, price):
+        """Price a generated chunk and store it; returns the price the next chunk continues from
+        
+        A chunk after the history opens at price, the previous close, and
+        returns its last close. A chunk before it closes at price, the open
+        of the candle after it, and returns its first open.
+        """
+        if len(records):
+            scale = price / records['close'][-1] if task.before else price
+            candles = pd.DataFrame({
+                'datetime': format_bar_times(records['time']),
+                'symbol': task.symbol,
+                'timeframe': task.timeframe,
+                'open': np.round(records['open'] * scale, 5),
+                'high': np.round(records['high'] * scale, 5),
+                'low': np.round(records['low'] * scale, 5),
+                'close': np.round(records['close'] * scale, 5),
+                'volume': records['volume']
+            })
+            save = self.data_manager.prepend_candles if task.before else self.data_manager.save_candles
+            if not save(task.symbol, task.timeframe, candles):
+                raise RuntimeError(f"Could not save candles for {task.symbol} ({task.timeframe})")
+            price = float(candles['open'].iloc[0] if task.before else candles['close'].iloc[-1])
+        
+        if task.last:
+            # Close the stream's files so e.g. Parquet partitions get compacted
+            self.data_manager.flush(task.symbol, task.timeframe, close=True)
+        
+        with self.lock:
+            self.chunks_done += 1
+            self.candles_written += len(records)
+        logger.info(f"Backfill progress: {self.chunks_done}/{self.chunks_total} chunks, "
+                    f"{self.candles_written} candles")
+        return price
+    
+    def stop(self):
+        """Ask a running backfill to stop after the chunk being written"""
+        self.stop_event.set()
+    
+    def is_running(self):
+        return self.state in ('pending', 'running')
+    
+    def progress(self):
+        """Snapshot of the backfill's progress"""
+        with self.lock:
+            elapsed = ((self.finished or time.time()) - self.started) if self.started else 0.0
+            return {
+                'state': self.state,
+                'streams': [f"{symbol}_{timeframe}" for symbol, timeframe in self.streams],
+                'chunks_done': self.chunks_done,
+                'chunks_total': self.chunks_total,
+                'percent': round(100.0 * self.chunks_done / self.chunks_total, 1) if self.chunks_total else 0.0,
+                'candles_written': self.candles_written,
+                'candles_per_second': round(self.candles_written / elapsed) if elapsed else 0,
+                'elapsed': round(elapsed, 1),
+                'resumed_from': dict(self.resumed),
+                'error': self.error
+            }
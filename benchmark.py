@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Benchmarks log a lot at DEBUG; keep the output readable
+logging.disable(logging.INFO)
+
+SYMBOLS = ['EURUSD', 'GBPUSD', 'USDJPY', 'AUDUSD']
+
+# Fraction a metric may get worse than the baseline before it counts as a regression
+DEFAULT_THRESHOLD = 0.2
+
+def _percentile(samples, percent):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+def _latency_results(prefix, samples):
+    """p50/p95/p99 latency results in milliseconds from samples in seconds
+    
+    p99 is reported but too noisy on short runs to fail a baseline comparison.
+    """
+    return {
+        f"{prefix}.p50_ms": {'value': round(statistics.median(samples) * 1000, 3), 'unit': 'ms', 'better': 'lower'},
+        f"{prefix}.p95_ms": {'value': round(_percentile(samples, 95) * 1000, 3), 'unit': 'ms', 'better': 'lower'},
+        f"{prefix}.p99_ms": {'value': round(_percentile(samples, 99) * 1000, 3), 'unit': 'ms', 'better': 'lower',
+                             'gate': False}
+    }
+
+def _candle(symbol, timeframe, index):
+    """Deterministic candle for write benchmarks"""
+    price = 1.08 + (index % 1000) * 0.00001
+    return {
+        'datetime': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(1700000000 + index * 60)),
+        'symbol': symbol,
+        'timeframe': timeframe,
+        'open': price,
+        'high': price + 0.0001,
+        'low': price - 0.0001,
+        'close': price + 0.00005,
+        'volume': 100 + index % 50
+    }
+
+def _fill(data_manager, symbol, timeframe, count, seed=1):
+    """Store count synthetic M1-spaced candles for one stream"""
+    from mt5_connector import MT5Connector
+    from market_simulator import SyntheticMarket, load_test
+    
+    connector = MT5Connector()
+    market = SyntheticMarket([symbol], connector.base_prices, seed=seed)
+    load_test(data_manager, market, timeframe, 1, count)
+
+def bench_save_candle(workdir, count):
+    """save_candle throughput per storage configuration, in candles per second"""
+    from data_manager import DataManager
+    
+    configurations = {
+        'csv': {'backend': 'csv'},
+        'csv_write_behind': {'backend': 'csv', 'write_behind': True},
+        'binary': {'backend': 'binary'}
+    }
+    
+    results = {}
+    for name, options in configurations.items():
+        data_dir = os.path.join(workdir, f"save_{name}")
+        data_manager = DataManager(data_dir, **options)
+        candles = [_candle(SYMBOLS[i % len(SYMBOLS)], 'M1', i) for i in range(count)]
+        
+        start = time.perf_counter()
+        for candle in candles:
+            data_manager.save_candle(candle['symbol'], 'M1', candle)
+        data_manager.flush()
+        elapsed = time.perf_counter() - start
+        
+        data_manager.close()
+        results[f"save_candle.{name}"] = {
+            'value': round(count / elapsed),
+            'unit': 'candles/s',
+            'better': 'higher'
+        }
+    return results
+
+def bench_range_query(workdir, sizes, repeats, query_cache_bytes=0, name='range_query'):
+    """get_data_for_symbol latency for a one-day window at several file sizes
+    
+    The query cache is off by default so repeated reads measure the storage
+    backend; the cached_query suite runs the same reads through the cache.
+    """
+    from data_manager import DataManager
+    from mt5_connector import parse_bar_time, format_bar_time
+    
+    results = {}
+    for backend in ('csv', 'binary'):
+        for size in sizes:
+            data_dir = os.path.join(workdir, f"{name}_{backend}_{size}")
+            data_manager = DataManager(data_dir, backend=backend, query_cache_bytes=query_cache_bytes)
+            _fill(data_manager, 'EURUSD', 'M1', size)
+            
+            # A day in the middle of the file
+            last = data_manager.get_last_candle('EURUSD', 'M1')
+            middle = parse_bar_time(last['datetime']) - size * 30
+            start, end = format_bar_time(middle), format_bar_time(middle + 86400)
+            
+            data_manager.get_data_for_symbol('EURUSD', 'M1', start, end)
+            samples = []
+            for _ in range(repeats):
+                begin = time.perf_counter()
+                data_manager.get_data_for_symbol('EURUSD', 'M1', start, end)
+                samples.append(time.perf_counter() - begin)
+            
+            data_manager.close()
+            results.update(_latency_results(f"{name}.{backend}.{size}", samples))
+    return results
+
+def bench_api(workdir, candles, requests_per_client, concurrency):
+    """Request latency and throughput of the read endpoints with concurrent clients"""
+    # The app keeps its data in ./data, so import it from inside the work directory
+    api_dir = os.path.join(workdir, 'api')
+    os.makedirs(api_dir)
+    previous_dir = os.getcwd()
+    os.chdir(api_dir)
+    
+    # Measure the endpoints rather than hits in the query cache
+    os.environ['DATA_QUERY_CACHE_BYTES'] = '0'
+    try:
+        import app as web
+        
+        # Bulk saves also fill the recent-candle rings behind latest_data
+        for symbol in SYMBOLS:
+            _fill(web.data_manager, symbol, 'M1', candles)
+        
+        results = {}
+        for path in ('/api/latest_data?count=10', '/api/saved_files'):
+            def client_run(_):
+                client = web.app.test_client()
+                samples = []
+                for _ in range(requests_per_client):
+                    begin = time.perf_counter()
+                    response = client.get(path)
+                    samples.append(time.perf_counter() - begin)
+                    assert response.status_code == 200
+                return samples
+            
+            begin = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                samples = [s for client_samples in executor.map(client_run, range(concurrency)) for s in client_samples]
+            elapsed = time.perf_counter() - begin
+            
+            name = path.split('?')[0].rsplit('/', 1)[-1]
+            results.update(_latency_results(f"api.{name}.c{concurrency}", samples))
+            results[f"api.{name}.c{concurrency}.throughput"] = {
+                'value': round(len(samples) / elapsed),
+                'unit': 'req/s',
+                'better': 'higher'
+            }
+        
+        web.data_manager.close()
+        return results
+    finally:
+        os.chdir(previous_dir)
+
+def bench_recorder_cpu(workdir, streams, candles_per_stream):
+    """CPU time the recorder spends per candle, and per M1 stream as a share of one core"""
+    from data_manager import DataManager
+    from mt5_connector import MT5Connector, RecordingStream, next_boundary
+    
+    data_manager = DataManager(os.path.join(workdir, 'recorder'))
+    connector = MT5Connector(seed=1)
+    connector.connect()
+    connector.data_manager = data_manager
+    
+    recording = [RecordingStream(symbol, 'M1', 1, None) for symbol in connector.available_symbols[:streams]]
+    boundary = next_boundary(1700000000, 1)
+    
+    cpu_start = time.process_time()
+    for n in range(candles_per_stream):
+        for stream in recording:
+            connector._record_stream(stream, boundary + n * 60)
+    cpu = time.process_time() - cpu_start
+    data_manager.close()
+    
+    per_candle = cpu / (len(recording) * candles_per_stream)
+    return {
+        'recorder.cpu_per_candle': {'value': round(per_candle * 1e6, 1), 'unit': 'us', 'better': 'lower'},
+        'recorder.cpu_per_m1_stream': {'value': round(per_candle / 60 * 100, 5), 'unit': '% core', 'better': 'lower'}
+    }
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+def run_benchmarks(quick=False, only=None):
+    """Run the suite in a temporary directory and return the report dict"""
+    from query_cache import DEFAULT_MAX_BYTES
+    
+    scale = 0.1 if quick else 1.0
+    suites = {
+        'save_candle': lambda workdir: bench_save_candle(workdir, int(20000 * scale)),
+        'range_query': lambda workdir: bench_range_query(
+            workdir, [int(size * scale) for size in (10_000, 100_000, 1_000_000)], 50 if quick else 200
+        ),
+        'cached_query': lambda workdir: bench_range_query(
+            workdir, [int(100_000 * scale)], 50 if quick else 200, DEFAULT_MAX_BYTES, 'cached_query'
+        ),
+        'api': lambda workdir: bench_api(workdir, int(50_000 * scale), 20 if quick else 100, 8),
+        'recorder': lambda workdir: bench_recorder_cpu(workdir, 10, int(500 * scale))
+    }
+    
+    np.random.seed(0)
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='mt5-bench-')
+    try:
+        for name, suite in suites.items():
+            if only and name not in only:
+                continue
+            print(f"Running {name}...", file=sys.stderr)
+            results.update(suite(workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    return {
+        'meta': {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'quick': quick
+        },
+        'results': results
+    }
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compare results with a baseline report; returns the list of regressions"""
+    regressions = []
+    for name, result in sorted(report['results'].items()):
+        base = baseline['results'].get(name)
+        if base is None or not base['value']:
+            print(f"{name:50} {result['value']:>14} {result['unit']:10} (new)")
+            continue
+        
+        change = (result['value'] - base['value']) / base['value']
+        worse = -change if result['better'] == 'higher' else change
+        flag = ''
+        if worse > threshold and result.get('gate', True):
+            flag = 'REGRESSION'
+            regressions.append(name)
+        print(f"{name:50} {result['value']:>14} {result['unit']:10} {change:+8.1%} {flag}")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the recording and query hot paths')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--baseline', help='compare with a previous JSON report')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed fraction a metric may get worse (default 0.2)')
+    parser.add_argument('--quick', action='store_true', help='smaller data sets for a fast run')
+    parser.add_argument('--only', nargs='+', help='run only these suites: save_candle range_query cached_query api recorder')
+    args = parser.parse_args()
+    
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    report = run_benchmarks(args.quick, args.only)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
+    elif not args.output:
+        json.dump(report, sys.stdout, indent=2)
+        print()
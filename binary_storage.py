@@ -0,0 +1,498 @@
+import os
+import sys
+import time
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+from csv_index import datetime_to_epoch
+from storage import CSV_HEADERS, StorageBackend, _to_epoch, describe_file
+from metrics import FLUSH_ROWS
+from segments import encode_records, decode_records
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Fixed-size 48 byte record: unix time in seconds, OHLC prices and volume
+CANDLE_DTYPE = np.dtype([
+    ('time', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<i8')
+])
+
+# How each candle field is encoded in compressed segments
+CANDLE_COLUMNS = {
+    'time': 'time',
+    'open': 'price',
+    'high': 'price',
+    'low': 'price',
+    'close': 'price',
+    'volume': 'int'
+}
+
+def _slice_times(records, start=None, end=None):
+    """Records between two unix times (inclusive) of a time-ordered array"""
+    times = records['time']
+    lo = 0 if start is None else np.searchsorted(times, start, side='left')
+    hi = len(records) if end is None else np.searchsorted(times, end, side='right')
+    return records[lo:hi]
+
+def truncate_partial_record(filepath, itemsize):
+    """Cut a file of fixed-width records back to its last complete record"""
+    if os.path.isfile(filepath):
+        size = os.path.getsize(filepath)
+        if size % itemsize:
+            logger.warning(f"Truncating partial record at the end of {filepath}")
+            os.truncate(filepath, size - size % itemsize)
+
+class BinaryWriteBuffer:
+    """Open binary file handle plus the records still waiting to be written to it"""
+    
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.rows = []
+        self.rows_since_fsync = 0
+        self.last_flush = time.monotonic()
+        
+        # Drop a torn trailing record left behind by an interrupted write
+        truncate_partial_record(filepath, CANDLE_DTYPE.itemsize)
+        
+        self.file = open(filepath, 'ab')
+    
+    def flush(self, fsync_every=None):
+        """Write pending records to the file; caller must hold the lock"""
+        if self.rows:
+            records = np.empty(len(self.rows), dtype=CANDLE_DTYPE)
+            for i, row in enumerate(self.rows):
+                records[i] = (datetime_to_epoch(row[0]), row[3], row[4], row[5], row[6], row[7])
+            self.file.write(records.tobytes())
+            self.rows_since_fsync += len(self.rows)
+            FLUSH_ROWS.labels('binary').observe(len(self.rows))
+            self.rows = []
+        
+        self.file.flush()
+        
+        # Durability: fsync once at least N records were written since the last one
+        if fsync_every and self.rows_since_fsync >= fsync_every:
+            os.fsync(self.file.fileno())
+            self.rows_since_fsync = 0
+        
+        self.last_flush = time.monotonic()
+    
+    def close(self, fsync=False):
+        """Flush pending records and close the file; caller must hold the lock"""
+        self.flush()
+        if fsync and self.rows_since_fsync:
+            os.fsync(self.file.fileno())
+        self.file.close()
+
+class BinaryStorage(StorageBackend):
+    """Fixed-width binary candle store in data/{symbol}_{timeframe}.bin
+    
+    Records follow CANDLE_DTYPE back to back with no header, so a file can be
+    memory-mapped and sliced as a NumPy structured array without parsing or
+    copying. Records are expected in time order; range lookups binary-search
+    the time column. Rotated segments are stored with the delta/XOR column
+    encoding of segments.encode_records.
+    """
+    
+    name = 'binary'
+    segment_format = 'bin'
+    
+    def __init__(self, data_dir, **options):
+        options.pop('write_behind', None)
+        super().__init__(data_dir, **options)
+        
+        # Read-only maps keyed by file path, remapped when the file grows
+        self.maps = {}
+        self.maps_lock = threading.Lock()
+    
+    def get_filepath(self, symbol, timeframe):
+        """Build the binary file path for a symbol and timeframe"""
+        return os.path.join(self.data_dir, f"{symbol}_{timeframe}.bin")
+    
+    def _open_buffer(self, symbol, timeframe):
+        return BinaryWriteBuffer(self.get_filepath(symbol, timeframe))
+    
+    def repair_tail(self, symbol, timeframe):
+        truncate_partial_record(self.get_filepath(symbol, timeframe), CANDLE_DTYPE.itemsize)
+    
+    def _get_map(self, filepath):
+        """Get a read-only memory map covering every complete record of a file"""
+        count = os.path.getsize(filepath) // CANDLE_DTYPE.itemsize
+        with self.maps_lock:
+            cached = self.maps.get(filepath)
+            if cached is not None and len(cached) == count:
+                return cached
+            
+            if count == 0:
+                mapped = np.empty(0, dtype=CANDLE_DTYPE)
+            else:
+                mapped = np.memmap(filepath, dtype=CANDLE_DTYPE, mode='r', shape=(count,))
+            self.maps[filepath] = mapped
+            return mapped
+    
+    def get_array(self, symbol, timeframe, start_date=None, end_date=None):
+        """Return a zero-copy structured-array view of the candles in a range
+        
+        The view is backed by the memory-mapped file, so it must be treated
+        as read-only. A range reaching into rotated segments is returned as a
+        decoded copy instead. Returns None if the stream has no data.
+        """
+        filepath = self.get_filepath(symbol, timeframe)
+        
+        # Make sure buffered candles are visible to the reader
+        self.flush(symbol, timeframe)
+        
+        start, end = _to_epoch(start_date), _to_epoch(end_date)
+        
+        def read_files():
+            parts = [
+                _slice_times(self._segment_records(segment), start, end)
+                for segment in self.get_segments(symbol, timeframe, start, end)
+            ]
+            active = None
+            if os.path.isfile(filepath):
+                active = _slice_times(self._get_map(filepath), start, end)
+            return parts, active
+        
+        parts, active = self._read_consistent(symbol, timeframe, read_files)
+        if not parts:
+            return active
+        if active is not None:
+            parts.append(active)
+        return np.concatenate(parts)
+    
+    def _segment_records(self, segment):
+        if segment.compressed:
+            with open(segment.path, 'rb') as f:
+                return decode_records(f.read(), CANDLE_DTYPE, CANDLE_COLUMNS)
+        return np.fromfile(segment.path, dtype=CANDLE_DTYPE)
+    
+    def read_appended(self, symbol, timeframe, previous=None, columns=None):
+        """Records appended since previous, by position in the segments and the mapped file"""
+        filepath = self.get_filepath(symbol, timeframe)
+        self.flush(symbol, timeframe)
+        seen = previous['rows'] if previous else 0
+        
+        def read_files():
+            segments = self.get_segments(symbol, timeframe)
+            first = self._stream_first(symbol, timeframe, segments)
+            if seen and previous.get('first', first) != first:
+                return None
+            
+            parts = []
+            offset = 0
+            for segment in segments:
+                if offset + segment.rows > seen:
+                    parts.append(self._segment_records(segment)[max(seen - offset, 0):])
+                offset += segment.rows
+            
+            exists = offset > 0 or os.path.isfile(filepath)
+            if os.path.isfile(filepath):
+                active = self._get_map(filepath)
+                parts.append(active[max(seen - offset, 0):])
+                offset += len(active)
+            return parts, offset, exists, first
+        
+        result = self._read_consistent(symbol, timeframe, read_files)
+        if result is None:
+            return None
+        
+        parts, rows, exists, first = result
+        if rows < seen:
+            return None
+        if not exists:
+            return None, {'rows': 0}
+        
+        records = np.concatenate(parts) if parts else np.empty(0, dtype=CANDLE_DTYPE)
+        return self._records_frame(records, symbol, timeframe, columns), {'rows': rows, 'first': first}
+    
+    def read(self, symbol, timeframe, start_date=None, end_date=None, columns=None):
+        records = self.get_array(symbol, timeframe, start_date, end_date)
+        if records is None:
+            return None
+        return self._records_frame(records, symbol, timeframe, columns)
+    
+    def _records_frame(self, records, symbol, timeframe, columns=None):
+        df = pd.DataFrame({
+            'datetime': pd.to_datetime(records['time'], unit='s'),
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'open': records['open'],
+            'high': records['high'],
+            'low': records['low'],
+            'close': records['close'],
+            'volume': records['volume']
+        }, columns=CSV_HEADERS)
+        
+        if columns:
+            df = df[['datetime'] + [column for column in columns if column != 'datetime']]
+        return df
+    
+    def last_candle(self, symbol, timeframe):
+        filepath = self.get_filepath(symbol, timeframe)
+        self.flush(symbol, timeframe)
+        if not os.path.isfile(filepath):
+            # Just rotated: the newest candle is in the last segment
+            return self._last_segment_candle(symbol, timeframe)
+        
+        records = self._get_map(filepath)
+        if len(records) == 0:
+            return None
+        
+        record = records[-1]
+        return {
+            'datetime': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(int(record['time']))),
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'open': float(record['open']),
+            'high': float(record['high']),
+            'low': float(record['low']),
+            'close': float(record['close']),
+            'volume': int(record['volume'])
+        }
+    
+    def list_files(self):
+        files = []
+        for filename in os.listdir(self.data_dir):
+            if filename.endswith('.bin'):
+                info = describe_file(os.path.join(self.data_dir, filename), filename)
+                if info is not None:
+                    files.append(info)
+        return files
+    
+    def file_info(self, symbol, timeframe):
+        filepath = self.get_filepath(symbol, timeframe)
+        if not os.path.isfile(filepath):
+            return None
+        return describe_file(filepath, os.path.basename(filepath))
+    
+    def stream_stats(self, symbol, timeframe, previous=None):
+        return self._segment_totals(symbol, timeframe, self._active_stats(symbol, timeframe))
+    
+    def _active_stats(self, symbol, timeframe, previous=None):
+        """Row count from the file size and first/last times from the mapped records"""
+        filepath = self.get_filepath(symbol, timeframe)
+        if not os.path.isfile(filepath):
+            return {'rows': 0, 'first': None, 'last': None}
+        
+        mapped = self._get_map(filepath)
+        if len(mapped) == 0:
+            return {'rows': 0, 'first': None, 'last': None}
+        
+        return {
+            'rows': len(mapped),
+            'first': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(int(mapped['time'][0]))),
+            'last': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(int(mapped['time'][-1])))
+        }
+    
+    def _first_time(self, symbol, timeframe):
+        filepath = self.get_filepath(symbol, timeframe)
+        if not os.path.isfile(filepath) or os.path.getsize(filepath) < CANDLE_DTYPE.itemsize:
+            return None
+        first = np.fromfile(filepath, dtype=CANDLE_DTYPE, count=1)
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(int(first['time'][0])))
+    
+    def _after_seal(self, symbol, timeframe):
+        # A new file at the same path must not be served from the old map
+        with self.maps_lock:
+            self.maps.pop(self.get_filepath(symbol, timeframe), None)
+    
+    def _write_segment(self, path, rows):
+        records = np.empty(len(rows), dtype=CANDLE_DTYPE)
+        for i, row in enumerate(rows):
+            records[i] = (datetime_to_epoch(row[0]), row[3], row[4], row[5], row[6], row[7])
+        records.tofile(path)
+    
+    def _compress_segment(self, raw_path):
+        records = np.fromfile(raw_path, dtype=CANDLE_DTYPE)
+        data = encode_records(records, CANDLE_COLUMNS)
+        
+        # Write to a temporary name first so readers never see a partial file
+        tmp_path = raw_path + '.gor.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, raw_path + '.gor')
+        os.remove(raw_path)
+        logger.info(f"Compressed {os.path.basename(raw_path)}: {records.nbytes} -> {len(data)} bytes")
+
+# Fixed-size 24 byte tick record: unix time in milliseconds, bid and ask
+TICK_DTYPE = np.dtype([
+    ('time', '<i8'),
+    ('bid', '<f8'),
+    ('ask', '<f8')
+])
+
+# Ticks buffered in memory per symbol before they are written out
+TICK_CHUNK_SIZE = 4096
+
+class TickBuffer:
+    """Preallocated chunk of pending ticks plus the open tick file"""
+    
+    def __init__(self, filepath, chunk_size):
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.chunk = np.empty(chunk_size, dtype=TICK_DTYPE)
+        self.size = 0
+        self.rows_since_fsync = 0
+        self.last_flush = time.monotonic()
+        
+        # Drop a torn trailing record left behind by an interrupted write
+        truncate_partial_record(filepath, TICK_DTYPE.itemsize)
+        
+        self.file = open(filepath, 'ab')
+    
+    def flush(self, fsync_every=None):
+        """Write pending ticks to the file; caller must hold the lock"""
+        if self.size:
+            self.file.write(self.chunk[:self.size].tobytes())
+            self.rows_since_fsync += self.size
+            FLUSH_ROWS.labels('ticks').observe(self.size)
+            self.size = 0
+        
+        self.file.flush()
+        
+        if fsync_every and self.rows_since_fsync >= fsync_every:
+            os.fsync(self.file.fileno())
+            self.rows_since_fsync = 0
+        
+        self.last_flush = time.monotonic()
+    
+    def close(self):
+        """Flush pending ticks and close the file; caller must hold the lock"""
+        self.flush()
+        self.file.close()
+
+class TickStore:
+    """Append-only raw tick files in data/ticks/{symbol}.ticks
+    
+    Ticks are packed as TICK_DTYPE records into a preallocated chunk per
+    symbol and written out when the chunk fills up or on flush, so the
+    append path does no per-tick allocation. Reads memory-map the file.
+    """
+    
+    def __init__(self, data_dir, chunk_size=TICK_CHUNK_SIZE, fsync_every=None):
+        self.tick_dir = os.path.join(data_dir, 'ticks')
+        self.chunk_size = chunk_size
+        self.fsync_every = fsync_every
+        self.buffers = {}
+        self.buffers_lock = threading.Lock()
+    
+    def get_filepath(self, symbol):
+        """Build the tick file path for a symbol"""
+        return os.path.join(self.tick_dir, f"{symbol}.ticks")
+    
+    def _get_buffer(self, symbol):
+        buffer = self.buffers.get(symbol)
+        if buffer is None:
+            with self.buffers_lock:
+                buffer = self.buffers.get(symbol)
+                if buffer is None:
+                    # The tick directory is only created once ticks are recorded
+                    os.makedirs(self.tick_dir, exist_ok=True)
+                    buffer = TickBuffer(self.get_filepath(symbol), self.chunk_size)
+                    self.buffers[symbol] = buffer
+        return buffer
+    
+    def append(self, symbol, time_ms, bid, ask):
+        """Queue one tick, writing the chunk out once it is full"""
+        buffer = self._get_buffer(symbol)
+        with buffer.lock:
+            buffer.chunk[buffer.size] = (time_ms, bid, ask)
+            buffer.size += 1
+            if buffer.size == self.chunk_size:
+                buffer.flush(self.fsync_every)
+    
+    def flush(self, symbol=None, close=False, older_than=None):
+        """Write buffered ticks for one symbol or all of them"""
+        with self.buffers_lock:
+            symbols = [s for s in self.buffers if symbol is None or s == symbol]
+            buffers = [self.buffers.pop(s) if close else self.buffers[s] for s in symbols]
+        
+        now = time.monotonic()
+        for buffer in buffers:
+            try:
+                with buffer.lock:
+                    if close:
+                        buffer.close()
+                    elif older_than is None or (buffer.size and now - buffer.last_flush >= older_than):
+                        buffer.flush(self.fsync_every)
+            except Exception as e:
+                logger.error(f"Error flushing {buffer.filepath}: {str(e)}")
+    
+    def get_ticks(self, symbol, start_ms=None, end_ms=None):
+        """Return a zero-copy view of a symbol's ticks between two millisecond times
+        
+        Returns None if no ticks were recorded for the symbol.
+        """
+        filepath = self.get_filepath(symbol)
+        self.flush(symbol)
+        
+        if not os.path.isfile(filepath):
+            return None
+        
+        count = os.path.getsize(filepath) // TICK_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=TICK_DTYPE)
+        
+        mapped = np.memmap(filepath, dtype=TICK_DTYPE, mode='r', shape=(count,))
+        times = mapped['time']
+        lo = 0 if start_ms is None else np.searchsorted(times, start_ms, side='left')
+        hi = count if end_ms is None else np.searchsorted(times, end_ms, side='right')
+        return mapped[lo:hi]
+
+def csv_to_records(csv_path):
+    """Load a candle CSV file into a time-sorted CANDLE_DTYPE array"""
+    return frame_to_records(pd.read_csv(csv_path, usecols=['datetime', 'open', 'high', 'low', 'close', 'volume']))
+
+def frame_to_records(df):
+    """Convert a candle DataFrame into a time-sorted CANDLE_DTYPE array"""
+    records = np.empty(len(df), dtype=CANDLE_DTYPE)
+    records['time'] = pd.to_datetime(df['datetime']).to_numpy(dtype='datetime64[s]').astype('<i8')
+    for column in ('open', 'high', 'low', 'close', 'volume'):
+        records[column] = df[column].to_numpy()
+    
+    # Stable sort keeps duplicates in file order
+    return records[np.argsort(records['time'], kind='stable')]
+
+def convert_csv_files(data_dir='data', overwrite=False):
+    """Import every {symbol}_{timeframe}.csv in data_dir into a .bin file
+    
+    Existing binary files are left alone unless overwrite is True. Returns
+    the list of binary files written.
+    """
+    written = []
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith('.csv') or len(filename[:-len('.csv')].split('_')) < 2:
+            continue
+        
+        csv_path = os.path.join(data_dir, filename)
+        bin_path = csv_path[:-len('.csv')] + '.bin'
+        if os.path.exists(bin_path) and not overwrite:
+            logger.info(f"Skipping {filename}: {os.path.basename(bin_path)} already exists")
+            continue
+        
+        try:
+            records = csv_to_records(csv_path)
+            
+            # Write to a temporary name first so readers never see a partial file
+            tmp_path = bin_path + '.tmp'
+            records.tofile(tmp_path)
+            os.replace(tmp_path, bin_path)
+            
+            written.append(bin_path)
+            logger.info(f"Converted {filename} ({len(records)} candles)")
+        except Exception as e:
+            logger.error(f"Error converting {filename}: {str(e)}")
+    
+    return written
+
+if __name__ == '__main__':
+    convert_csv_files(sys.argv[1] if len(sys.argv) > 1 else 'data')
@@ -0,0 +1,145 @@
+import os
+import json
+import queue
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Messages buffered per subscriber before the oldest ones are dropped
+DEFAULT_QUEUE_SIZE = 256
+
+# A subscriber that drops this many messages without catching up in between
+# is disconnected
+DEFAULT_MAX_DROPPED = 1024
+
+# Open streams allowed per process, 0 for no limit. Each stream holds a
+# server thread for as long as it is open, so this has to stay below the
+# thread count for other requests to get through.
+DEFAULT_MAX_SUBSCRIBERS = int(os.environ.get('STREAM_MAX_SUBSCRIBERS', '0'))
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+# Queued in place of a message to end a subscriber's stream
+_CLOSE = object()
+
+class CandleSubscriber:
+    """One connected client with its symbol/timeframe filter and bounded queue"""
+    
+    def __init__(self, symbols=None, timeframes=None, queue_size=DEFAULT_QUEUE_SIZE):
+        self.symbols = set(symbols) if symbols else None
+        self.timeframes = set(timeframes) if timeframes else None
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+    
+    def wants(self, symbol, timeframe):
+        """Check whether a candle matches this subscriber's filter"""
+        return ((self.symbols is None or symbol in self.symbols)
+                and (self.timeframes is None or timeframe in self.timeframes))
+    
+    def offer(self, message):
+        """Queue a message without blocking, dropping the oldest one if full
+        
+        Returns the number of messages dropped since the client last emptied
+        its queue.
+        """
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return self.dropped
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+    
+    def close(self):
+        """End the subscriber's stream"""
+        self.closed = True
+        self.offer(_CLOSE)
+    
+    def messages(self, heartbeat=HEARTBEAT_INTERVAL):
+        """Yield Server-Sent Events messages until the subscriber is closed"""
+        # Tell the browser how long to wait before reconnecting
+        yield 'retry: 3000\n\n'
+        
+        while not self.closed:
+            try:
+                message = self.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                # Comment lines keep proxies from closing an idle connection
+                yield ': keep-alive\n\n'
+                continue
+            
+            if message is _CLOSE:
+                break
+            
+            # Caught up: earlier drops no longer count towards disconnecting
+            if self.dropped and self.queue.empty():
+                self.dropped = 0
+            yield message
+
+class CandleBroadcaster:
+    """Fans saved candles out to Server-Sent Events subscribers
+    
+    Registered as a DataManager listener, so every stored candle is encoded
+    once and offered to all matching subscribers without blocking the
+    recorder. Slow clients lose their oldest queued candles, and are
+    disconnected once they drop more than max_dropped messages without
+    emptying their queue in between. Once max_subscribers streams are open,
+    further subscriptions are refused.
+    """
+    
+    def __init__(self, data_manager=None, queue_size=DEFAULT_QUEUE_SIZE, max_dropped=DEFAULT_MAX_DROPPED,
+                 max_subscribers=DEFAULT_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_dropped = max_dropped
+        self.max_subscribers = max_subscribers
+        self.subscribers = []
+        self.lock = threading.Lock()
+        
+        if data_manager is not None:
+            data_manager.add_listener(self.publish)
+    
+    def subscribe(self, symbols=None, timeframes=None):
+        """Register a new subscriber; None means every symbol or timeframe
+        
+        Returns None if max_subscribers streams are already open.
+        """
+        subscriber = CandleSubscriber(symbols, timeframes, self.queue_size)
+        with self.lock:
+            if self.max_subscribers and len(self.subscribers) >= self.max_subscribers:
+                return None
+            # Copy on write so publish can iterate without holding the lock
+            self.subscribers = self.subscribers + [subscriber]
+        return subscriber
+    
+    def unsubscribe(self, subscriber):
+        """Remove a subscriber and end its stream"""
+        with self.lock:
+            self.subscribers = [s for s in self.subscribers if s is not subscriber]
+        subscriber.close()
+    
+    def subscriber_count(self):
+        """Number of connected subscribers"""
+        return len(self.subscribers)
+    
+    def publish(self, symbol, timeframe, candle_data):
+        """Send a candle to every subscriber interested in its symbol/timeframe"""
+        message = None
+        for subscriber in self.subscribers:
+            if subscriber.closed or not subscriber.wants(symbol, timeframe):
+                continue
+            
+            # Encode lazily, and only once for all subscribers
+            if message is None:
+                message = f"event: candle\ndata: {json.dumps(candle_data)}\n\n"
+            
+            if subscriber.offer(message) > self.max_dropped:
+                logger.warning("Disconnecting slow candle stream subscriber")
+                self.unsubscribe(subscriber)
@@ -0,0 +1,243 @@
+import os
+import struct
+import calendar
+import logging
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# One index entry is recorded every INDEX_INTERVAL rows
+INDEX_INTERVAL = 1024
+
+# Index entries are (unix time, byte offset) pairs of little-endian int64
+ENTRY_FORMAT = struct.Struct('<qq')
+
+# Marker entry written once rows stop arriving in time order
+UNORDERED_MARKER = (-1, -1)
+
+# Datetimes are stored as fixed-width 'YYYY-MM-DD HH:MM:SS' strings
+DATETIME_WIDTH = 19
+
+def datetime_to_epoch(value):
+    """Convert a 'YYYY-MM-DD HH:MM:SS' string to seconds, treating it as UTC"""
+    return calendar.timegm((
+        int(value[0:4]), int(value[5:7]), int(value[8:10]),
+        int(value[11:13]), int(value[14:16]), int(value[17:19])
+    ))
+
+class CSVTimeIndex:
+    """Sparse timestamp -> byte offset index kept beside a candle CSV file
+    
+    Every INDEX_INTERVAL rows the time and file offset of a row is appended
+    to {csv}.idx, so a range query can seek close to its window instead of
+    parsing the whole file. The index is caught up from the CSV on load, and
+    rebuilt if the CSV no longer matches it. Rows must be ASCII and start
+    with the datetime column. If rows are ever appended out of time order the
+    index is marked unordered and callers fall back to a full scan.
+    
+    Only the process that writes the CSV persists the index. With
+    persist=False the persisted entries are read but never changed, and rows
+    appended since are indexed in memory by refresh().
+    """
+    
+    def __init__(self, csv_path, interval=INDEX_INTERVAL, persist=True):
+        self.csv_path = csv_path
+        self.index_path = csv_path + '.idx'
+        self.interval = interval
+        self.persist = persist
+        self.lock = threading.Lock()
+        
+        self._reset()
+        self._load()
+    
+    def _reset(self):
+        self.times = array('q')
+        self.offsets = array('q')
+        self.ordered = True
+        
+        # Offset of the first data row, the end of the indexed data and the
+        # rows seen since the last entry
+        self.data_start = 0
+        self.indexed_size = 0
+        self.rows_since_entry = 0
+        self.last_time = None
+        
+        # Inode of the indexed CSV, which rotation replaces
+        self.inode = None
+    
+    def _load(self):
+        """Read the persisted entries and index any rows appended since"""
+        if not os.path.isfile(self.csv_path):
+            return
+        
+        entries = []
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % ENTRY_FORMAT.size
+            entries = list(ENTRY_FORMAT.iter_unpack(data[:usable]))
+        
+        with open(self.csv_path, 'rb') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            header = f.readline()
+            self.data_start = len(header)
+            
+            if UNORDERED_MARKER in entries:
+                self.ordered = False
+                entries = [entry for entry in entries if entry != UNORDERED_MARKER]
+            
+            # Drop the index if its last entry no longer points at a matching row
+            if entries and not self._entry_matches(f, entries[-1]):
+                logger.warning(f"Rebuilding stale index for {self.csv_path}")
+                entries = []
+                self.ordered = True
+                if self.persist:
+                    os.remove(self.index_path)
+            
+            for entry_time, offset in entries:
+                self.times.append(entry_time)
+                self.offsets.append(offset)
+            
+            # Resume from the last entry; that row starts a new block
+            if entries:
+                resume_offset = entries[-1][1]
+                f.seek(resume_offset)
+                self.rows_since_entry = 0
+                self.indexed_size = resume_offset
+                self.last_time = None
+                self._scan(f, skip_entry_at=resume_offset)
+            else:
+                self.indexed_size = self.data_start
+                self._scan(f)
+    
+    def _entry_matches(self, f, entry):
+        """Check that the CSV row at an entry offset still has the entry's time"""
+        entry_time, offset = entry
+        f.seek(offset)
+        value = f.read(DATETIME_WIDTH).decode('ascii', errors='replace')
+        try:
+            return datetime_to_epoch(value) == entry_time
+        except ValueError:
+            return False
+    
+    def _scan(self, f, skip_entry_at=None):
+        """Index complete rows from the current file position to EOF"""
+        new_entries = []
+        offset = self.indexed_size
+        for line in f:
+            # A torn final row without its newline is left for a later catch-up
+            if not line.endswith(b'\n'):
+                break
+            value = line[:DATETIME_WIDTH].decode('ascii', errors='replace')
+            if offset != skip_entry_at:
+                self._observe(value, offset, new_entries)
+            else:
+                self.last_time = value
+                self.rows_since_entry = 1
+            offset += len(line)
+        
+        self.indexed_size = offset
+        self._persist(new_entries)
+    
+    def _observe(self, value, offset, new_entries):
+        """Account for one row, adding an entry every interval rows"""
+        if self.ordered and self.last_time is not None and value < self.last_time:
+            self.ordered = False
+            new_entries.append(UNORDERED_MARKER)
+            logger.warning(f"Out-of-order rows in {self.csv_path}; index disabled")
+        self.last_time = value
+        
+        if self.rows_since_entry % self.interval == 0:
+            try:
+                entry_time = datetime_to_epoch(value)
+            except ValueError:
+                entry_time = None
+            if entry_time is not None:
+                self.times.append(entry_time)
+                self.offsets.append(offset)
+                new_entries.append((entry_time, offset))
+                self.rows_since_entry = 0
+        self.rows_since_entry += 1
+    
+    def _persist(self, new_entries):
+        """Append new entries to the index file"""
+        if not new_entries or not self.persist:
+            return
+        with open(self.index_path, 'ab') as f:
+            f.write(b''.join(ENTRY_FORMAT.pack(*entry) for entry in new_entries))
+    
+    def _catch_up(self):
+        """Index whatever the CSV holds beyond the indexed size"""
+        with open(self.csv_path, 'rb') as f:
+            # Nothing was indexed yet, so the file starts with its header
+            if self.indexed_size == 0:
+                self.inode = os.fstat(f.fileno()).st_ino
+                self.data_start = self.indexed_size = len(f.readline())
+            f.seek(self.indexed_size)
+            self._scan(f)
+    
+    def refresh(self):
+        """Index rows another process appended, or start over if the CSV was replaced
+        
+        For readers of a file written elsewhere; caller must hold the lock.
+        """
+        try:
+            stat = os.stat(self.csv_path)
+        except FileNotFoundError:
+            return
+        
+        if stat.st_ino != self.inode or stat.st_size < self.indexed_size:
+            self._reset()
+            self._load()
+        elif stat.st_size > self.indexed_size:
+            self._catch_up()
+    
+    def record_rows(self, start_offset, rows):
+        """Index rows just appended to the CSV
+        
+        rows is a sequence of (datetime string, written length) pairs for rows
+        written contiguously from start_offset and already flushed to the
+        file. Caller must hold the lock.
+        """
+        # Catch up from the file if it was new or something else appended to it
+        if start_offset != self.indexed_size:
+            self._catch_up()
+            return
+        
+        new_entries = []
+        offset = start_offset
+        for value, length in rows:
+            self._observe(value, offset, new_entries)
+            offset += length
+        
+        self.indexed_size = offset
+        self._persist(new_entries)
+    
+    def locate(self, start_time=None, end_time=None):
+        """Return the (start, end) byte range covering a time window
+        
+        Times are unix seconds. end is None when the window reaches EOF.
+        Returns None when the index cannot be used for range queries.
+        """
+        if not self.ordered:
+            return None
+        
+        start_offset = self.data_start
+        if start_time is not None:
+            # Begin at the block before the first entry at or after start_time
+            position = bisect_left(self.times, start_time) - 1
+            if position >= 0:
+                start_offset = self.offsets[position]
+        
+        end_offset = None
+        if end_time is not None:
+            # Every row from the first entry after end_time onwards is too late
+            position = bisect_right(self.times, end_time)
+            if position < len(self.offsets):
+                end_offset = self.offsets[position]
+        
+        return start_offset, end_offset
@@ -1,92 +1,548 @@
 import os
-import csv
+import time
+import atexit
 import logging
-from datetime import datetime
+import itertools
+import threading
+from collections import defaultdict
 import pandas as pd
-from collections import deque
+
+from storage import CSV_HEADERS, create_storage
+from binary_storage import BinaryStorage, TickStore, frame_to_records
+from ring_buffer import CandleRingBuffer
+from file_catalog import FileCatalog
+from query_cache import DEFAULT_MAX_BYTES, QueryCache
+from wal import WriteAheadLog
+from metrics import CANDLES_WRITTEN, CANDLE_WRITE_SECONDS, TICKS_WRITTEN, candle_log
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
+def data_manager_from_env(data_dir='data', writer=True):
+    """DataManager configured from the DATA_* environment variables
+    
+    writer=False is for processes that only read files another process
+    records; they never replay, repair or index them on disk.
+    """
+    return DataManager(
+        data_dir,
+        backend=os.environ.get("DATA_BACKEND", "csv"),
+        write_behind=os.environ.get("DATA_WRITE_BEHIND", "0") == "1",
+        batch_size=int(os.environ.get("DATA_BATCH_SIZE", "100")),
+        flush_interval=float(os.environ.get("DATA_FLUSH_INTERVAL", "5")),
+        fsync_every=int(os.environ["DATA_FSYNC_EVERY"]) if os.environ.get("DATA_FSYNC_EVERY") else None,
+        binary_store=os.environ.get("DATA_BINARY_STORE", "0") == "1",
+        ring_depth=int(os.environ.get("DATA_RING_DEPTH", "100")),
+        rotate=os.environ.get("DATA_ROTATE") or None,
+        rotate_bytes=int(os.environ["DATA_ROTATE_BYTES"]) if os.environ.get("DATA_ROTATE_BYTES") else None,
+        compression=os.environ.get("DATA_COMPRESSION", "gzip"),
+        wal=writer and os.environ.get("DATA_WAL", "0") == "1",
+        wal_checkpoint_interval=float(os.environ.get("DATA_WAL_CHECKPOINT_INTERVAL", "60")),
+        query_cache_bytes=int(os.environ.get("DATA_QUERY_CACHE_BYTES", str(DEFAULT_MAX_BYTES))),
+        read_only=not writer
+    )
+
 class DataManager:
     """Class to manage data storage and retrieval"""
     
-    def __init__(self, data_dir='data'):
-        """Initialize the data manager with a directory for storing data"""
+    def __init__(self, data_dir='data', backend='csv', write_behind=False, batch_size=100,
+                 flush_interval=5.0, fsync_every=None, binary_store=False, ring_depth=100,
+                 rotate=None, rotate_bytes=None, compression='gzip', wal=False,
+                 wal_checkpoint_interval=60.0, query_cache_bytes=DEFAULT_MAX_BYTES, read_only=False):
+        """Initialize the data manager with a directory for storing data
+        
+        backend selects the storage format ('csv', 'parquet', 'binary' or
+        'sql', see sql_storage.DATABASE_URL). With the CSV
+        backend and write_behind enabled, files stay open per symbol/timeframe
+        and candles are batched in memory until batch_size rows are pending or
+        flush_interval seconds have passed. fsync_every=N forces the rows to
+        disk every N rows, with or without write_behind; None leaves it to
+        the operating system.
+        
+        binary_store additionally records every candle in the fixed-width
+        binary store that backs get_candle_array().
+        
+        ring_depth is how many recent candles are kept in memory per
+        symbol/timeframe for get_latest_data().
+        
+        rotate='day' starts a new CSV or binary file for every day, and
+        rotate_bytes once a file reaches that size. Closed files are
+        compressed in the background ('gzip' or 'zstd' for CSV, a delta
+        encoding for binary files) and stay readable through every getter.
+        
+        wal lets the recording process log every saved candle to data/wal/
+        before it is buffered, so large batch_size and flush_interval values
+        lose nothing if the process dies. Logging starts with open_wal(),
+        which first replays the log into the stream files, after cutting any
+        torn rows off their ends; every wal_checkpoint_interval seconds all
+        buffers are flushed and the log is started over.
+        
+        query_cache_bytes bounds the memory of the cache of get_dataframe()
+        results; 0 disables it.
+        
+        read_only=True is for processes that read files another process
+        writes; CSV time indexes are then kept in memory only.
+        """
         self.data_dir = data_dir
         
         # Create data directory if it doesn't exist
         if not os.path.exists(data_dir):
             os.makedirs(data_dir)
         
-        # Maintain a buffer of recent candles for quick access
-        self.recent_candles = deque(maxlen=100)
+        # Maintain a ring buffer of recent candles per stream for quick access
+        self.ring_depth = ring_depth
+        self.ring_buffers = {}
+        self.ring_lock = threading.Lock()
+        self.sequence = itertools.count()
+        
+        rotation = {'rotate': rotate, 'rotate_bytes': rotate_bytes, 'compression': compression}
+        self.storage = create_storage(
+            backend,
+            data_dir,
+            write_behind=write_behind,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            fsync_every=fsync_every,
+            read_only=read_only,
+            **rotation
+        )
+        
+        # The binary store sits beside the primary backend and is always readable
+        if isinstance(self.storage, BinaryStorage):
+            self.binary_storage = self.storage
+        else:
+            self.binary_storage = BinaryStorage(
+                data_dir,
+                batch_size=batch_size,
+                flush_interval=flush_interval,
+                fsync_every=fsync_every,
+                **rotation
+            )
+        self.binary_store = binary_store and self.binary_storage is not self.storage
+        
+        # Cached listing of the stored files, refreshed for streams written to
+        self.catalog = FileCatalog(self.storage)
+        
+        # Raw ticks are kept in their own append-only binary files
+        self.tick_store = TickStore(data_dir, fsync_every=fsync_every)
+        
+        # Callbacks invoked with (symbol, timeframe, candle_data) after each save
+        self.listeners = []
+        
+        # Callbacks invoked with (symbol, timeframe) after a bulk save
+        self.bulk_listeners = []
+        
+        # Parsed query results, kept current by the listeners above
+        self.query_cache = QueryCache(self, query_cache_bytes) if query_cache_bytes else None
+        
+        self.flush_interval = flush_interval
+        self.flusher_stop = threading.Event()
+        self.flusher_thread = None
+        self.flusher_lock = threading.Lock()
+        
+        # Held while a candle is logged and buffered, so a checkpoint falls
+        # between candles
+        self.wal = None
+        self.wal_enabled = wal
+        self.wal_lock = threading.Lock()
+        self.wal_checkpoint_interval = wal_checkpoint_interval
+        self.last_checkpoint = time.monotonic()
+        self.fsync_every = fsync_every
+        
+        if write_behind or backend != 'csv' or self.binary_store or wal:
+            self._start_flusher()
+    
+    def _start_flusher(self):
+        """Flush idle streams in the background and on interpreter shutdown"""
+        with self.flusher_lock:
+            if self.flusher_thread is not None:
+                return
+            self.flusher_thread = threading.Thread(target=self._flusher_worker, name='storage-flusher')
+            self.flusher_thread.daemon = True
+            self.flusher_thread.start()
+            atexit.register(self.close)
+    
+    def _stores(self):
+        """Backends every candle is written to"""
+        return [self.storage, self.binary_storage] if self.binary_store else [self.storage]
+    
+    def open_wal(self):
+        """Recover from and start the write-ahead log, in the recording process only
+        
+        Does nothing unless the manager was created with wal=True or once the
+        log is open. Raises RuntimeError if another process holds data/wal.
+        """
+        if not self.wal_enabled or self.wal is not None:
+            return
+        self._recover(self.fsync_every)
+    
+    def _recover(self, fsync_every):
+        """Replay candles the write-ahead log holds but the stream files lack"""
+        self.wal = WriteAheadLog(os.path.join(self.data_dir, 'wal'), fsync_every=fsync_every)
+        closed = self.wal.closed_files()
+        
+        pending = defaultdict(list)
+        for symbol, timeframe, row in self.wal.replay(closed):
+            pending[(symbol, timeframe)].append(row)
+        
+        recovered = 0
+        for (symbol, timeframe), rows in pending.items():
+            try:
+                for store in self._stores():
+                    store.repair_tail(symbol, timeframe)
+                    last = store.last_candle(symbol, timeframe)
+                    
+                    # Rows of a stream are logged in time order
+                    missing = [row for row in rows if last is None or row[0] > last['datetime']]
+                    if missing:
+                        store.append_many(symbol, timeframe, missing)
+                    if store is self.storage:
+                        recovered += len(missing)
+            
+            except Exception as e:
+                # The logs are kept, so the next start tries again
+                logger.error(f"Error recovering {symbol} ({timeframe}) from the write-ahead log: {str(e)}")
+                return
+            
+            ring = self._get_ring_buffer(symbol, timeframe)
+            for row in rows[-self.ring_depth:]:
+                ring.append(dict(zip(CSV_HEADERS, row)), next(self.sequence))
+        
+        # The logs are only dropped once everything they hold is on disk
+        self.flush(close=True)
+        self.wal.remove(closed)
+        if recovered:
+            logger.info(f"Recovered {recovered} candles from the write-ahead log")
+    
+    def checkpoint(self):
+        """Flush every buffered candle and drop the write-ahead log written so far"""
+        if self.wal is None:
+            return
+        
+        with self.wal_lock:
+            self.wal.rotate()
+        
+        # Candles logged before the rotation are already in the buffers
+        self.flush(close=self.storage.fsync_every is not None)
+        self.wal.remove(self.wal.closed_files())
+        self.last_checkpoint = time.monotonic()
     
     def save_candle(self, symbol, timeframe, candle_data):
-        """Save a candle to the appropriate CSV file"""
+        """Save a candle to the storage backend"""
         try:
-            # Create filename based on symbol and timeframe
-            filename = f"{symbol}_{timeframe}.csv"
-            filepath = os.path.join(self.data_dir, filename)
+            # Add the candle to the stream's ring of recent candles
+            self._get_ring_buffer(symbol, timeframe).append(candle_data, next(self.sequence))
             
-            # Check if file exists to determine if we need to write headers
-            file_exists = os.path.isfile(filepath)
+            start = time.perf_counter()
+            if self.wal is not None:
+                with self.wal_lock:
+                    self.wal.append(symbol, timeframe, [candle_data.get(field) for field in CSV_HEADERS])
+                    for store in self._stores():
+                        store.append(symbol, timeframe, candle_data)
+            else:
+                for store in self._stores():
+                    store.append(symbol, timeframe, candle_data)
+            CANDLE_WRITE_SECONDS.labels(self.storage.name).observe(time.perf_counter() - start)
+            CANDLES_WRITTEN.labels(symbol, timeframe).inc()
+            self.catalog.touch(symbol, timeframe)
             
-            # Define the headers for CSV file
-            headers = [
-                'datetime', 'symbol', 'timeframe', 'open', 'high', 'low', 'close', 'volume'
-            ]
+            if candle_log.sample():
+                logger.debug(f"Saved candle for {symbol} ({timeframe})")
+        
+        except Exception as e:
+            logger.error(f"Error saving candle data: {str(e)}")
+            return False
+        
+        # Notify subscribers only once the candle is stored
+        self._notify(symbol, timeframe, candle_data)
+        return True
+    
+    def save_candles(self, symbol, timeframe, candles):
+        """Save a batch of candles for one stream in a single write
+        
+        candles is a DataFrame with the CSV_HEADERS columns and datetime
+        strings, in time order. Per-candle listeners are not called for bulk
+        saves; bulk listeners are told which stream changed instead.
+        """
+        if candles.empty:
+            return True
+        
+        try:
+            rows = list(zip(*(candles[field].tolist() for field in CSV_HEADERS)))
+            self.storage.append_many(symbol, timeframe, rows)
+            if self.binary_store:
+                self.binary_storage.append_many(symbol, timeframe, rows)
             
-            # Add the candle to our recent candles deque
-            self.recent_candles.append(candle_data)
-            
-            # Write to CSV file
-            with open(filepath, 'a', newline='') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=headers)
-                
-                # Write headers if this is a new file
-                if not file_exists:
-                    writer.writeheader()
-                
-                # Write the candle data
-                writer.writerow(candle_data)
-            
-            logger.debug(f"Saved candle to {filepath}")
+            # Only the newest candles can still be in the recent-candle ring
+            ring = self._get_ring_buffer(symbol, timeframe)
+            for row in rows[-self.ring_depth:]:
+                ring.append(dict(zip(CSV_HEADERS, row)), next(self.sequence))
+            
+            CANDLES_WRITTEN.labels(symbol, timeframe).inc(len(rows))
+            self.catalog.touch(symbol, timeframe)
+            logger.debug(f"Saved {len(rows)} candles for {symbol} ({timeframe})")
+        
+        except Exception as e:
+            logger.error(f"Error saving candle batch: {str(e)}")
+            return False
+        
+        self._notify_bulk(symbol, timeframe)
+        return True
+    
+    def prepend_candles(self, symbol, timeframe, candles):
+        """Save a batch of candles older than every stored candle of the stream
+        
+        Used to fill history before a stream's first candle; see
+        StorageBackend.prepend_many. The recent-candle ring is left alone and
+        bulk listeners are told the stream changed.
+        """
+        if candles.empty:
             return True
         
+        try:
+            rows = list(zip(*(candles[field].tolist() for field in CSV_HEADERS)))
+            self.storage.prepend_many(symbol, timeframe, rows)
+            if self.binary_store:
+                self.binary_storage.prepend_many(symbol, timeframe, rows)
+            
+            CANDLES_WRITTEN.labels(symbol, timeframe).inc(len(rows))
+            self.catalog.touch(symbol, timeframe)
+            logger.debug(f"Saved {len(rows)} candles before the history of {symbol} ({timeframe})")
+        
         except Exception as e:
-            logger.error(f"Error saving candle data: {str(e)}")
+            logger.error(f"Error saving candle batch: {str(e)}")
+            return False
+        
+        self._notify_bulk(symbol, timeframe)
+        return True
+    
+    def get_stream_stats(self, symbol, timeframe):
+        """Row count and first/last candle time of a stream"""
+        try:
+            return self.storage.stream_stats(symbol, timeframe)
+        except Exception as e:
+            logger.error(f"Error reading stats for {symbol} ({timeframe}): {str(e)}")
+            return {'rows': 0, 'first': None, 'last': None}
+    
+    def _notify(self, symbol, timeframe, candle_data):
+        for listener in self.listeners:
+            try:
+                listener(symbol, timeframe, candle_data)
+            except Exception as e:
+                logger.error(f"Error in candle listener: {str(e)}")
+    
+    def _notify_bulk(self, symbol, timeframe):
+        for listener in self.bulk_listeners:
+            try:
+                listener(symbol, timeframe)
+            except Exception as e:
+                logger.error(f"Error in bulk candle listener: {str(e)}")
+    
+    def mirror_candle(self, symbol, timeframe, candle_data):
+        """Handle a candle that another process saved to the shared data directory
+        
+        Listeners are notified and the file catalog refreshes the stream, as
+        if the candle had been saved here.
+        """
+        self.catalog.touch(symbol, timeframe)
+        self._notify(symbol, timeframe, candle_data)
+    
+    def mirror_candles(self, symbol, timeframe):
+        """Handle a batch that another process saved with save_candles"""
+        self.catalog.touch(symbol, timeframe)
+        self._notify_bulk(symbol, timeframe)
+    
+    def mirror_resync(self):
+        """Handle candles another process saved that were never reported here
+        
+        Every stored stream is treated as if a batch was saved to it, so
+        bulk listeners drop what they derived from it and rebuild it from
+        storage.
+        """
+        streams = {(info['symbol'], info['timeframe']) for info in self.query_saved_files()['files']}
+        logger.info(f"Resynchronizing {len(streams)} streams with the recorder")
+        for symbol, timeframe in streams:
+            self.mirror_candles(symbol, timeframe)
+    
+    def get_last_candle(self, symbol, timeframe):
+        """Get the most recently stored candle of a stream, or None"""
+        try:
+            return self.storage.last_candle(symbol, timeframe)
+        except Exception as e:
+            logger.error(f"Error reading last candle for {symbol} ({timeframe}): {str(e)}")
+            return None
+    
+    def save_tick(self, symbol, time_ms, bid, ask):
+        """Append a raw tick (unix milliseconds, bid, ask) to the symbol's tick file"""
+        try:
+            # Ticks are buffered, so make sure idle chunks still reach the disk
+            if self.flusher_thread is None:
+                self._start_flusher()
+            
+            self.tick_store.append(symbol, time_ms, bid, ask)
+            TICKS_WRITTEN.labels(symbol).inc()
+            return True
+        except Exception as e:
+            logger.error(f"Error saving tick data: {str(e)}")
             return False
     
-    def get_latest_data(self, count=10):
-        """Get the latest recorded candles"""
+    def flush_ticks(self, symbol=None, close=False):
+        """Write buffered ticks to disk for one symbol or all of them"""
+        self.tick_store.flush(symbol, close=close)
+    
+    def get_ticks(self, symbol, start_ms=None, end_ms=None):
+        """Get a symbol's raw ticks as a TICK_DTYPE structured array
+        
+        The array is a read-only view of the memory-mapped tick file, or None
+        if no ticks were recorded for the symbol.
+        """
         try:
-            # Get the last 'count' items from the deque
-            latest = list(self.recent_candles)[-count:]
-            return latest
+            return self.tick_store.get_ticks(symbol, start_ms, end_ms)
+        except Exception as e:
+            logger.error(f"Error reading ticks for {symbol}: {str(e)}")
+            return None
+    
+    def _get_ring_buffer(self, symbol, timeframe):
+        """Get or create the recent-candle ring buffer for a stream"""
+        key = (symbol, timeframe)
+        ring = self.ring_buffers.get(key)
+        if ring is None:
+            with self.ring_lock:
+                ring = self.ring_buffers.get(key)
+                if ring is None:
+                    ring = CandleRingBuffer(symbol, timeframe, self.ring_depth)
+                    self.ring_buffers[key] = ring
+        return ring
+    
+    def add_listener(self, callback):
+        """Register a callback(symbol, timeframe, candle_data) run after each saved candle"""
+        self.listeners.append(callback)
+    
+    def remove_listener(self, callback):
+        """Unregister a callback added with add_listener"""
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+    
+    def add_bulk_listener(self, callback):
+        """Register a callback(symbol, timeframe) run after each save_candles batch"""
+        self.bulk_listeners.append(callback)
+    
+    def remove_bulk_listener(self, callback):
+        """Unregister a callback added with add_bulk_listener"""
+        if callback in self.bulk_listeners:
+            self.bulk_listeners.remove(callback)
+    
+    def flush(self, symbol=None, timeframe=None, close=False):
+        """Write buffered candles to disk
+        
+        Flushes every stream by default, or only those matching symbol and/or
+        timeframe. With close=True the open files are closed as well.
+        """
+        self.storage.flush(symbol, timeframe, close=close)
+        if self.binary_store:
+            self.binary_storage.flush(symbol, timeframe, close=close)
+    
+    def close(self):
+        """Flush all buffered candles and close open files"""
+        self.flusher_stop.set()
+        self.checkpoint()
+        self.flush(close=True)
+        self.flush_ticks(close=True)
+    
+    def _flusher_worker(self):
+        """Background thread that flushes buffers older than flush_interval"""
+        while not self.flusher_stop.wait(self.flush_interval):
+            self.storage.flush(older_than=self.flush_interval)
+            if self.binary_store:
+                self.binary_storage.flush(older_than=self.flush_interval)
+            self.tick_store.flush(older_than=self.flush_interval)
+            
+            if self.wal is not None and time.monotonic() - self.last_checkpoint >= self.wal_checkpoint_interval:
+                try:
+                    self.checkpoint()
+                except Exception as e:
+                    logger.error(f"Error checkpointing the write-ahead log: {str(e)}")
+    
+    def get_buffer_stats(self):
+        """Rows waiting in write buffers per store, and candles held in the recent-candle rings"""
+        stats = {'buffered_rows': {}, 'ring_candles': {}}
+        
+        stores = [(self.storage.name, self.storage)]
+        if self.binary_store:
+            stores.append(('binary', self.binary_storage))
+        for name, store in stores:
+            buffers = list(store.buffers.values())
+            stats['buffered_rows'][name] = sum(len(buffer.rows) for buffer in buffers)
+        stats['buffered_rows']['ticks'] = sum(buffer.size for buffer in list(self.tick_store.buffers.values()))
+        
+        for (symbol, timeframe), ring in list(self.ring_buffers.items()):
+            stats['ring_candles'][(symbol, timeframe)] = len(ring)
+        return stats
+    
+    def get_latest_data(self, count=10, symbol=None, timeframe=None):
+        """Get the latest recorded candles, oldest first
+        
+        With symbol and timeframe this reads only that stream's ring buffer.
+        Otherwise the tails of every matching stream are merged in the order
+        the candles were saved.
+        """
+        try:
+            if symbol is not None and timeframe is not None:
+                ring = self.ring_buffers.get((symbol, timeframe))
+                return ring.latest(count) if ring is not None else []
+            
+            rings = [
+                ring for key, ring in list(self.ring_buffers.items())
+                if (symbol is None or key[0] == symbol)
+                and (timeframe is None or key[1] == timeframe)
+            ]
+            
+            # Take each stream's tail, then keep the newest 'count' overall
+            candidates = []
+            for ring in rings:
+                for record in ring.tail(count):
+                    candidates.append((int(record['seq']), ring, record))
+            candidates.sort(key=lambda item: item[0])
+            
+            latest = candidates[-count:] if count > 0 else []
+            return [ring.to_dicts([record])[0] for _, ring, record in latest]
         
         except Exception as e:
             logger.error(f"Error getting latest data: {str(e)}")
             return []
     
-    def get_data_for_symbol(self, symbol, timeframe, start_date=None, end_date=None):
-        """Get historical data for a specific symbol and timeframe"""
+    def get_dataframe(self, symbol, timeframe, start_date=None, end_date=None, columns=None):
+        """Get historical data as a DataFrame, or None if the stream has no data
+        
+        The datetime column may be strings or datetimes depending on the
+        backend and whether a range was requested.
+        """
+        if self.query_cache is not None:
+            df = self.query_cache.get(
+                symbol, timeframe, start_date, end_date, columns,
+                lambda: self.storage.read(symbol, timeframe, start_date, end_date, columns)
+            )
+        else:
+            df = self.storage.read(symbol, timeframe, start_date, end_date, columns)
+        if df is None:
+            logger.warning(f"No data file found for {symbol} ({timeframe})")
+        return df
+    
+    def get_data_for_symbol(self, symbol, timeframe, start_date=None, end_date=None, columns=None):
+        """Get historical data for a specific symbol and timeframe
+        
+        Only the requested columns are loaded (datetime is always included).
+        """
         try:
-            filename = f"{symbol}_{timeframe}.csv"
-            filepath = os.path.join(self.data_dir, filename)
+            df = self.get_dataframe(symbol, timeframe, start_date, end_date, columns)
             
-            if not os.path.isfile(filepath):
-                logger.warning(f"No data file found for {symbol} ({timeframe})")
+            if df is None:
                 return []
             
-            # Load the CSV file using pandas
-            df = pd.read_csv(filepath)
-            
-            # Filter by date range if provided
-            if start_date and end_date:
-                df['datetime'] = pd.to_datetime(df['datetime'])
-                df = df[(df['datetime'] >= start_date) & (df['datetime'] <= end_date)]
+            # Keep the datetime format used in the CSV files
+            if pd.api.types.is_datetime64_any_dtype(df['datetime']):
+                df['datetime'] = df['datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')
             
             # Convert back to list of dictionaries
             records = df.to_dict('records')
@@ -96,35 +552,85 @@ class DataManager:
             logger.error(f"Error getting data for symbol: {str(e)}")
             return []
     
+    def get_candle_array(self, symbol, timeframe, start_date=None, end_date=None):
+        """Get candles from the binary store as a NumPy structured array
+        
+        The result is a zero-copy, read-only view into the memory-mapped
+        file (see binary_storage.CANDLE_DTYPE), or None if the stream has no
+        binary data. Existing CSV files can be imported with
+        binary_storage.convert_csv_files().
+        """
+        try:
+            records = self.binary_storage.get_array(symbol, timeframe, start_date, end_date)
+            if records is None:
+                logger.warning(f"No binary data file found for {symbol} ({timeframe})")
+            return records
+        
+        except Exception as e:
+            logger.error(f"Error getting candle array: {str(e)}")
+            return None
+    
+    def get_candle_records(self, symbol, timeframe, start_date=None, end_date=None):
+        """Get candles as a CANDLE_DTYPE array from whichever store is recorded
+        
+        Uses the binary store when it is kept up to date, and converts the
+        primary backend's rows otherwise. Returns None if the stream has no
+        data.
+        """
+        if self.binary_store or self.binary_storage is self.storage:
+            return self.binary_storage.get_array(symbol, timeframe, start_date, end_date)
+        
+        df = self.get_dataframe(symbol, timeframe, start_date, end_date, ['open', 'high', 'low', 'close', 'volume'])
+        if df is None:
+            return None
+        return frame_to_records(df)
+    
+    def get_appended(self, symbol, timeframe, previous=None, columns=None):
+        """Candles stored since an earlier call, in storage order
+        
+        See StorageBackend.read_appended; returns (df, position), or None when
+        the stream must be read from the start again.
+        """
+        return self.storage.read_appended(symbol, timeframe, previous, columns)
+    
+    def export_csv(self, symbol, timeframe, filepath=None, start_date=None, end_date=None):
+        """Export stored candles to a CSV file in the original column layout
+        
+        Returns the path written, or None if there is no data to export.
+        """
+        try:
+            df = self.storage.read(symbol, timeframe, start_date, end_date)
+            if df is None:
+                logger.warning(f"No data file found for {symbol} ({timeframe})")
+                return None
+            
+            if filepath is None:
+                filepath = os.path.join(self.data_dir, f"{symbol}_{timeframe}.csv")
+            
+            if pd.api.types.is_datetime64_any_dtype(df['datetime']):
+                df['datetime'] = df['datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')
+            
+            df[CSV_HEADERS].to_csv(filepath, index=False)
+            return filepath
+        
+        except Exception as e:
+            logger.error(f"Error exporting {symbol} ({timeframe}) to CSV: {str(e)}")
+            return None
+    
     def get_saved_files(self):
-        """Get a list of all saved CSV files"""
+        """Get a list of all saved data files, newest first"""
+        return self.query_saved_files()['files']
+    
+    def query_saved_files(self, symbol=None, timeframe=None, offset=0, limit=None):
+        """Get a page of saved files, optionally for one symbol and/or timeframe
+        
+        Each file has its size, modification time, row count and first/last
+        candle time. Returns {'files': [...], 'total': matching file count}.
+        """
         try:
-            files = []
-            for filename in os.listdir(self.data_dir):
-                if filename.endswith('.csv'):
-                    # Extract symbol and timeframe from filename
-                    parts = filename.replace('.csv', '').split('_')
-                    if len(parts) >= 2:
-                        symbol = parts[0]
-                        timeframe = parts[1]
-                        
-                        # Get file stats
-                        filepath = os.path.join(self.data_dir, filename)
-                        file_size = os.path.getsize(filepath)
-                        modified_time = os.path.getmtime(filepath)
-                        
-                        files.append({
-                            'filename': filename,
-                            'symbol': symbol,
-                            'timeframe': timeframe,
-                            'size': file_size,
-                            'modified': datetime.fromtimestamp(modified_time).strftime('%Y-%m-%d %H:%M:%S')
-                        })
-            
-            # Sort by modification time (newest first)
-            files.sort(key=lambda x: x['modified'], reverse=True)
-            return files
+            files, total = self.catalog.query(symbol, timeframe, offset, limit)
+            return {'files': files, 'total': total}
         
         except Exception as e:
             logger.error(f"Error getting saved files: {str(e)}")
-            return []
+            return {'files': [], 'total': 0}
@@ -0,0 +1,149 @@
+import os
+import math
+import logging
+import numpy as np
+
+from storage import _format_epoch, _to_epoch
+from resampler import FIXED_TIMEFRAMES
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+# Bounds for the requested chart width in points
+MIN_WIDTH = 10
+MAX_WIDTH = 10000
+
+# Points per page unless the client asks for fewer
+DEFAULT_PAGE_POINTS = 2000
+
+# Lower bound on bucket length for calendar timeframes
+CALENDAR_TIMEFRAME_SECONDS = {'W1': 7 * 86400, 'MN1': 28 * 86400}
+
+def lttb_indices(x, y, threshold):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps
+    
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the point kept
+    before it and the average of the next bucket.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    kept = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_lo, next_hi = edges[i + 1], edges[i + 2]
+        else:
+            next_lo, next_hi = n - 1, n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        
+        area = np.abs(
+            (x[kept] - avg_x) * (y[lo:hi] - y[kept])
+            - (x[kept] - x[lo:hi]) * (avg_y - y[kept])
+        )
+        kept = lo + int(np.argmax(area))
+        selected[i + 1] = kept
+    return selected
+
+def minmax_indices(times, values, bucket_seconds):
+    """Indices of the lowest and highest value in every time bucket, in time order"""
+    if len(values) == 0:
+        return np.arange(0)
+    
+    buckets = times // bucket_seconds
+    lowest = np.lexsort((values, buckets))
+    highest = np.lexsort((-values, buckets))
+    
+    # Both orders group the rows by bucket; take the first row of each group
+    starts = np.flatnonzero(np.diff(buckets[lowest], prepend=buckets[lowest][0] - 1))
+    return np.union1d(lowest[starts], highest[starts])
+
+def timeframe_seconds(timeframe):
+    if timeframe in FIXED_TIMEFRAMES:
+        return FIXED_TIMEFRAMES[timeframe] * 60
+    if timeframe in CALENDAR_TIMEFRAME_SECONDS:
+        return CALENDAR_TIMEFRAME_SECONDS[timeframe]
+    raise ValueError(f"Unsupported timeframe: {timeframe}")
+
+def chart_page(data_manager, symbol, timeframe, width, method='lttb', start_date=None,
+               end_date=None, cursor=None, page_points=DEFAULT_PAGE_POINTS):
+    """One page of a chart-ready, downsampled candle series
+    
+    The range [start_date, end_date] (the whole stream by default) is cut
+    into width time buckets aligned to the epoch, so every page and every
+    request for the same view agrees on its buckets. A page covers at most
+    page_points buckets starting at cursor (unix seconds, from next_cursor of
+    the previous page). 'lttb' keeps one candle per bucket, 'minmax' the
+    candles with the lowest and highest close of each bucket.
+    
+    Returns a dict with the kept candles as columns, or None if the stream
+    has no data.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    width = min(max(int(width), MIN_WIDTH), MAX_WIDTH)
+    page_points = max(int(page_points), 1)
+    
+    start, end = _to_epoch(start_date), _to_epoch(end_date)
+    if start is None or end is None:
+        info = data_manager.query_saved_files(symbol, timeframe)['files']
+        if not info or info[0]['first'] is None:
+            return None
+        start = start if start is not None else _to_epoch(info[0]['first'])
+        end = end if end is not None else _to_epoch(info[0]['last'])
+    
+    # Two candles per bucket with minmax, so its buckets are twice as long
+    points_per_bucket = 2 if method == 'minmax' else 1
+    bucket_seconds = max(
+        timeframe_seconds(timeframe),
+        math.ceil(max(end - start, 1) * points_per_bucket / width)
+    )
+    
+    page_start = start - start % bucket_seconds if cursor is None else int(cursor)
+    page_end = page_start + bucket_seconds * max(page_points // points_per_bucket, 1) - 1
+    next_cursor = page_end + 1 if page_end < end else None
+    
+    records = data_manager.get_candle_records(
+        symbol, timeframe, _format_epoch(max(page_start, start)), _format_epoch(min(page_end, end))
+    )
+    if records is None:
+        return None
+    
+    times = np.asarray(records['time'])
+    closes = np.asarray(records['close'])
+    if method == 'lttb':
+        buckets = len(np.unique(times // bucket_seconds))
+        kept = lttb_indices(times, closes, buckets)
+    else:
+        kept = minmax_indices(times, closes, bucket_seconds)
+    
+    selected = records[kept]
+    return {
+        'symbol': symbol,
+        'timeframe': timeframe,
+        'method': method,
+        'bucket_seconds': bucket_seconds,
+        'source_candles': len(records),
+        'columns': {
+            'time': selected['time'].tolist(),
+            'open': selected['open'].tolist(),
+            'high': selected['high'].tolist(),
+            'low': selected['low'].tolist(),
+            'close': selected['close'].tolist(),
+            'volume': selected['volume'].tolist()
+        },
+        'next_cursor': next_cursor
+    }
@@ -0,0 +1,96 @@
+import os
+import time
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Seconds between full directory scans that pick up files changed by other processes
+DEFAULT_RESCAN_INTERVAL = 30.0
+
+class FileCatalog:
+    """Cached description of every stored stream for /api/saved_files
+    
+    Entries hold the list_files fields plus the row count and first/last
+    candle time. DataManager marks streams it writes to with touch(), and
+    only those are re-described on the next query; the full directory is
+    rescanned every rescan_interval seconds, re-describing only files whose
+    size or modification time changed.
+    """
+    
+    def __init__(self, storage, rescan_interval=DEFAULT_RESCAN_INTERVAL):
+        self.storage = storage
+        self.rescan_interval = rescan_interval
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.last_scan = None
+        
+        # Streams written since the last query, under their own lock so
+        # touch never waits for a query that is re-describing files
+        self.touched = set()
+        self.touched_lock = threading.Lock()
+    
+    def touch(self, symbol, timeframe):
+        """Mark a stream as changed; cheap enough for the save_candle hot path"""
+        with self.touched_lock:
+            self.touched.add((symbol, timeframe))
+    
+    def _refresh(self, key, info=None):
+        """Re-describe one stream; caller must hold the lock"""
+        if info is None:
+            info = self.storage.file_info(*key)
+        if info is None:
+            self.entries.pop(key, None)
+            return
+        
+        previous = self.entries.get(key)
+        stats = self.storage.stream_stats(*key, previous=previous['stats'] if previous else None)
+        entry = dict(info)
+        entry.update(rows=stats['rows'], first=stats['first'], last=stats['last'], stats=stats)
+        self.entries[key] = entry
+    
+    def _rescan(self):
+        """Compare the directory with the cache; caller must hold the lock"""
+        seen = set()
+        for info in self.storage.list_files():
+            key = (info['symbol'], info['timeframe'])
+            seen.add(key)
+            entry = self.entries.get(key)
+            if (entry is None or entry['size'] != info['size']
+                    or entry['modified_time'] != info['modified_time']):
+                self._refresh(key, info)
+        
+        for key in set(self.entries) - seen:
+            del self.entries[key]
+        self.last_scan = time.monotonic()
+    
+    def _update(self):
+        """Bring the cache up to date; caller must hold the lock"""
+        # Detach the set so touches during the refresh go into a new one
+        with self.touched_lock:
+            touched, self.touched = self.touched, set()
+        if self.last_scan is None or time.monotonic() - self.last_scan >= self.rescan_interval:
+            self._rescan()
+            return
+        
+        for key in touched:
+            try:
+                self._refresh(key)
+            except Exception as e:
+                logger.error(f"Error describing {key[0]} ({key[1]}): {str(e)}")
+    
+    def query(self, symbol=None, timeframe=None, offset=0, limit=None):
+        """Matching files, newest first, as (page of entries, total matches)"""
+        with self.lock:
+            self._update()
+            entries = [
+                entry for (entry_symbol, entry_timeframe), entry in self.entries.items()
+                if (symbol is None or entry_symbol == symbol)
+                and (timeframe is None or entry_timeframe == timeframe)
+            ]
+        
+        entries.sort(key=lambda entry: entry['modified_time'], reverse=True)
+        page = entries[offset:] if limit is None else entries[offset:offset + limit]
+        return [{k: v for k, v in entry.items() if k != 'stats'} for entry in page], len(entries)
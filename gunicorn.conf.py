@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import secrets
+import subprocess
+from multiprocessing.connection import Client
+
+# gunicorn reads this file before it changes into the app directory
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from recorder_service import DEFAULT_ADDRESS, parse_address, recorder_authkey
+
+# gunicorn -c gunicorn.conf.py app:app
+#
+# The read API runs in several workers, while a single recorder process
+# started here owns the MT5 connection and writes every candle. Workers
+# find it through RECORDER_ADDRESS, which they inherit from the master.
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', str(min(4, os.cpu_count() or 1))))
+
+# Threads keep long-lived Server-Sent Events streams from blocking a worker.
+# Each open /api/stream holds one thread, so streams are capped per worker
+# below the thread count and the rest stay free for API requests; with the
+# defaults 4 workers serve up to 96 dashboards. Raise WEB_THREADS for more.
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', '32'))
+
+# Threads per worker kept for requests other than event streams
+API_THREADS = 8
+
+os.environ.setdefault('STREAM_MAX_SUBSCRIBERS', str(max(threads - API_THREADS, 1)))
+
+os.environ.setdefault('RECORDER_ADDRESS', DEFAULT_ADDRESS)
+
+# Seconds to wait for the recorder to accept connections before starting workers
+RECORDER_STARTUP_TIMEOUT = 30
+
+def _recorder_ready(address):
+    try:
+        Client(address, authkey=recorder_authkey()).close()
+        return True
+    except OSError:
+        return False
+
+def on_starting(server):
+    """Start the recorder process before any worker is forked"""
+    # The recorder and the workers inherit the key through the environment
+    if not (os.environ.get('RECORDER_AUTHKEY') or os.environ.get('SESSION_SECRET')):
+        os.environ['RECORDER_AUTHKEY'] = secrets.token_hex(32)
+    
+    address = parse_address(os.environ['RECORDER_ADDRESS'])
+    server.recorder_process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recorder_service.py')]
+    )
+    
+    deadline = time.monotonic() + RECORDER_STARTUP_TIMEOUT
+    while not _recorder_ready(address):
+        if server.recorder_process.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError(f"Recorder process did not start listening on {os.environ['RECORDER_ADDRESS']}")
+        time.sleep(0.1)
+    server.log.info(f"Recorder process {server.recorder_process.pid} listening on {os.environ['RECORDER_ADDRESS']}")
+
+def on_exit(server):
+    """Stop the recorder, which flushes its buffered candles"""
+    process = getattr(server, 'recorder_process', None)
+    if process is not None and process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=RECORDER_STARTUP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
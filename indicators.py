@@ -0,0 +1,408 @@
+import os
+import math
+import logging
+import threading
+from collections import OrderedDict, deque
+import numpy as np
+import pandas as pd
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Indicators computed unless INDICATORS lists others, as name[:period]
+DEFAULT_INDICATORS = os.environ.get('INDICATORS', 'sma:20,ema:20,atr:14,rsi:14,vwap')
+
+# Recent indicator values kept per stream, matching the recent-candle ring
+DEFAULT_HISTORY = 100
+
+def _value(value):
+    """JSON-friendly indicator value; None while the indicator is warming up"""
+    if value is None or math.isnan(value):
+        return None
+    return float(value)
+
+class SMA:
+    """Simple moving average of the close"""
+    
+    def __init__(self, period):
+        self.period = period
+        self.name = f"sma_{period}"
+        self.window = deque()
+        self.total = 0.0
+    
+    def series(self, df):
+        return df['close'].rolling(self.period).mean()
+    
+    def resume(self, df):
+        self.window = deque(df['close'].iloc[-self.period:].astype(float))
+        self.total = sum(self.window)
+    
+    def update(self, candle):
+        self.window.append(candle['close'])
+        self.total += candle['close']
+        if len(self.window) > self.period:
+            self.total -= self.window.popleft()
+        return self.total / self.period if len(self.window) == self.period else None
+
+class EMA:
+    """Exponential moving average of the close, seeded with the first close"""
+    
+    def __init__(self, period):
+        self.period = period
+        self.name = f"ema_{period}"
+        self.alpha = 2.0 / (period + 1)
+        self.value = None
+        self.count = 0
+    
+    def series(self, df):
+        return df['close'].ewm(span=self.period, adjust=False, min_periods=self.period).mean()
+    
+    def resume(self, df):
+        self.count = len(df)
+        self.value = float(df['close'].ewm(span=self.period, adjust=False).mean().iloc[-1]) if len(df) else None
+    
+    def update(self, candle):
+        close = candle['close']
+        self.value = close if self.value is None else self.value + self.alpha * (close - self.value)
+        self.count += 1
+        return self.value if self.count >= self.period else None
+
+class ATR:
+    """Average true range with Wilder's smoothing"""
+    
+    def __init__(self, period):
+        self.period = period
+        self.name = f"atr_{period}"
+        self.value = None
+        self.previous_close = None
+        self.count = 0
+    
+    def _true_range(self, df):
+        previous = df['close'].shift(1)
+        return pd.Series(np.fmax(
+            df['high'] - df['low'],
+            np.fmax((df['high'] - previous).abs(), (df['low'] - previous).abs())
+        ), index=df.index)
+    
+    def series(self, df):
+        return self._true_range(df).ewm(alpha=1.0 / self.period, adjust=False, min_periods=self.period).mean()
+    
+    def resume(self, df):
+        self.count = len(df)
+        if len(df):
+            self.value = float(self._true_range(df).ewm(alpha=1.0 / self.period, adjust=False).mean().iloc[-1])
+            self.previous_close = float(df['close'].iloc[-1])
+    
+    def update(self, candle):
+        true_range = candle['high'] - candle['low']
+        if self.previous_close is not None:
+            true_range = max(
+                true_range, abs(candle['high'] - self.previous_close), abs(candle['low'] - self.previous_close)
+            )
+        self.previous_close = candle['close']
+        self.value = true_range if self.value is None else self.value + (true_range - self.value) / self.period
+        self.count += 1
+        return self.value if self.count >= self.period else None
+
+class RSI:
+    """Relative strength index with Wilder's smoothing"""
+    
+    def __init__(self, period):
+        self.period = period
+        self.name = f"rsi_{period}"
+        self.gain = None
+        self.loss = None
+        self.previous_close = None
+        self.count = 0
+    
+    def _averages(self, df, min_periods=0):
+        delta = df['close'].diff().iloc[1:]
+        alpha = 1.0 / self.period
+        gain = delta.clip(lower=0).ewm(alpha=alpha, adjust=False, min_periods=min_periods).mean()
+        loss = (-delta).clip(lower=0).ewm(alpha=alpha, adjust=False, min_periods=min_periods).mean()
+        return gain, loss
+    
+    @staticmethod
+    def _rsi(gain, loss):
+        if loss == 0:
+            return 100.0 if gain > 0 else 50.0
+        return 100.0 - 100.0 / (1.0 + gain / loss)
+    
+    def series(self, df):
+        gain, loss = self._averages(df, self.period)
+        rsi = 100.0 - 100.0 / (1.0 + gain / loss)
+        rsi[(loss == 0) & (gain > 0)] = 100.0
+        rsi[(loss == 0) & (gain == 0)] = 50.0
+        return rsi.reindex(df.index)
+    
+    def resume(self, df):
+        self.count = max(len(df) - 1, 0)
+        if len(df):
+            self.previous_close = float(df['close'].iloc[-1])
+        if len(df) > 1:
+            gain, loss = self._averages(df)
+            self.gain, self.loss = float(gain.iloc[-1]), float(loss.iloc[-1])
+    
+    def update(self, candle):
+        close = candle['close']
+        if self.previous_close is None:
+            self.previous_close = close
+            return None
+        
+        delta = close - self.previous_close
+        self.previous_close = close
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        if self.gain is None:
+            self.gain, self.loss = gain, loss
+        else:
+            self.gain += (gain - self.gain) / self.period
+            self.loss += (loss - self.loss) / self.period
+        self.count += 1
+        return self._rsi(self.gain, self.loss) if self.count >= self.period else None
+
+class VWAP:
+    """Volume-weighted average of the typical price, restarting every day"""
+    
+    def __init__(self, period=None):
+        self.name = 'vwap'
+        self.day = None
+        self.price_volume = 0.0
+        self.volume = 0.0
+    
+    @staticmethod
+    def _days(df):
+        return pd.to_datetime(df['datetime']).dt.strftime('%Y-%m-%d')
+    
+    def series(self, df):
+        typical = (df['high'] + df['low'] + df['close']) / 3
+        days = self._days(df)
+        price_volume = (typical * df['volume']).groupby(days).cumsum()
+        volume = df['volume'].groupby(days).cumsum().astype(float)
+        return price_volume / volume.where(volume > 0)
+    
+    def resume(self, df):
+        if not len(df):
+            return
+        days = self._days(df)
+        self.day = days.iloc[-1]
+        today = df[days == self.day]
+        self.price_volume = float((((today['high'] + today['low'] + today['close']) / 3) * today['volume']).sum())
+        self.volume = float(today['volume'].sum())
+    
+    def update(self, candle):
+        day = str(candle['datetime'])[:10]
+        if day != self.day:
+            self.day, self.price_volume, self.volume = day, 0.0, 0.0
+        self.price_volume += (candle['high'] + candle['low'] + candle['close']) / 3 * candle['volume']
+        self.volume += candle['volume']
+        return self.price_volume / self.volume if self.volume > 0 else None
+
+INDICATOR_TYPES = {'sma': SMA, 'ema': EMA, 'atr': ATR, 'rsi': RSI, 'vwap': VWAP}
+
+def parse_indicators(spec):
+    """(type, period) pairs from a 'sma:20,rsi:14,vwap' specification"""
+    parsed = []
+    for item in spec.split(','):
+        item = item.strip().lower()
+        if not item:
+            continue
+        name, _, period = item.partition(':')
+        if name not in INDICATOR_TYPES:
+            raise ValueError(f"Unknown indicator: {name}")
+        parsed.append((name, int(period) if period else None))
+    return parsed
+
+def build_indicators(specs):
+    return [INDICATOR_TYPES[name](period) if period else INDICATOR_TYPES[name]() for name, period in specs]
+
+def compute_indicators(df, specs):
+    """Indicator columns for a time-ordered candle DataFrame, vectorized"""
+    columns = OrderedDict()
+    for indicator in build_indicators(specs):
+        columns[indicator.name] = indicator.series(df)
+    return pd.DataFrame(columns, index=df.index)
+
+class StreamIndicators:
+    """Rolling indicator state of one stream plus its recent values"""
+    
+    __slots__ = ('indicators', 'last_time', 'recent')
+    
+    def __init__(self, indicators):
+        self.indicators = indicators
+        self.last_time = None
+        
+        # datetime string -> indicator values, oldest first
+        self.recent = OrderedDict()
+
+class IndicatorEngine:
+    """Keeps indicators of every recorded stream current as candles are saved
+    
+    A stream's indicators are computed over its stored history in
+    vectorized form the first time they are read; from then on each saved
+    candle updates them in O(1) from rolling state. The history is read
+    outside the engine's lock, and candles saved meanwhile are applied once
+    it is loaded, so the save path never waits for a warm-up. A bulk save or
+    an out-of-order candle discards the state, which is rebuilt on the next
+    read. Values of the last history candles per stream are kept for the
+    latest-data API, and annotate_frame adds the same indicators to
+    historical candles.
+    """
+    
+    def __init__(self, data_manager, spec=DEFAULT_INDICATORS, history=DEFAULT_HISTORY):
+        self.data_manager = data_manager
+        self.specs = parse_indicators(spec)
+        self.names = [indicator.name for indicator in build_indicators(self.specs)]
+        self.history = history
+        self.streams = {}
+        self.lock = threading.Lock()
+        
+        # Candles saved while a stream's history is being read, per stream
+        self.warming = {}
+        
+        # One warm-up per stream at a time
+        self.warm_locks = {}
+        
+        data_manager.add_listener(self.on_candle)
+        data_manager.add_bulk_listener(self.on_bulk_save)
+    
+    def _build(self, symbol, timeframe):
+        """Indicator state of a stream computed from its stored candles"""
+        df = self.data_manager.get_dataframe(symbol, timeframe)
+        stream = StreamIndicators(build_indicators(self.specs))
+        
+        if df is not None and len(df):
+            df = df.reset_index(drop=True)
+            for indicator in stream.indicators:
+                indicator.resume(df)
+            
+            tail = df.iloc[-self.history:]
+            values = compute_indicators(df, self.specs).iloc[-self.history:]
+            times = pd.to_datetime(tail['datetime']).dt.strftime('%Y-%m-%d %H:%M:%S')
+            for time_str, row in zip(times, values.itertuples(index=False)):
+                stream.recent[time_str] = dict(zip(self.names, (_value(value) for value in row)))
+            stream.last_time = times.iloc[-1]
+        return stream
+    
+    def _update(self, stream, candle_data):
+        """Advance a stream's state by one newer candle; caller must hold the lock"""
+        values = {
+            indicator.name: _value(indicator.update(candle_data))
+            for indicator in stream.indicators
+        }
+        stream.last_time = candle_data['datetime']
+        stream.recent[candle_data['datetime']] = values
+        if len(stream.recent) > self.history:
+            stream.recent.popitem(last=False)
+    
+    def _stream(self, symbol, timeframe):
+        """A stream's indicator state, reading its history on first use"""
+        key = (symbol, timeframe)
+        with self.lock:
+            stream = self.streams.get(key)
+            if stream is not None:
+                return stream
+            warm_lock = self.warm_locks.setdefault(key, threading.Lock())
+        
+        with warm_lock:
+            with self.lock:
+                stream = self.streams.get(key)
+                if stream is not None:
+                    return stream
+                self.warming[key] = []
+            
+            try:
+                stream = self._build(symbol, timeframe)
+            finally:
+                with self.lock:
+                    pending = self.warming.pop(key)
+            
+            with self.lock:
+                # A bulk save during the read made the history stale; rebuild next time
+                if pending is None:
+                    return stream
+                
+                # Candles saved after the history was read
+                for candle_data in pending:
+                    if stream.last_time is None or candle_data['datetime'] > stream.last_time:
+                        self._update(stream, candle_data)
+                self.streams[key] = stream
+            return stream
+    
+    def on_candle(self, symbol, timeframe, candle_data):
+        """Update a stream's indicators with a newly saved candle"""
+        key = (symbol, timeframe)
+        try:
+            with self.lock:
+                if key in self.warming:
+                    pending = self.warming[key]
+                    if pending is not None:
+                        pending.append(candle_data)
+                    return
+                
+                # Streams nobody has read yet are warmed up lazily
+                stream = self.streams.get(key)
+                if stream is None:
+                    return
+                
+                if stream.last_time is not None and candle_data['datetime'] <= stream.last_time:
+                    del self.streams[key]
+                    return
+                
+                self._update(stream, candle_data)
+        
+        except Exception as e:
+            logger.error(f"Error updating indicators for {symbol} ({timeframe}): {str(e)}")
+            with self.lock:
+                self.streams.pop(key, None)
+    
+    def on_bulk_save(self, symbol, timeframe):
+        key = (symbol, timeframe)
+        with self.lock:
+            self.streams.pop(key, None)
+            if key in self.warming:
+                self.warming[key] = None
+    
+    def latest(self, symbol, timeframe):
+        """Indicator values of a stream's newest candle, or None"""
+        stream = self._stream(symbol, timeframe)
+        with self.lock:
+            if not stream.recent:
+                return None
+            return next(reversed(stream.recent.values()))
+    
+    def annotate_latest(self, candles):
+        """Add indicator values to recent candle dicts (as returned by latest_data)"""
+        streams = {}
+        for candle in candles:
+            key = (candle['symbol'], candle['timeframe'])
+            if key not in streams:
+                streams[key] = self._stream(*key)
+        
+        annotated = []
+        with self.lock:
+            for candle in candles:
+                values = streams[(candle['symbol'], candle['timeframe'])].recent.get(candle['datetime'])
+                annotated.append({**candle, **(values or dict.fromkeys(self.names))})
+        return annotated
+    
+    def annotate_frame(self, frame, candles):
+        """Add indicator values to candle dicts taken from a full-history frame
+        
+        frame holds the stream's whole history (datetime plus OHLCV) so the
+        values match what recording computes incrementally.
+        """
+        if frame is None or not candles:
+            return candles
+        
+        frame = frame.reset_index(drop=True)
+        values = compute_indicators(frame, self.specs)
+        times = pd.to_datetime(frame['datetime']).dt.strftime('%Y-%m-%d %H:%M:%S')
+        by_time = dict(zip(times, values.itertuples(index=False)))
+        
+        annotated = []
+        for candle in candles:
+            row = by_time.get(candle['datetime'])
+            extra = dict(zip(self.names, (_value(value) for value in row))) if row else dict.fromkeys(self.names)
+            annotated.append({**candle, **extra})
+        return annotated
@@ -1,4 +1,8 @@
-from app import app
+# Backfill workers are spawned processes that re-import this module as
+# __mp_main__; they only run backfill.generate_rates and must not load the
+# app, its recorder or its data manager
+if __name__ != '__mp_main__':
+    from app import app
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
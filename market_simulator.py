@@ -0,0 +1,342 @@
+import os
+import time
+import logging
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+
+from binary_storage import CANDLE_DTYPE, TICK_DTYPE
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Correlation between two pairs that share a currency; the sign follows
+# whether the shared currency sits on the same side of both pairs
+DEFAULT_CORRELATION = 0.3
+
+# A block of the mean-reverting recursion is solved in closed form as long
+# as the decay over the block stays below this factor
+MAX_BLOCK_DECAY = 1e3
+
+class SymbolModel:
+    """Price model parameters of one symbol, per one-minute step
+    
+    The log price follows a discretised Ornstein-Uhlenbeck process pulled
+    towards log(price) at rate mean_reversion, plus drift and Gaussian
+    shocks with standard deviation volatility. volume is the average tick
+    volume of an M1 bar, and spread the bid/ask spread relative to price.
+    """
+    
+    __slots__ = ('price', 'drift', 'volatility', 'mean_reversion', 'volume', 'spread')
+    
+    def __init__(self, price, drift=0.0, volatility=0.00015, mean_reversion=0.0005, volume=100, spread=0.0001):
+        self.price = price
+        self.drift = drift
+        self.volatility = volatility
+        self.mean_reversion = mean_reversion
+        self.volume = volume
+        self.spread = spread
+
+def default_models(base_prices):
+    """Models for the demo symbols, priced from their base prices"""
+    models = {symbol: SymbolModel(price) for symbol, price in base_prices.items()}
+    
+    # EURUSD trades in a tight range around its base price
+    if 'EURUSD' in models:
+        models['EURUSD'] = SymbolModel(base_prices['EURUSD'], volatility=0.00006, mean_reversion=0.05)
+    return models
+
+def currency_correlation(symbols, correlation=DEFAULT_CORRELATION):
+    """Correlation matrix for currency pairs from the currencies they share
+    
+    Pairs with a common base or quote currency move together, and pairs
+    where one's base is the other's quote move against each other.
+    """
+    count = len(symbols)
+    matrix = np.eye(count)
+    for i in range(count):
+        for j in range(i + 1, count):
+            a, b = symbols[i], symbols[j]
+            sign = 0
+            if a[:3] == b[:3] or a[3:] == b[3:]:
+                sign = 1
+            elif a[:3] == b[3:] or a[3:] == b[:3]:
+                sign = -1
+            matrix[i, j] = matrix[j, i] = sign * correlation
+    return matrix
+
+def _cholesky(matrix):
+    """Cholesky factor, shrinking towards the identity until it is positive definite"""
+    for shrink in np.linspace(1.0, 0.0, 11):
+        try:
+            return np.linalg.cholesky(shrink * matrix + (1 - shrink) * np.eye(len(matrix)))
+        except np.linalg.LinAlgError:
+            continue
+    return np.eye(len(matrix))
+
+def mean_reverting_paths(start, decay, steps):
+    """Solve x[t] = decay * x[t-1] + steps[t] for every column at once
+    
+    start and decay have one value per column and steps has one row per
+    time step. Blocks of rows are solved with cumulative sums, since
+    x[t] = decay^t * (start + sum(steps[k] / decay^k)).
+    """
+    count = len(steps)
+    paths = np.empty_like(steps)
+    if count == 0:
+        return paths
+    
+    smallest = float(decay.min())
+    if smallest >= 1.0:
+        block = count
+    else:
+        block = max(1, int(np.log(MAX_BLOCK_DECAY) / -np.log(smallest)))
+    
+    current = np.asarray(start, dtype=float)
+    for lo in range(0, count, block):
+        hi = min(lo + block, count)
+        powers = decay[np.newaxis, :] ** np.arange(1, hi - lo + 1)[:, np.newaxis]
+        paths[lo:hi] = powers * (current + np.cumsum(steps[lo:hi] / powers, axis=0))
+        current = paths[hi - 1]
+    return paths
+
+class SyntheticMarket:
+    """Vectorized generator of correlated bars and ticks for a set of symbols
+    
+    All symbols share one random state and one current price each, so
+    successive calls continue the same market. Shocks are correlated across
+    symbols through the Cholesky factor of the correlation matrix.
+    """
+    
+    def __init__(self, symbols, base_prices, seed=None, models=None, correlation=DEFAULT_CORRELATION):
+        self.symbols = list(symbols)
+        self.positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.models = dict(default_models(base_prices))
+        self.models.update(models or {})
+        for symbol in self.symbols:
+            self.models.setdefault(symbol, SymbolModel(base_prices.get(symbol, 1.0)))
+        
+        if np.ndim(correlation) == 0:
+            correlation = currency_correlation(self.symbols, correlation)
+        self.correlation = np.asarray(correlation, dtype=float)
+        self.factors = {}
+        
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        
+        # Current log price of every symbol
+        self.log_prices = np.log([self.models[symbol].price for symbol in self.symbols])
+        
+        # Unix time next_bar last advanced the market to, and each
+        # (symbol, timeframe) stream's log price at its previous bar close
+        self.clock = None
+        self.references = {}
+    
+    def _params(self, symbols, minutes):
+        """Per-symbol (anchor, decay, drift, volatility) for steps of the given length"""
+        models = [self.models[symbol] for symbol in symbols]
+        anchor = np.log([model.price for model in models])
+        decay = (1.0 - np.array([model.mean_reversion for model in models])) ** minutes
+        drift = np.array([model.drift for model in models]) * minutes
+        volatility = np.array([model.volatility for model in models]) * np.sqrt(minutes)
+        return anchor, decay, drift, volatility
+    
+    def _factor(self, symbols):
+        """Cached Cholesky factor of the correlation between some symbols"""
+        key = tuple(symbols)
+        factor = self.factors.get(key)
+        if factor is None:
+            positions = [self.positions[symbol] for symbol in symbols]
+            factor = _cholesky(self.correlation[np.ix_(positions, positions)])
+            self.factors[key] = factor
+        return factor
+    
+    def _simulate(self, symbols, minutes, count, start):
+        """Simulate count steps of the log prices; returns (paths, shocks)
+        
+        shocks are the standardised correlated innovations, one row per step.
+        Caller must hold the lock.
+        """
+        anchor, decay, drift, volatility = self._params(symbols, minutes)
+        shocks = self.rng.standard_normal((count, len(symbols))) @ self._factor(symbols).T
+        
+        # Deviation from the anchor decays each step, then gets drift and noise
+        steps = drift + volatility * shocks
+        paths = mean_reverting_paths(start - anchor, decay, steps) + anchor
+        return paths, shocks
+    
+    def generate_bars(self, tf_minutes, times, symbols=None):
+        """Generate one bar per open time for each symbol
+        
+        times are unix open times. Returns a dict of symbol -> CANDLE_DTYPE
+        array, and advances the market to the close of the last bar.
+        """
+        symbols = list(symbols or self.symbols)
+        positions = [self.positions[symbol] for symbol in symbols]
+        times = np.asarray(times, dtype='<i8')
+        count = len(times)
+        
+        with self.lock:
+            start = self.log_prices[positions]
+            paths, shocks = self._simulate(symbols, tf_minutes, count, start)
+            wicks = np.abs(self.rng.standard_normal((2, count, len(symbols))))
+            noise = self.rng.uniform(0.5, 1.5, (count, len(symbols)))
+            if count:
+                self.log_prices[positions] = paths[-1]
+        
+        volatility = self._params(symbols, tf_minutes)[3]
+        opens = np.empty_like(paths)
+        opens[:1] = start
+        opens[1:] = paths[:-1]
+        
+        # Wicks extend past the body by half the bar's volatility on average
+        highs = np.maximum(opens, paths) + wicks[0] * volatility / 2
+        lows = np.minimum(opens, paths) - wicks[1] * volatility / 2
+        
+        # Larger moves trade more volume
+        volume_base = np.array([self.models[symbol].volume for symbol in symbols]) * tf_minutes
+        volumes = volume_base * (1 + np.abs(shocks)) / 2 * noise
+        
+        bars = {}
+        for i, symbol in enumerate(symbols):
+            records = np.empty(count, dtype=CANDLE_DTYPE)
+            records['time'] = times
+            records['open'] = np.round(np.exp(opens[:, i]), 5)
+            records['high'] = np.round(np.exp(highs[:, i]), 5)
+            records['low'] = np.round(np.exp(lows[:, i]), 5)
+            records['close'] = np.round(np.exp(paths[:, i]), 5)
+            records['volume'] = volumes[:, i]
+            bars[symbol] = records
+        return bars
+    
+    def generate_ticks(self, count, start_ms, interval_ms=100, symbols=None):
+        """Generate count evenly spaced ticks per symbol from start_ms
+        
+        Returns a dict of symbol -> TICK_DTYPE array with bid and ask around
+        the simulated mid price.
+        """
+        symbols = list(symbols or self.symbols)
+        positions = [self.positions[symbol] for symbol in symbols]
+        
+        with self.lock:
+            paths, _ = self._simulate(symbols, interval_ms / 60000.0, count, self.log_prices[positions])
+            if count:
+                self.log_prices[positions] = paths[-1]
+        
+        mids = np.exp(paths)
+        times = start_ms + np.arange(count, dtype='<i8') * int(interval_ms)
+        
+        ticks = {}
+        for i, symbol in enumerate(symbols):
+            half_spread = self.models[symbol].spread / 2
+            records = np.empty(count, dtype=TICK_DTYPE)
+            records['time'] = times
+            records['bid'] = np.round(mids[:, i] * (1 - half_spread), 5)
+            records['ask'] = np.round(mids[:, i] * (1 + half_spread), 5)
+            ticks[symbol] = records
+        return ticks
+    
+    def _advance_to(self, timestamp):
+        """Move every symbol's price to a unix time with correlated shocks; caller must hold the lock"""
+        if self.clock is not None and timestamp > self.clock:
+            minutes = (timestamp - self.clock) / 60.0
+            paths, _ = self._simulate(self.symbols, minutes, 1, self.log_prices)
+            self.log_prices = paths[0]
+        if self.clock is None or timestamp > self.clock:
+            self.clock = timestamp
+    
+    def next_bar(self, symbol, tf_minutes, prev_close=None, close_time=None):
+        """Simulate a single bar for one symbol as (open, high, low, close, volume)
+        
+        The shared market is advanced to close_time (unix seconds, now by
+        default), so bars of different symbols closing together move with
+        their correlation. The bar's return is the symbol's market move since
+        the previous bar of the same timeframe, applied to prev_close; each
+        stream therefore follows its own last close, while streams of one
+        symbol agree on the moves they share.
+        """
+        close_time = time.time() if close_time is None else close_time
+        key = (symbol, tf_minutes)
+        position = self.positions[symbol]
+        
+        with self.lock:
+            if key not in self.references:
+                # A new stream's first bar covers one timeframe length
+                self._advance_to(close_time - tf_minutes * 60)
+                self.references[key] = self.log_prices[position]
+            self._advance_to(close_time)
+            current = float(self.log_prices[position])
+            change = current - float(self.references[key])
+            self.references[key] = current
+            wicks = np.abs(self.rng.standard_normal(2))
+            noise = self.rng.uniform(0.5, 1.5)
+        
+        model = self.models[symbol]
+        volatility = model.volatility * np.sqrt(tf_minutes)
+        open_price = float(np.log(prev_close)) if prev_close is not None else current - change
+        close_price = open_price + change
+        
+        return (
+            round(float(np.exp(open_price)), 5),
+            round(float(np.exp(max(open_price, close_price) + wicks[0] * volatility / 2)), 5),
+            round(float(np.exp(min(open_price, close_price) - wicks[1] * volatility / 2)), 5),
+            round(float(np.exp(close_price)), 5),
+            int(model.volume * tf_minutes * (1 + abs(change) / volatility) / 2 * noise)
+        )
+
+def load_test(data_manager, market, timeframe, tf_minutes, count, batch=100_000):
+    """Write count bars per symbol through DataManager.save_candles, returning bars per second"""
+    # Imported here to keep the generator free of the connector's setup
+    from mt5_connector import format_bar_times
+    
+    period = tf_minutes * 60
+    start = (int(time.time()) // period - count) * period
+    written = 0
+    begin = time.perf_counter()
+    
+    for lo in range(0, count, batch):
+        times = start + np.arange(lo, min(lo + batch, count), dtype='<i8') * period
+        labels = format_bar_times(times)
+        for symbol, records in market.generate_bars(tf_minutes, times).items():
+            data_manager.save_candles(symbol, timeframe, pd.DataFrame({
+                'datetime': labels,
+                'symbol': symbol,
+                'timeframe': timeframe,
+                'open': records['open'],
+                'high': records['high'],
+                'low': records['low'],
+                'close': records['close'],
+                'volume': records['volume']
+            }))
+            written += len(records)
+    
+    data_manager.flush(close=True)
+    return written / (time.perf_counter() - begin)
+
+if __name__ == '__main__':
+    from data_manager import DataManager
+    from mt5_connector import MT5Connector
+    
+    parser = argparse.ArgumentParser(description='Fill a data directory with synthetic candles')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--backend', default='csv')
+    parser.add_argument('--timeframe', default='M1')
+    parser.add_argument('--bars', type=int, default=100_000, help='bars per symbol')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    
+    connector = MT5Connector()
+    tf_minutes = connector.timeframe_map[args.timeframe]
+    market = SyntheticMarket(connector.available_symbols, connector.base_prices, seed=args.seed)
+    total = args.bars * len(market.symbols)
+    
+    # Raw generation speed first, then the end-to-end write rate
+    begin = time.perf_counter()
+    market.generate_bars(tf_minutes, np.arange(args.bars) * tf_minutes * 60)
+    elapsed = time.perf_counter() - begin
+    print(f"Generated {total} bars in {elapsed:.2f}s ({total / elapsed:,.0f} bars/s)")
+    
+    rate = load_test(DataManager(args.data_dir, backend=args.backend), market, args.timeframe, tf_minutes, args.bars)
+    print(f"Stored {total} bars at {rate:,.0f} bars/s")
@@ -0,0 +1,238 @@
+import os
+import bisect
+import threading
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Buckets for batch sizes in rows
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+
+def _format_labels(labelnames, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _CounterChild:
+    __slots__ = ('value', 'lock')
+    
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+    
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+class _GaugeChild:
+    __slots__ = ('value',)
+    
+    def __init__(self):
+        self.value = 0
+    
+    def set(self, value):
+        self.value = value
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count', 'lock')
+    
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+    
+    def observe(self, value):
+        position = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[position] += 1
+            self.sum += value
+            self.count += 1
+
+class Metric:
+    """A named metric family with a fixed set of label names"""
+    
+    kind = None
+    
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def labels(self, *values):
+        """Get the child for one combination of label values"""
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.get(values)
+                if child is None:
+                    child = self._new_child()
+                    self.children[values] = child
+        return child
+    
+    def samples(self):
+        """(suffix, label values, extra label, value) tuples for exposition"""
+        raise NotImplementedError
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    kind = 'counter'
+    
+    def _new_child(self):
+        return _CounterChild()
+    
+    def samples(self):
+        return [('', values, '', child.value) for values, child in list(self.children.items())]
+
+class Gauge(Metric):
+    kind = 'gauge'
+    
+    def _new_child(self):
+        return _GaugeChild()
+    
+    def samples(self):
+        return [('', values, '', child.value) for values, child in list(self.children.items())]
+
+class CallbackGauge(Metric):
+    """Gauge whose values are read from a callback at scrape time
+    
+    The callback returns a dict of label value tuples to numbers.
+    """
+    
+    kind = 'gauge'
+    
+    def __init__(self, name, documentation, labelnames, callback):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+    
+    def samples(self):
+        return [('', values, '', value) for values, value in self.callback().items()]
+
+class Histogram(Metric):
+    kind = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(buckets)
+    
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+    
+    def samples(self):
+        samples = []
+        for values, child in list(self.children.items()):
+            with child.lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.bounds + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', values, f'le="{_format_value(float(bound))}"', cumulative))
+            samples.append(('_sum', values, '', total))
+            samples.append(('_count', values, '', count))
+        return samples
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text format"""
+    
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+    
+    def _register(self, metric):
+        with self.lock:
+            # Registering a name twice returns the first metric, so modules can be reloaded
+            return self.metrics.setdefault(metric.name, metric)
+    
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+    
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+    
+    def gauge_callback(self, name, documentation, labelnames, callback):
+        """Register (or replace) a gauge read from callback at scrape time"""
+        with self.lock:
+            metric = CallbackGauge(name, documentation, labelnames, callback)
+            self.metrics[name] = metric
+            return metric
+    
+    def render(self, names=None, exclude=()):
+        """Metrics in the Prometheus text exposition format
+        
+        names limits the output to those metrics; exclude leaves metrics out.
+        """
+        with self.lock:
+            metrics = [
+                metric for name, metric in self.metrics.items()
+                if (names is None or name in names) and name not in exclude
+            ]
+        
+        blocks = []
+        for metric in metrics:
+            try:
+                blocks.append(metric.render())
+            except Exception as e:
+                blocks.append(f"# {metric.name} unavailable: {_escape(e)}")
+        return '\n'.join(blocks) + '\n'
+
+REGISTRY = Registry()
+
+# Hot-path metrics shared by the recorder, the data manager and the storage backends
+CANDLES_WRITTEN = REGISTRY.counter(
+    'mt5_candles_written_total', 'Candles saved per stream', ('symbol', 'timeframe'))
+CANDLE_WRITE_SECONDS = REGISTRY.histogram(
+    'mt5_candle_write_seconds', 'Time to hand one candle to the storage backend', ('backend',))
+FLUSH_ROWS = REGISTRY.histogram(
+    'mt5_flush_rows', 'Rows written per buffer flush', ('store',), buckets=SIZE_BUCKETS)
+RECORDER_LAG_SECONDS = REGISTRY.histogram(
+    'mt5_recorder_lag_seconds', 'Delay between a timeframe boundary and its candle being saved', ('timeframe',))
+TICKS_WRITTEN = REGISTRY.counter(
+    'mt5_ticks_written_total', 'Raw ticks saved per symbol', ('symbol',))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'mt5_http_request_duration_seconds', 'API request latency per route', ('method', 'route', 'status'))
+
+# Metrics each web process reports for itself; the rest come from the recorder
+WEB_METRICS = ('mt5_http_request_duration_seconds', 'mt5_stream_subscribers', 'mt5_query_cache')
+
+class SampledLog:
+    """Decides which hot-path events get a debug log line
+    
+    Disabled by default; with every=N only one event in N is logged, so
+    per-candle logging costs a single attribute check when it is off.
+    """
+    
+    def __init__(self, every=0):
+        self.every = every
+        self.count = 0
+    
+    def sample(self):
+        if not self.every:
+            return False
+        self.count += 1
+        return self.count % self.every == 0
+
+# Set CANDLE_LOG_EVERY=N to log every Nth saved candle at DEBUG level
+candle_log = SampledLog(int(os.environ.get('CANDLE_LOG_EVERY', '0') or 0))
@@ -1,12 +1,22 @@
 import os
 import time
+import heapq
+import calendar
 import logging
 import threading
 import random
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+from market_simulator import SyntheticMarket
+from metrics import RECORDER_LAG_SECONDS, candle_log
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
 # Define constants for the demo version - normally these would come from MT5
@@ -20,20 +30,173 @@ TIMEFRAME_D1 = 1440
 TIMEFRAME_W1 = 10080
 TIMEFRAME_MN1 = 43200
 
+# Size of the shared worker pool that generates and saves candles for all streams
+DEFAULT_MAX_WORKERS = 8
+
+# Number of recent emission delays kept for the jitter report
+JITTER_SAMPLES = 1000
+
+# Seconds between simulated tick batches on the tick stream
+TICK_INTERVAL = 0.1
+
+# Offset applied to candle times to match the user's local time
+DISPLAY_TIME_OFFSET = timedelta(hours=6)
+
+def format_bar_time(timestamp):
+    """Format a bar's unix open time the way candles are stored"""
+    return (datetime.fromtimestamp(timestamp) + DISPLAY_TIME_OFFSET).strftime('%Y-%m-%d %H:%M:%S')
+
+def format_bar_times(timestamps):
+    """Vectorized format_bar_time for an array of unix times"""
+    timestamps = np.asarray(timestamps, dtype='<i8')
+    
+    # The local UTC offset only changes on the hour, so look it up once per hour
+    hours, positions = np.unique(timestamps // 3600, return_inverse=True)
+    utc_offsets = np.array([time.localtime(int(hour) * 3600).tm_gmtoff for hour in hours], dtype='<i8')
+    
+    local_times = timestamps + utc_offsets[positions] + int(DISPLAY_TIME_OFFSET.total_seconds())
+    return np.char.replace(np.datetime_as_string(local_times.astype('datetime64[s]')), 'T', ' ')
+
+def parse_bar_time(value):
+    """Convert a stored candle time back to the bar's unix open time"""
+    return int((datetime.strptime(value, '%Y-%m-%d %H:%M:%S') - DISPLAY_TIME_OFFSET).timestamp())
+
+def next_boundary(timestamp, tf_minutes):
+    """Return the first timeframe boundary strictly after a unix timestamp
+    
+    Boundaries are aligned to UTC: minutes and hours on the epoch grid, days
+    at midnight, weeks on Sunday (as in MT5) and months on the 1st.
+    """
+    if tf_minutes == TIMEFRAME_MN1:
+        current = time.gmtime(timestamp)
+        year, month = (current.tm_year + 1, 1) if current.tm_mon == 12 else (current.tm_year, current.tm_mon + 1)
+        return calendar.timegm((year, month, 1, 0, 0, 0))
+    
+    if tf_minutes == TIMEFRAME_W1:
+        # The epoch fell on a Thursday, so Sundays are 3 days into the weekly grid
+        week = TIMEFRAME_W1 * 60
+        sunday_offset = 3 * 86400
+        return ((int(timestamp) - sunday_offset) // week + 1) * week + sunday_offset
+    
+    period = tf_minutes * 60
+    return (int(timestamp) // period + 1) * period
+
+def previous_boundary(boundary, tf_minutes):
+    """Return the boundary that opened the bar ending at the given boundary"""
+    if tf_minutes == TIMEFRAME_MN1:
+        current = time.gmtime(boundary)
+        year, month = (current.tm_year - 1, 12) if current.tm_mon == 1 else (current.tm_year, current.tm_mon - 1)
+        return calendar.timegm((year, month, 1, 0, 0, 0))
+    return boundary - tf_minutes * 60
+
+class JitterStats:
+    """Delay between a timeframe boundary and its candle being saved"""
+    
+    def __init__(self, samples=JITTER_SAMPLES):
+        self.samples = deque(maxlen=samples)
+        self.emitted = 0
+        self.missed = 0
+        self.max_jitter = 0.0
+    
+    def record(self, jitter):
+        self.samples.append(jitter)
+        self.emitted += 1
+        self.max_jitter = max(self.max_jitter, jitter)
+    
+    def summary(self):
+        """Jitter figures in milliseconds over the recent samples"""
+        samples = sorted(self.samples)
+        summary = {
+            'emitted': self.emitted,
+            'missed': self.missed,
+            'jitter_avg_ms': None,
+            'jitter_p99_ms': None,
+            'jitter_max_ms': round(self.max_jitter * 1000, 3)
+        }
+        if samples:
+            summary['jitter_avg_ms'] = round(sum(samples) / len(samples) * 1000, 3)
+            summary['jitter_p99_ms'] = round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3)
+        return summary
+
+class RecordingStream:
+    """State for a single (symbol, timeframe) recording stream"""
+    
+    __slots__ = ('symbol', 'timeframe', 'tf_minutes', 'last_close', 'next_due',
+                 'candles_recorded', 'last_jitter', 'busy', 'active')
+    
+    def __init__(self, symbol, timeframe, tf_minutes, last_close):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.tf_minutes = tf_minutes
+        self.last_close = last_close
+        # Unix time of the next timeframe boundary the stream emits a candle at
+        self.next_due = next_boundary(time.time(), tf_minutes)
+        self.candles_recorded = 0
+        self.last_jitter = None
+        # True while a candle for this stream is queued or running in the pool
+        self.busy = False
+        # Cleared when the stream is stopped so in-flight work is discarded
+        self.active = True
+    
+    @property
+    def key(self):
+        return (self.symbol, self.timeframe)
+    
+    def to_dict(self):
+        return {
+            'symbol': self.symbol,
+            'timeframe': self.timeframe,
+            'candles_recorded': self.candles_recorded,
+            'last_close': self.last_close,
+            'next_candle': datetime.fromtimestamp(self.next_due).strftime('%Y-%m-%d %H:%M:%S'),
+            'last_jitter_ms': round(self.last_jitter * 1000, 3) if self.last_jitter is not None else None
+        }
+
 class MT5Connector:
     """Class to handle simulated interactions with MetaTrader 5"""
     
-    def __init__(self, terminal_path=None):
-        """Initialize the MT5 connector with optional path to MT5 terminal"""
+    def __init__(self, terminal_path=None, max_workers=DEFAULT_MAX_WORKERS, seed=None):
+        """Initialize the MT5 connector with optional path to MT5 terminal
+        
+        seed makes the simulated prices reproducible.
+        """
         self.terminal_path = terminal_path
+        self.seed = seed
         self.connected = False
-        self.recording = False
-        self.recording_thread = None
-        self.stop_event = threading.Event()
-        self.symbol = None
-        self.timeframe = None
+        self.max_workers = max_workers
         self.data_manager = None
         
+        # Active recording streams keyed by (symbol, timeframe)
+        self.streams = {}
+        self.streams_lock = threading.Lock()
+        
+        # Source writing each (symbol, timeframe): 'candles', 'ticks' or 'backfill'.
+        # Shared by all three so a stream never has two writers.
+        self.stream_sources = {}
+        
+        # One scheduler thread and a bounded worker pool shared by all streams.
+        # The scheduler sleeps on a heap of (due time, sequence, stream) and is
+        # woken through the condition when streams are added or on shutdown.
+        self.scheduler_thread = None
+        self.executor = None
+        self.lifecycle_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.schedule = []
+        self.schedule_sequence = 0
+        self.schedule_changed = threading.Condition(self.streams_lock)
+        self.jitter = JitterStats()
+        
+        # Simulated tick stream: callbacks per symbol and the thread feeding them
+        self.tick_subscribers = {}
+        self.tick_lock = threading.Lock()
+        self.tick_thread = None
+        self.tick_stop = threading.Event()
+        self.tick_recorders = {}
+        
+        # Bulk history download running in the background, if any
+        self.backfill = None
+        self.backfill_thread = None
+        
         # Demo forex symbols
         self.available_symbols = [
             'EURUSD', 'GBPUSD', 'USDJPY', 'AUDUSD', 'USDCHF', 
@@ -69,6 +232,9 @@ class MT5Connector:
         
         # Store last generated candles for each symbol/timeframe pair
         self.last_candles = {}
+        
+        # Correlated price model behind every simulated candle and tick
+        self.market = SyntheticMarket(self.available_symbols, self.base_prices, seed=seed)
     
     def connect(self):
         """Connect to the simulated MetaTrader 5 terminal"""
@@ -88,6 +254,10 @@ class MT5Connector:
             # Stop recording if active
             if self.recording:
                 self.stop_recording()
+            if self.tick_recorders:
+                self.stop_tick_recording()
+            if self.backfill and self.backfill.is_running():
+                self.stop_backfill()
             
             self.connected = False
             logger.info("Disconnected from simulated MT5")
@@ -114,6 +284,48 @@ class MT5Connector:
             logger.error(f"Error getting symbols: {str(e)}")
             return []
     
+    @property
+    def recording(self):
+        """Check if any stream is currently being recorded"""
+        return len(self.streams) > 0
+    
+    def get_streams(self):
+        """Get a summary of all active recording streams"""
+        with self.streams_lock:
+            return [stream.to_dict() for stream in self.streams.values()]
+    
+    def get_scheduler_stats(self):
+        """Get emission counts and boundary jitter for the scheduler"""
+        with self.streams_lock:
+            return self.jitter.summary()
+    
+    def is_recording(self, symbol, timeframe):
+        """Check if a specific symbol/timeframe stream is being recorded"""
+        return (symbol, timeframe) in self.streams
+    
+    def busy_streams(self, keys):
+        """Names of the (symbol, timeframe) keys already written by any source"""
+        with self.streams_lock:
+            return [f"{symbol} ({timeframe})" for symbol, timeframe in keys if (symbol, timeframe) in self.stream_sources]
+    
+    def _claim_streams(self, keys, source):
+        """Register keys to a source unless any is taken; caller must hold streams_lock
+        
+        Returns the names of the taken keys, empty when the claim succeeded.
+        """
+        busy = [f"{symbol} ({timeframe})" for symbol, timeframe in keys if (symbol, timeframe) in self.stream_sources]
+        if not busy:
+            for key in keys:
+                self.stream_sources[key] = source
+        return busy
+    
+    def _release_streams(self, keys, source):
+        """Drop the keys a source registered"""
+        with self.streams_lock:
+            for key in keys:
+                if self.stream_sources.get(key) == source:
+                    del self.stream_sources[key]
+    
     def start_recording(self, symbol, timeframe, data_manager):
         """Start recording price data for a specific symbol and timeframe"""
         if not self.is_connected():
@@ -126,22 +338,34 @@ class MT5Connector:
                 logger.error(f"Symbol {symbol} not found")
                 return False
             
+            if timeframe not in self.timeframe_map:
+                logger.error(f"Timeframe {timeframe} not supported")
+                return False
+            
             # Set the data manager reference
             self.data_manager = data_manager
             
-            # Set recording parameters
-            self.symbol = symbol
-            self.timeframe = timeframe
-            self.stop_event.clear()
-            self.recording = True
+            # Continue from the last stored close so a restart doesn't gap the series
+            last_candle = data_manager.get_last_candle(symbol, timeframe)
+            last_close = last_candle['close'] if last_candle else self.base_prices.get(symbol, 1.0)
             
-            # Start recording in a separate thread
-            self.recording_thread = threading.Thread(
-                target=self._recording_worker, 
-                args=(symbol, timeframe)
-            )
-            self.recording_thread.daemon = True
-            self.recording_thread.start()
+            with self.streams_lock:
+                # Refused whether the stream is recorded from candles or ticks, or backfilled
+                if self._claim_streams([(symbol, timeframe)], 'candles'):
+                    logger.warning(f"Already recording {symbol} ({timeframe})")
+                    return False
+                
+                stream = RecordingStream(
+                    symbol,
+                    timeframe,
+                    self.timeframe_map[timeframe],
+                    float(last_close)
+                )
+                self.streams[stream.key] = stream
+                self._schedule(stream)
+            
+            # Start the shared scheduler on the first stream
+            self._ensure_scheduler()
             
             logger.info(f"Started recording {symbol} ({timeframe})")
             return True
@@ -150,90 +374,330 @@ class MT5Connector:
             logger.error(f"Error starting recording: {str(e)}")
             return False
     
-    def stop_recording(self):
-        """Stop recording price data"""
+    def stop_recording(self, symbol=None, timeframe=None):
+        """Stop recording price data
+        
+        With no arguments every stream is stopped. Passing a symbol stops all
+        of its timeframes, and passing both stops that single stream.
+        """
         if not self.recording:
             logger.warning("Not currently recording")
             return False
         
         try:
-            # Signal the recording thread to stop
-            self.stop_event.set()
+            with self.streams_lock:
+                stopped = [
+                    key for key in self.streams
+                    if (symbol is None or key[0] == symbol)
+                    and (timeframe is None or key[1] == timeframe)
+                ]
+                for key in stopped:
+                    self.streams.pop(key).active = False
+                    self.stream_sources.pop(key, None)
+                remaining = len(self.streams)
             
-            # Wait for the thread to finish
-            if self.recording_thread and self.recording_thread.is_alive():
-                self.recording_thread.join(timeout=5.0)
+            if not stopped:
+                logger.warning(f"No active stream for {symbol} ({timeframe})")
+                return False
+            
+            # Shut down the scheduler and worker pool once nothing is left to record
+            if remaining == 0:
+                self._shutdown_scheduler()
             
-            self.recording = False
-            self.symbol = None
-            self.timeframe = None
-            logger.info("Stopped recording")
+            # Write out any candles still buffered for the stopped streams
+            if self.data_manager:
+                for stopped_symbol, stopped_timeframe in stopped:
+                    self.data_manager.flush(stopped_symbol, stopped_timeframe)
+            
+            for stopped_symbol, stopped_timeframe in stopped:
+                logger.info(f"Stopped recording {stopped_symbol} ({stopped_timeframe})")
             return True
         
         except Exception as e:
             logger.error(f"Error stopping recording: {str(e)}")
             return False
     
-    def _generate_candle(self, symbol, prev_close=None):
-        """Generate a simulated candle for demo purposes"""
-        # Use actual EURUSD market values for more realistic simulation
-        if symbol == 'EURUSD':
-            # Real EURUSD prices typically around 1.08 range recently
-            actual_price = 1.0810
+    def _ensure_scheduler(self):
+        """Start the shared scheduler thread and worker pool if not running"""
+        with self.lifecycle_lock:
+            if self.scheduler_thread and self.scheduler_thread.is_alive():
+                return
             
-            # If we have a previous close, use it for more consistent price movement
-            if prev_close is not None:
-                base_price = prev_close
-                
-                # More controlled movement to create a realistic pattern
-                # Bias slightly toward mean reversion around 1.0810
-                if base_price > 1.0830:
-                    # Higher probability of moving down
-                    bias = -0.00005
-                elif base_price < 1.0790:
-                    # Higher probability of moving up
-                    bias = 0.00005
-                else:
-                    # Random movement near the center
-                    bias = 0
-                
-                # Smaller, more realistic pip movements for forex
-                price_movement = bias + (random.random() - 0.5) * 0.0002
-                
-                # Calculate new prices with tighter ranges
-                open_price = round(base_price, 5)
-                close_price = round(base_price + price_movement, 5)
-                
-                # Forex high/low typically extend 2-5 pips from open/close
-                pip_range = random.uniform(0.00005, 0.00015)
-                high_price = round(max(open_price, close_price) + pip_range, 5)
-                low_price = round(min(open_price, close_price) - pip_range, 5)
-            else:
-                # Initial price if no previous close
-                open_price = round(actual_price + (random.random() - 0.5) * 0.0005, 5)
-                close_price = round(open_price + (random.random() - 0.5) * 0.0001, 5)
-                high_price = round(max(open_price, close_price) + random.random() * 0.0001, 5)
-                low_price = round(min(open_price, close_price) - random.random() * 0.0001, 5)
-        else:
-            # Default behavior for other symbols
-            base_price = self.base_prices.get(symbol, 1.0)
+            self.stop_event.clear()
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='mt5-recorder'
+            )
+            self.scheduler_thread = threading.Thread(
+                target=self._scheduler_worker,
+                name='mt5-scheduler'
+            )
+            self.scheduler_thread.daemon = True
+            self.scheduler_thread.start()
+    
+    def _shutdown_scheduler(self):
+        """Stop the shared scheduler thread and drain the worker pool"""
+        with self.lifecycle_lock:
+            # Signal the scheduler thread to stop and wake it up immediately,
+            # unless a new stream was started in the meantime
+            with self.schedule_changed:
+                if self.streams:
+                    return
+                self.stop_event.set()
+                self.schedule.clear()
+                self.schedule_changed.notify_all()
             
-            if prev_close is not None:
-                base_price = prev_close
-                
-            price_movement = (random.random() - 0.5) * 0.0005 * base_price
-            open_price = round(base_price, 5)
-            close_price = round(base_price + price_movement, 5)
-            high_price = round(max(open_price, close_price) + random.random() * 0.0001 * base_price, 5)
-            low_price = round(min(open_price, close_price) - random.random() * 0.0001 * base_price, 5)
+            # Wait for the thread to finish
+            if self.scheduler_thread and self.scheduler_thread.is_alive():
+                self.scheduler_thread.join(timeout=5.0)
+            
+            if self.executor:
+                self.executor.shutdown(wait=True)
+            
+            self.scheduler_thread = None
+            self.executor = None
+    
+    def subscribe_ticks(self, symbol, callback):
+        """Receive simulated ticks for a symbol as callback(symbol, time_ms, bid, ask)"""
+        if not self.is_connected():
+            logger.error("Not connected to simulated MT5")
+            return False
+        
+        if symbol not in self.available_symbols:
+            logger.error(f"Symbol {symbol} not found")
+            return False
+        
+        with self.tick_lock:
+            self.tick_subscribers.setdefault(symbol, []).append(callback)
+            
+            # Start the tick stream thread on the first subscriber
+            if not self.tick_thread or not self.tick_thread.is_alive():
+                self.tick_stop.clear()
+                self.tick_thread = threading.Thread(target=self._tick_worker, name='mt5-ticks')
+                self.tick_thread.daemon = True
+                self.tick_thread.start()
+        return True
+    
+    def unsubscribe_ticks(self, symbol, callback):
+        """Stop delivering ticks for a symbol to a callback"""
+        with self.tick_lock:
+            callbacks = self.tick_subscribers.get(symbol, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self.tick_subscribers.pop(symbol, None)
+            idle = not self.tick_subscribers
+        
+        # Stop the tick thread once nobody listens
+        if idle and self.tick_thread:
+            self.tick_stop.set()
+            self.tick_thread.join(timeout=5.0)
+            self.tick_thread = None
+    
+    def start_tick_recording(self, symbol, data_manager, timeframes=None):
+        """Record raw ticks for a symbol and build bars for each timeframe from them"""
+        # Imported here because tick_aggregator depends on this module
+        from tick_aggregator import TickRecorder
+        
+        timeframes = timeframes or ['M1']
+        unknown = [tf for tf in timeframes if tf not in self.timeframe_map]
+        if unknown:
+            logger.error(f"Timeframes {unknown} not supported")
+            return False
+        
+        if symbol in self.tick_recorders:
+            logger.warning(f"Already recording ticks for {symbol}")
+            return False
+        
+        keys = [(symbol, tf) for tf in timeframes]
+        with self.streams_lock:
+            busy = self._claim_streams(keys, 'ticks')
+        if busy:
+            logger.warning(f"Already recording {', '.join(busy)}")
+            return False
+        
+        self.data_manager = data_manager
+        recorder = TickRecorder(symbol, {tf: self.timeframe_map[tf] for tf in timeframes}, data_manager)
+        if not self.subscribe_ticks(symbol, recorder.on_tick):
+            self._release_streams(keys, 'ticks')
+            return False
+        
+        self.tick_recorders[symbol] = recorder
+        logger.info(f"Started tick recording {symbol} ({', '.join(timeframes)})")
+        return True
+    
+    def stop_tick_recording(self, symbol=None):
+        """Stop tick recording for one symbol, or for every symbol
+        
+        The bars still open are dropped (see TickRecorder); their ticks are kept.
+        """
+        symbols = [s for s in list(self.tick_recorders) if symbol is None or s == symbol]
+        if not symbols:
+            logger.warning("Not currently recording ticks")
+            return False
+        
+        for stopped_symbol in symbols:
+            recorder = self.tick_recorders.pop(stopped_symbol)
+            self.unsubscribe_ticks(stopped_symbol, recorder.on_tick)
+            self._release_streams([(stopped_symbol, tf) for tf in recorder.timeframes], 'ticks')
+            if self.data_manager:
+                self.data_manager.flush_ticks(stopped_symbol)
+            logger.info(f"Stopped tick recording {stopped_symbol}")
+        return True
+    
+    def get_tick_streams(self):
+        """Get a summary of all symbols recorded from ticks"""
+        return [recorder.to_dict() for recorder in list(self.tick_recorders.values())]
+    
+    def _rates_seed(self, symbol, timeframe, start):
+        """Seed for simulated history; reproducible when the connector has a seed"""
+        if self.seed is None:
+            return random.getrandbits(32)
+        return zlib.crc32(f"{self.seed}_{symbol}_{timeframe}_{start}".encode())
+    
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        """Get simulated bars between two datetimes, like MT5's copy_rates_range
+        
+        Returns a CANDLE_DTYPE array with unix open times, or None on error.
+        """
+        # Imported here because backfill depends on this module
+        from backfill import generate_rates
+        
+        if not self.is_connected():
+            logger.error("Not connected to simulated MT5")
+            return None
+        
+        if symbol not in self.available_symbols or timeframe not in self.timeframe_map:
+            logger.error(f"Unknown symbol or timeframe: {symbol} ({timeframe})")
+            return None
+        
+        start = int(pd.Timestamp(date_from, tz='UTC').timestamp())
+        end = int(pd.Timestamp(date_to, tz='UTC').timestamp())
+        price = self.base_prices.get(symbol, 1.0)
+        records = generate_rates(self._rates_seed(symbol, timeframe, start), symbol, price,
+                                 self.timeframe_map[timeframe], start, end)
+        for field in ('open', 'high', 'low', 'close'):
+            records[field] = (records[field] * price).round(5)
+        return records
+    
+    def start_backfill(self, symbols, timeframes, date_from, date_to, data_manager, max_workers=None):
+        """Download history for every symbol/timeframe pair in the background
+        
+        date_to defaults to now. Streams that already have candles are filled before their first
+        and after their last stored one. Streams being recorded live, from candles or ticks, are
+        refused, since both would write to them. Progress is available from get_backfill_status().
+        """
+        from backfill import HistoryBackfill
+        
+        if not self.is_connected():
+            logger.error("Not connected to simulated MT5")
+            return False
+        
+        if self.backfill and self.backfill.is_running():
+            logger.warning("A backfill is already running")
+            return False
+        
+        unknown = [s for s in symbols if s not in self.available_symbols]
+        unknown += [tf for tf in timeframes if tf not in self.timeframe_map]
+        if unknown:
+            logger.error(f"Unknown symbols or timeframes: {unknown}")
+            return False
+        
+        streams = {
+            (symbol, timeframe): self.timeframe_map[timeframe]
+            for symbol in symbols for timeframe in timeframes
+        }
+        
+        backfill = HistoryBackfill(
+            data_manager,
+            streams,
+            pd.Timestamp(date_from, tz='UTC').timestamp(),
+            time.time() if date_to is None else pd.Timestamp(date_to, tz='UTC').timestamp(),
+            self.base_prices,
+            max_workers=max_workers
+        )
+        
+        with self.streams_lock:
+            recording = self._claim_streams(list(streams), 'backfill')
+            if recording:
+                logger.error(f"Cannot backfill streams that are being recorded: {recording}")
+                return False
+            self.backfill = backfill
+        self.backfill_thread = threading.Thread(target=self._run_backfill, args=(self.backfill,), name='mt5-backfill')
+        self.backfill_thread.daemon = True
+        self.backfill_thread.start()
+        
+        logger.info(f"Started backfill of {len(streams)} streams from {date_from} to {date_to or 'now'}")
+        return True
+    
+    def _run_backfill(self, backfill):
+        """Backfill thread; hands its streams back to live recording when done"""
+        try:
+            backfill.run()
+        finally:
+            self._release_streams(list(backfill.streams), 'backfill')
+    
+    def stop_backfill(self):
+        """Stop the running backfill; it can be resumed by starting it again"""
+        if not self.backfill or not self.backfill.is_running():
+            logger.warning("No backfill running")
+            return False
         
-        # Generate realistic volume (higher on significant moves)
-        price_change_pct = abs(close_price - open_price) / open_price
-        volume_base = 100 + int(price_change_pct * 100000)  # Higher volume on bigger moves
-        volume = int(volume_base * (0.5 + random.random()))
+        self.backfill.stop()
+        self.backfill_thread.join(timeout=60.0)
+        return True
+    
+    def get_backfill_status(self):
+        """Progress of the current or last backfill, or None"""
+        return self.backfill.progress() if self.backfill else None
+    
+    def _tick_worker(self):
+        """Thread that feeds simulated bid/ask ticks to the subscribers"""
+        logger.info("Tick stream started")
+        
+        while not self.tick_stop.wait(TICK_INTERVAL):
+            with self.tick_lock:
+                subscribers = {symbol: list(callbacks) for symbol, callbacks in self.tick_subscribers.items()}
+            
+            if not subscribers:
+                continue
+            
+            # A few ticks per interval for every subscribed symbol
+            count = random.randint(1, 3)
+            interval_ms = int(TICK_INTERVAL * 1000) // count
+            ticks = self.market.generate_ticks(count, int(time.time() * 1000), interval_ms, list(subscribers))
+            
+            for symbol, callbacks in subscribers.items():
+                for time_ms, bid, ask in ticks[symbol].tolist():
+                    for callback in callbacks:
+                        try:
+                            callback(symbol, time_ms, bid, ask)
+                        except Exception as e:
+                            logger.error(f"Error in tick callback for {symbol}: {str(e)}")
+        
+        logger.info("Tick stream stopped")
+    
+    def _schedule(self, stream):
+        """Queue a stream for its next boundary; caller must hold streams_lock"""
+        self.schedule_sequence += 1
+        heapq.heappush(self.schedule, (stream.next_due, self.schedule_sequence, stream))
+        
+        # Wake the scheduler in case this is now the earliest deadline
+        self.schedule_changed.notify()
+    
+    def _generate_candle(self, symbol, prev_close=None, bar_time=None, tf_minutes=TIMEFRAME_M1):
+        """Generate a simulated candle for demo purposes
+        
+        bar_time is the unix time the bar opened; defaults to now.
+        """
+        close_time = None if bar_time is None else next_boundary(bar_time, tf_minutes)
+        open_price, high_price, low_price, close_price, volume = self.market.next_bar(
+            symbol, tf_minutes, prev_close, close_time
+        )
         
         # Add a 6-hour offset to match the user's local time
-        current_time = datetime.now() + timedelta(hours=6)
+        bar_start = datetime.now() if bar_time is None else datetime.fromtimestamp(bar_time)
+        current_time = bar_start + DISPLAY_TIME_OFFSET
         
         return {
             'open': open_price,
@@ -244,59 +708,103 @@ class MT5Connector:
             'time': current_time.timestamp()
         }
     
-    def _recording_worker(self, symbol, timeframe):
-        """Worker thread function to continuously generate and record price data"""
-        logger.info(f"Recording worker started for {symbol} ({timeframe})")
-        
-        # Get the timeframe in minutes
-        tf_minutes = self.timeframe_map.get(timeframe, TIMEFRAME_M1)
-        
-        # Initialize the last candle time
-        last_candle_time = datetime.now()
-        last_close = self.base_prices.get(symbol, 1.0)
+    def _scheduler_worker(self):
+        """Scheduler thread that dispatches streams to the worker pool on their boundaries"""
+        logger.info("Recording scheduler started")
         
         while not self.stop_event.is_set():
             try:
-                current_time = datetime.now()
-                
-                # Check if it's time to generate a new candle
-                # Simplified for demo: generate new candle every 10 seconds regardless of timeframe
-                time_diff = (current_time - last_candle_time).total_seconds()
-                
-                if time_diff >= 10:  # Generate a new candle every 10 seconds for demo
-                    # Generate candle data
-                    candle = self._generate_candle(symbol, last_close)
-                    last_close = candle['close']
+                due = []
+                with self.schedule_changed:
+                    # Drop streams that were stopped since they were queued
+                    while self.schedule and not self.schedule[0][2].active:
+                        heapq.heappop(self.schedule)
                     
-                    # Convert the timestamp to datetime
-                    candle_time = datetime.fromtimestamp(candle['time'])
+                    if not self.schedule:
+                        self.schedule_changed.wait()
+                        continue
                     
-                    # Format the candle data
-                    candle_data = {
-                        'datetime': candle_time.strftime('%Y-%m-%d %H:%M:%S'),
-                        'symbol': symbol,
-                        'timeframe': timeframe,
-                        'open': candle['open'],
-                        'high': candle['high'],
-                        'low': candle['low'],
-                        'close': candle['close'],
-                        'volume': candle['tick_volume']
-                    }
+                    # Sleep until the earliest boundary, a new stream or shutdown
+                    wait = self.schedule[0][0] - time.time()
+                    if wait > 0:
+                        self.schedule_changed.wait(wait)
+                        continue
                     
-                    # Save the data
-                    if self.data_manager:
-                        self.data_manager.save_candle(symbol, timeframe, candle_data)
-                    
-                    # Update the last candle time and log with adjusted time
-                    last_candle_time = current_time
-                    adjusted_candle_time = candle_time.strftime('%Y-%m-%d %H:%M:%S')
-                    logger.debug(f"Recorded new candle: {symbol} {timeframe} at {adjusted_candle_time}")
+                    # Collect every stream whose boundary has passed
+                    now = time.time()
+                    while self.schedule and self.schedule[0][0] <= now:
+                        boundary, _, stream = heapq.heappop(self.schedule)
+                        if not stream.active:
+                            continue
+                        
+                        if stream.busy:
+                            # The previous candle is still being written; skip this bar
+                            self.jitter.missed += 1
+                            logger.warning(f"Skipped {stream.symbol} ({stream.timeframe}) bar: previous candle still in progress")
+                        else:
+                            stream.busy = True
+                            due.append((stream, boundary))
+                        
+                        stream.next_due = next_boundary(max(now, boundary), stream.tf_minutes)
+                        self._schedule(stream)
                 
-                # Sleep for a short time before checking again
-                time.sleep(2)
+                for stream, boundary in due:
+                    self.executor.submit(self._record_stream, stream, boundary)
             
             except Exception as e:
-                logger.error(f"Error in recording worker: {str(e)}")
-                time.sleep(5)  # Wait a bit longer after an error
+                logger.error(f"Error in recording scheduler: {str(e)}")
+                self.stop_event.wait(5)  # Wait a bit longer after an error
+        
+        logger.info("Recording scheduler stopped")
+    
+    def _record_stream(self, stream, boundary):
+        """Generate and save the bar that closed at a boundary (runs in the worker pool)"""
+        try:
+            symbol = stream.symbol
+            timeframe = stream.timeframe
+            
+            # Generate candle data for the bar that just closed
+            bar_time = previous_boundary(boundary, stream.tf_minutes)
+            candle = self._generate_candle(symbol, stream.last_close, bar_time, stream.tf_minutes)
+            
+            # Convert the timestamp to datetime
+            candle_time = datetime.fromtimestamp(candle['time'])
+            
+            # Format the candle data
+            candle_data = {
+                'datetime': candle_time.strftime('%Y-%m-%d %H:%M:%S'),
+                'symbol': symbol,
+                'timeframe': timeframe,
+                'open': candle['open'],
+                'high': candle['high'],
+                'low': candle['low'],
+                'close': candle['close'],
+                'volume': candle['tick_volume']
+            }
+            
+            # Discard the candle if the stream was stopped while it was being generated
+            if not stream.active:
+                return
+            
+            # Save the data
+            if self.data_manager:
+                self.data_manager.save_candle(symbol, timeframe, candle_data)
+            
+            # Measure how late the candle was saved relative to its boundary
+            jitter = max(0.0, time.time() - boundary)
+            with self.streams_lock:
+                stream.last_jitter = jitter
+                self.jitter.record(jitter)
+            RECORDER_LAG_SECONDS.labels(timeframe).observe(jitter)
+            
+            stream.last_close = candle['close']
+            stream.candles_recorded += 1
+            if candle_log.sample():
+                logger.debug(f"Recorded new candle: {symbol} {timeframe} at {candle_data['datetime']}")
+        
+        except Exception as e:
+            logger.error(f"Error recording {stream.symbol} ({stream.timeframe}): {str(e)}")
         
-        logger.info(f"Recording worker stopped for {symbol} ({timeframe})")
+        finally:
+            # Allow the stream to be scheduled again
+            stream.busy = False
@@ -0,0 +1,232 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+import pandas as pd
+
+from storage import CSV_HEADERS, StorageBackend
+from metrics import FLUSH_ROWS
+
+# pyarrow is optional and only required when the parquet backend is selected
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Rows per row group when partitions are compacted
+ROW_GROUP_SIZE = 64 * 1024
+
+# Part files a day may collect before it is compacted while still being written
+MAX_PARTS = int(os.environ.get('DATA_PARQUET_MAX_PARTS', '64'))
+
+def _candle_schema():
+    """Arrow schema for stored candles"""
+    return pa.schema([
+        ('datetime', pa.timestamp('s')),
+        ('symbol', pa.string()),
+        ('timeframe', pa.string()),
+        ('open', pa.float64()),
+        ('high', pa.float64()),
+        ('low', pa.float64()),
+        ('close', pa.float64()),
+        ('volume', pa.int64())
+    ])
+
+class ParquetWriteBuffer:
+    """Pending rows for one stream, written as a new row group file on flush"""
+    
+    def __init__(self, storage, stream_dir):
+        self.storage = storage
+        self.stream_dir = stream_dir
+        self.lock = threading.Lock()
+        self.rows = []
+        self.last_flush = time.monotonic()
+        
+        # Partitions written to and not compacted since, keyed by day
+        self.touched_partitions = {}
+    
+    def flush(self, fsync_every=None):
+        """Write pending rows into their daily partitions; caller must hold the lock"""
+        if self.rows:
+            df = pd.DataFrame(self.rows, columns=CSV_HEADERS)
+            FLUSH_ROWS.labels('parquet').observe(len(self.rows))
+            self.rows = []
+            df['datetime'] = pd.to_datetime(df['datetime'])
+            
+            # One part file per day present in the batch
+            written = []
+            for day, day_df in df.groupby(df['datetime'].dt.strftime('%Y-%m-%d'), sort=True):
+                partition_dir = os.path.join(self.stream_dir, f"date={day}")
+                os.makedirs(partition_dir, exist_ok=True)
+                
+                table = pa.Table.from_pandas(day_df, schema=self.storage.schema, preserve_index=False)
+                part_path = os.path.join(partition_dir, f"part-{time.time_ns()}.parquet")
+                
+                # Write to a temporary name first so readers never see a torn part
+                pq.write_table(table, part_path + '.tmp')
+                os.replace(part_path + '.tmp', part_path)
+                self.touched_partitions[day] = partition_dir
+                written.append(day)
+            
+            self._compact_due(written[-1])
+        
+        self.last_flush = time.monotonic()
+    
+    def _compact_due(self, newest_day):
+        """Compact days that are complete, and days that collected too many parts"""
+        for day, partition_dir in list(self.touched_partitions.items()):
+            parts = sum(1 for name in os.listdir(partition_dir) if name.endswith('.parquet'))
+            if day < newest_day or parts > MAX_PARTS:
+                self.storage.compact_partition(partition_dir)
+                if day < newest_day:
+                    del self.touched_partitions[day]
+    
+    def close(self, fsync=False):
+        """Flush pending rows and compact the partitions written to; caller must hold the lock"""
+        self.flush()
+        for partition_dir in self.touched_partitions.values():
+            self.storage.compact_partition(partition_dir)
+        self.touched_partitions.clear()
+
+class ParquetStorage(StorageBackend):
+    """Columnar storage in daily Parquet partitions
+    
+    Each stream lives in data/{symbol}_{timeframe}/date=YYYY-MM-DD/. Every
+    flush appends a part file holding one row group. A day is compacted
+    into a single file once candles of a later day are flushed, when it
+    passes MAX_PARTS part files, and when its stream is closed. Range reads prune whole
+    days by directory name and row groups by their datetime statistics, and
+    only decode the requested columns.
+    """
+    
+    name = 'parquet'
+    
+    def __init__(self, data_dir, **options):
+        if pa is None:
+            raise ImportError("pyarrow is required for the parquet storage backend")
+        
+        super().__init__(data_dir, **options)
+        self.schema = _candle_schema()
+    
+    def get_stream_dir(self, symbol, timeframe):
+        """Build the partition directory for a symbol and timeframe"""
+        return os.path.join(self.data_dir, f"{symbol}_{timeframe}")
+    
+    def _open_buffer(self, symbol, timeframe):
+        return ParquetWriteBuffer(self, self.get_stream_dir(symbol, timeframe))
+    
+    def _partition_files(self, stream_dir, start_date=None, end_date=None):
+        """List the part files of a stream, skipping days outside the range"""
+        start_day = pd.Timestamp(start_date).strftime('%Y-%m-%d') if start_date is not None else None
+        end_day = pd.Timestamp(end_date).strftime('%Y-%m-%d') if end_date is not None else None
+        
+        files = []
+        for partition in sorted(os.listdir(stream_dir)):
+            if not partition.startswith('date='):
+                continue
+            day = partition[len('date='):]
+            if (start_day and day < start_day) or (end_day and day > end_day):
+                continue
+            
+            partition_dir = os.path.join(stream_dir, partition)
+            files.extend(
+                os.path.join(partition_dir, name)
+                for name in sorted(os.listdir(partition_dir))
+                if name.endswith('.parquet')
+            )
+        return files
+    
+    def compact_partition(self, partition_dir):
+        """Merge the part files of one day into a single file with large row groups"""
+        parts = sorted(name for name in os.listdir(partition_dir) if name.endswith('.parquet'))
+        if len(parts) <= 1:
+            return
+        
+        paths = [os.path.join(partition_dir, name) for name in parts]
+        table = pa.concat_tables(pq.read_table(path, schema=self.schema) for path in paths)
+        table = table.sort_by('datetime')
+        
+        # Write to a temporary name first so a crash never loses the parts
+        merged_path = os.path.join(partition_dir, f"part-{time.time_ns()}.parquet")
+        tmp_path = merged_path + '.tmp'
+        pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE)
+        os.replace(tmp_path, merged_path)
+        
+        for path in paths:
+            os.remove(path)
+    
+    def read(self, symbol, timeframe, start_date=None, end_date=None, columns=None):
+        stream_dir = self.get_stream_dir(symbol, timeframe)
+        
+        # Make sure buffered candles are visible to the reader
+        self.flush(symbol, timeframe)
+        
+        if not os.path.isdir(stream_dir):
+            return None
+        
+        # Row groups are skipped using their datetime min/max statistics
+        expression = None
+        if start_date is not None:
+            expression = ds.field('datetime') >= pd.Timestamp(start_date)
+        if end_date is not None:
+            end_expression = ds.field('datetime') <= pd.Timestamp(end_date)
+            expression = end_expression if expression is None else expression & end_expression
+        
+        read_columns = None
+        if columns:
+            read_columns = ['datetime'] + [column for column in columns if column != 'datetime']
+        
+        def read_files():
+            files = self._partition_files(stream_dir, start_date, end_date)
+            if not files:
+                return None
+            dataset = ds.dataset(files, schema=self.schema, format='parquet')
+            return dataset.to_table(columns=read_columns, filter=expression)
+        
+        # Compaction may replace a day's parts while they are listed; read again then
+        table = self._read_consistent(symbol, timeframe, read_files)
+        if table is None:
+            return pd.DataFrame(columns=columns or CSV_HEADERS)
+        return table.to_pandas().sort_values('datetime', kind='stable').reset_index(drop=True)
+    
+    def _describe_stream(self, name):
+        """list_files entry for one stream directory, or None"""
+        stream_dir = os.path.join(self.data_dir, name)
+        parts = name.split('_')
+        if not os.path.isdir(stream_dir) or len(parts) < 2:
+            return None
+        
+        # Sum the size and take the latest modification time over all part files
+        size = 0
+        modified_time = os.path.getmtime(stream_dir)
+        for path in self._partition_files(stream_dir):
+            stat = os.stat(path)
+            size += stat.st_size
+            modified_time = max(modified_time, stat.st_mtime)
+        
+        return {
+            'filename': name,
+            'symbol': parts[0],
+            'timeframe': parts[1],
+            'size': size,
+            'modified': datetime.fromtimestamp(modified_time).strftime('%Y-%m-%d %H:%M:%S'),
+            'modified_time': modified_time
+        }
+    
+    def list_files(self):
+        files = []
+        for name in os.listdir(self.data_dir):
+            info = self._describe_stream(name)
+            if info is not None:
+                files.append(info)
+        return files
+    
+    def file_info(self, symbol, timeframe):
+        return self._describe_stream(f"{symbol}_{timeframe}")
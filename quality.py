@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import fcntl
+import tempfile
+import logging
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+
+from downsample import CALENDAR_TIMEFRAME_SECONDS, timeframe_seconds
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Scan results and positions, kept in the data directory between runs
+QUALITY_FILE = 'quality.json'
+
+# Examples of each problem kept per stream, newest last
+SAMPLE_LIMIT = 20
+
+# A gap from Friday or Saturday to Sunday or Monday shorter than this is the
+# weekend close rather than missing data
+MAX_WEEKEND_GAP = 4 * 86400
+
+QUALITY_COLUMNS = ['datetime', 'open', 'high', 'low', 'close', 'volume']
+
+ISSUES = ('gaps', 'duplicates', 'out_of_order', 'misaligned', 'invalid_bars', 'invalid_times')
+
+def _format_time(value):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(int(value)))
+
+def _weekday(times):
+    """Day of the week of unix times, Monday = 0"""
+    return (times // 86400 + 3) % 7
+
+class StreamQuality:
+    """Scan position and findings of one (symbol, timeframe) stream"""
+    
+    __slots__ = ('position', 'rows', 'last_time', 'phase', 'counts', 'samples', 'scanned_at')
+    
+    def __init__(self):
+        # Storage position returned by read_appended, None before the first scan
+        self.position = None
+        self.rows = 0
+        
+        # Time of the last readable bar, compared with the first bar of the next chunk
+        self.last_time = None
+        
+        # Bar times are expected at phase + k * interval, from the first bar
+        self.phase = None
+        
+        self.counts = dict.fromkeys(ISSUES + ('missing_bars', 'weekend_gaps'), 0)
+        self.samples = {issue: [] for issue in ISSUES}
+        self.scanned_at = None
+    
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    @classmethod
+    def from_dict(cls, data):
+        stream = cls()
+        for name in cls.__slots__:
+            if name in data:
+                setattr(stream, name, data[name])
+        return stream
+    
+    def _sample(self, issue, entries):
+        samples = self.samples[issue]
+        samples.extend(entries[-SAMPLE_LIMIT:])
+        del samples[:-SAMPLE_LIMIT]
+    
+    def scan(self, df, interval):
+        """Add the findings of the next rows of the stream, in storage order
+        
+        interval is the bar length in seconds, or None for calendar
+        timeframes, which are only checked for order and duplicates.
+        """
+        times = pd.to_datetime(df['datetime'], errors='coerce')
+        readable = times.notna().to_numpy()
+        self.rows += len(df)
+        
+        invalid_times = np.flatnonzero(~readable)
+        self.counts['invalid_times'] += len(invalid_times)
+        self._sample('invalid_times', [str(df['datetime'].iloc[i]) for i in invalid_times[-SAMPLE_LIMIT:]])
+        
+        epochs = times[readable].to_numpy(dtype='datetime64[s]').astype('<i8')
+        self._scan_prices(df[readable], epochs)
+        if not len(epochs):
+            return
+        
+        # The previous chunk's last bar precedes this chunk's first
+        previous = np.concatenate(([self.last_time], epochs[:-1])) if self.last_time is not None else epochs[:-1]
+        current = epochs if self.last_time is not None else epochs[1:]
+        diffs = current - previous
+        self.last_time = int(epochs[-1])
+        
+        duplicates = np.flatnonzero(diffs == 0)
+        self.counts['duplicates'] += len(duplicates)
+        self._sample('duplicates', [{'time': _format_time(current[i])} for i in duplicates[-SAMPLE_LIMIT:]])
+        
+        out_of_order = np.flatnonzero(diffs < 0)
+        self.counts['out_of_order'] += len(out_of_order)
+        self._sample('out_of_order', [
+            {'time': _format_time(current[i]), 'after': _format_time(previous[i])}
+            for i in out_of_order[-SAMPLE_LIMIT:]
+        ])
+        
+        if interval is None:
+            return
+        
+        if self.phase is None:
+            self.phase = int(epochs[0] % interval)
+        misaligned = np.flatnonzero((epochs - self.phase) % interval != 0)
+        self.counts['misaligned'] += len(misaligned)
+        self._sample('misaligned', [{'time': _format_time(epochs[i])} for i in misaligned[-SAMPLE_LIMIT:]])
+        
+        gaps = np.flatnonzero(diffs > interval)
+        weekend = (
+            np.isin(_weekday(previous[gaps]), (4, 5))
+            & np.isin(_weekday(current[gaps]), (6, 0))
+            & (diffs[gaps] < MAX_WEEKEND_GAP)
+        )
+        self.counts['weekend_gaps'] += int(weekend.sum())
+        gaps = gaps[~weekend]
+        missing = (diffs[gaps] - 1) // interval
+        self.counts['gaps'] += len(gaps)
+        self.counts['missing_bars'] += int(missing.sum())
+        self._sample('gaps', [
+            {'after': _format_time(previous[i]), 'before': _format_time(current[i]), 'missing_bars': int(n)}
+            for i, n in zip(gaps[-SAMPLE_LIMIT:], missing[-SAMPLE_LIMIT:])
+        ])
+    
+    def _scan_prices(self, df, epochs):
+        """Count bars whose prices contradict each other"""
+        open_, high, low, close = (
+            df[column].to_numpy(dtype=np.float64) for column in ('open', 'high', 'low', 'close')
+        )
+        volume = df['volume'].to_numpy(dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            bad = (
+                ~(high >= np.fmax(open_, close)) | ~(low <= np.fmin(open_, close)) | ~(low > 0)
+                | ~(volume >= 0)
+            )
+        invalid = np.flatnonzero(bad)
+        self.counts['invalid_bars'] += len(invalid)
+        self._sample('invalid_bars', [{'time': _format_time(epochs[i])} for i in invalid[-SAMPLE_LIMIT:]])
+    
+    def report(self, symbol, timeframe):
+        return {
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'rows': self.rows,
+            'last': _format_time(self.last_time) if self.last_time is not None else None,
+            'scanned_at': self.scanned_at,
+            **self.counts,
+            'samples': self.samples
+        }
+
+class QualityScanner:
+    """Incremental check of stored streams for gaps, duplicates and disorder
+    
+    Each scan reads only the rows stored since the previous one (see
+    StorageBackend.read_appended) and checks them with vectorized numpy
+    comparisons against each other and the last bar seen before, so a
+    nightly run over a large archive costs about as much as the day's new
+    data. Counters, samples and positions are saved to data/quality.json;
+    a stream that was rewritten, or a rescan, starts over from its first row.
+    Scans hold a lock on quality.json.lock, so processes sharing the data
+    directory take turns and each starts from the positions the last saved.
+    
+    Bars are expected every timeframe length from the stream's first bar,
+    with the weekend close as the only allowed gap. Stored times are local
+    time plus mt5_connector.DISPLAY_TIME_OFFSET, so a daylight saving change
+    on the recording machine shows up as a gap and misaligned bars in spring
+    and as duplicates or out-of-order bars in autumn.
+    """
+    
+    def __init__(self, data_manager, path=None):
+        self.data_manager = data_manager
+        self.path = path or os.path.join(data_manager.data_dir, QUALITY_FILE)
+        self.lock_path = self.path + '.lock'
+        self.streams = {}
+        self.loaded_mtime = None
+        self.lock = threading.Lock()
+        
+        # Streams are scanned one at a time
+        self.scan_lock = threading.Lock()
+        
+        self._load()
+    
+    def _load(self):
+        """Read the saved state if another process updated it since"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self.loaded_mtime:
+            return
+        
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading quality state: {str(e)}")
+            return
+        
+        with self.lock:
+            self.streams = {
+                (entry['symbol'], entry['timeframe']): StreamQuality.from_dict(entry['state'])
+                for entry in saved.get('streams', [])
+            }
+            self.loaded_mtime = mtime
+    
+    def _save(self):
+        with self.lock:
+            saved = {'streams': [
+                {'symbol': symbol, 'timeframe': timeframe, 'state': stream.to_dict()}
+                for (symbol, timeframe), stream in self.streams.items()
+            ]}
+        
+        # Write to a temporary file of our own first so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', prefix=QUALITY_FILE, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(saved, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.loaded_mtime = os.path.getmtime(self.path)
+    
+    def scan_stream(self, symbol, timeframe, rescan=False):
+        """Check a stream's rows stored since its last scan; returns its report"""
+        interval = None if timeframe in CALENDAR_TIMEFRAME_SECONDS else timeframe_seconds(timeframe)
+        
+        with self.lock:
+            previous = None if rescan else self.streams.get((symbol, timeframe))
+        stream = StreamQuality.from_dict(previous.to_dict()) if previous else StreamQuality()
+        
+        result = self.data_manager.get_appended(symbol, timeframe, stream.position, QUALITY_COLUMNS)
+        if result is None:
+            # The stream was rewritten since the last scan
+            logger.info(f"Rescanning {symbol} ({timeframe}) from the start")
+            stream = StreamQuality()
+            result = self.data_manager.get_appended(symbol, timeframe, None, QUALITY_COLUMNS)
+        
+        df, stream.position = result
+        if df is not None and len(df):
+            stream.scan(df, interval)
+        stream.scanned_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        
+        with self.lock:
+            self.streams[(symbol, timeframe)] = stream
+        return stream.report(symbol, timeframe)
+    
+    def scan(self, symbol=None, timeframe=None, rescan=False):
+        """Scan every stored stream, or those of one symbol and/or timeframe"""
+        files = self.data_manager.query_saved_files(symbol, timeframe)['files']
+        streams = sorted({(info['symbol'], info['timeframe']) for info in files})
+        
+        reports = []
+        with self.scan_lock, open(self.lock_path, 'a') as lock_file:
+            # Other processes scan and save under the same lock
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._load()
+            for stream_symbol, stream_timeframe in streams:
+                try:
+                    reports.append(self.scan_stream(stream_symbol, stream_timeframe, rescan))
+                except Exception as e:
+                    logger.error(f"Error scanning {stream_symbol} ({stream_timeframe}): {str(e)}")
+            self._save()
+        return reports
+    
+    def reports(self, symbol=None, timeframe=None):
+        """Findings of the last scans without reading any data"""
+        self._load()
+        with self.lock:
+            return [
+                stream.report(*key) for key, stream in sorted(self.streams.items())
+                if (symbol is None or key[0] == symbol) and (timeframe is None or key[1] == timeframe)
+            ]
+
+if __name__ == '__main__':
+    from data_manager import data_manager_from_env
+    
+    parser = argparse.ArgumentParser(description='Check stored candles for gaps, duplicates and disorder')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--symbol')
+    parser.add_argument('--timeframe')
+    parser.add_argument('--rescan', action='store_true', help='start over from the first row of every stream')
+    args = parser.parse_args()
+    
+    data_manager = data_manager_from_env(args.data_dir, writer=False)
+    begin = time.perf_counter()
+    reports = QualityScanner(data_manager).scan(args.symbol, args.timeframe, args.rescan)
+    elapsed = time.perf_counter() - begin
+    
+    for report in reports:
+        print(
+            f"{report['symbol']} {report['timeframe']}: {report['rows']} rows, {report['gaps']} gaps "
+            f"({report['missing_bars']} missing bars), {report['duplicates']} duplicates, "
+            f"{report['out_of_order']} out of order, {report['misaligned']} misaligned, "
+            f"{report['invalid_bars']} invalid bars, {report['invalid_times']} invalid times"
+        )
+    print(f"Scanned {len(reports)} streams in {elapsed:.2f}s")
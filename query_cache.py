@@ -0,0 +1,187 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+from storage import CSV_HEADERS
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Memory the cached frames may use, in bytes
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Candles queued on an entry before they are folded in without waiting for a read
+PENDING_LIMIT = 1000
+
+def _frame_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+class CachedQuery:
+    """A parsed result plus the candles saved into its range since it was read"""
+    
+    __slots__ = ('frame', 'columns', 'start', 'end', 'last', 'pending', 'size')
+    
+    def __init__(self, frame, columns, start, end):
+        self.frame = frame
+        self.columns = columns
+        self.start = start
+        self.end = end
+        self.pending = []
+        self.size = _frame_bytes(frame)
+        
+        # Newest candle time in the frame; older arrivals mean the cache is stale
+        self.last = pd.Timestamp(frame['datetime'].iloc[-1]) if len(frame) else None
+    
+    def covers(self, timestamp):
+        return (self.start is None or timestamp >= self.start) and (self.end is None or timestamp <= self.end)
+    
+    def materialize(self):
+        """Fold pending candles into the frame; returns the change in size"""
+        if not self.pending:
+            return 0
+        
+        added = pd.DataFrame(self.pending, columns=self.columns)
+        self.pending = []
+        if len(self.frame) and pd.api.types.is_datetime64_any_dtype(self.frame['datetime']):
+            added['datetime'] = pd.to_datetime(added['datetime'])
+        self.frame = pd.concat([self.frame, added], ignore_index=True) if len(self.frame) else added
+        
+        size = _frame_bytes(self.frame)
+        change, self.size = size - self.size, size
+        return change
+
+class QueryCache:
+    """Bounded LRU cache of historical query results
+    
+    Frames are keyed by (symbol, timeframe, start, end, columns). A candle
+    saved to a stream is queued on the stream's cached ranges that include
+    it and appended when the entry is next read, so hot windows stay current
+    without re-reading the file; a candle older than an entry's newest row,
+    or a bulk save, drops the stream's entries instead. Least recently used
+    entries are evicted once the frames exceed max_bytes.
+    """
+    
+    def __init__(self, data_manager, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        # Cache keys per (symbol, timeframe), so saves only look at their stream
+        self.streams = {}
+        
+        # Saves per stream; a load that overlapped a save is not cached
+        self.versions = {}
+        
+        data_manager.add_listener(self.on_candle)
+        data_manager.add_bulk_listener(self.on_bulk_save)
+    
+    def get(self, symbol, timeframe, start_date, end_date, columns, load):
+        """Cached frame for a query, calling load() on a miss
+        
+        Returns a copy, so callers may modify it. load() returning None is
+        not cached.
+        """
+        key = (symbol, timeframe, start_date, end_date, tuple(columns) if columns else None)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                self.bytes += entry.materialize()
+                frame = entry.frame
+                self._evict()
+                return frame.copy()
+            self.misses += 1
+            version = self.versions.get(key[:2], 0)
+        
+        frame = load()
+        if frame is None:
+            return None
+        
+        entry = CachedQuery(
+            frame.copy(),
+            ['datetime'] + [column for column in columns if column != 'datetime'] if columns else CSV_HEADERS,
+            pd.Timestamp(start_date) if start_date is not None else None,
+            pd.Timestamp(end_date) if end_date is not None else None
+        )
+        if entry.size > self.max_bytes:
+            return frame
+        
+        with self.lock:
+            if self.versions.get(key[:2], 0) != version:
+                return frame
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.size
+            self.entries[key] = entry
+            self.streams.setdefault((symbol, timeframe), set()).add(key)
+            self.bytes += entry.size
+            self._evict()
+        return frame
+    
+    def _evict(self):
+        """Drop least recently used entries until under the limit; caller must hold the lock"""
+        while self.bytes > self.max_bytes and self.entries:
+            key, entry = self.entries.popitem(last=False)
+            self._forget(key, entry)
+            self.evictions += 1
+    
+    def _forget(self, key, entry):
+        self.bytes -= entry.size
+        keys = self.streams.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.streams[key[:2]]
+    
+    def invalidate(self, symbol, timeframe):
+        """Drop every cached query of a stream"""
+        with self.lock:
+            self.versions[(symbol, timeframe)] = self.versions.get((symbol, timeframe), 0) + 1
+            for key in list(self.streams.get((symbol, timeframe), ())):
+                self._forget(key, self.entries.pop(key))
+    
+    def on_candle(self, symbol, timeframe, candle_data):
+        """Queue a saved candle on the stream's cached ranges that include it"""
+        stream = (symbol, timeframe)
+        with self.lock:
+            # A load running now must not cache a frame missing this candle
+            self.versions[stream] = self.versions.get(stream, 0) + 1
+            if stream not in self.streams:
+                return
+            
+            timestamp = pd.Timestamp(candle_data['datetime'])
+            for key in list(self.streams[stream]):
+                entry = self.entries[key]
+                if not entry.covers(timestamp):
+                    continue
+                if entry.last is not None and timestamp <= entry.last:
+                    # Replaces or precedes cached rows; read it again next time
+                    self._forget(key, self.entries.pop(key))
+                    continue
+                entry.pending.append([candle_data.get(column) for column in entry.columns])
+                entry.last = timestamp
+                if len(entry.pending) >= PENDING_LIMIT:
+                    self.bytes += entry.materialize()
+            self._evict()
+    
+    def on_bulk_save(self, symbol, timeframe):
+        self.invalidate(symbol, timeframe)
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,442 @@
+import os
+import sys
+import time
+import queue
+import signal
+import logging
+import threading
+from multiprocessing.connection import Listener, Client
+
+from mt5_connector import MT5Connector
+from metrics import REGISTRY, WEB_METRICS
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Where the recorder process listens unless RECORDER_ADDRESS says otherwise
+DEFAULT_ADDRESS = '127.0.0.1:6001'
+
+# Candle notifications buffered per follower before the oldest ones are dropped
+FEED_QUEUE_SIZE = 1024
+
+# Seconds a follower waits before reconnecting to a restarted recorder
+RECONNECT_DELAY = 2.0
+
+NOT_CONNECTED = {'success': False, 'message': 'Not connected to MT5'}
+
+def parse_address(value):
+    """'host:port' is a TCP address; anything else is a Unix socket path"""
+    host, separator, port = value.rpartition(':')
+    if separator and port.isdigit():
+        return (host or '127.0.0.1', int(port))
+    return value
+
+def recorder_authkey():
+    """Shared secret that web workers present to the recorder
+    
+    Connections carry pickled objects, so there is no default: a known key
+    would let any local process run code in the recorder.
+    """
+    key = os.environ.get('RECORDER_AUTHKEY') or os.environ.get('SESSION_SECRET')
+    if not key:
+        raise RuntimeError("Set RECORDER_AUTHKEY (or SESSION_SECRET) to run the recorder as a separate process")
+    return key.encode()
+
+class Recorder:
+    """The recording engine: the MT5 connection, its streams and backfills
+    
+    Holds the only MT5Connector, so every candle is written by one process.
+    app.py uses it directly when it runs as a single process; with several
+    web workers it lives in the recorder process behind a RecorderServer and
+    the workers reach it through a RecorderClient. Commands return
+    JSON-ready results shaped like the API responses.
+    """
+    
+    # Methods a RecorderClient may call
+    COMMANDS = (
+        'connect', 'disconnect', 'status', 'symbols', 'start_recording', 'stop_recording',
+        'start_backfill', 'backfill_status', 'stop_backfill', 'latest_data', 'buffer_stats', 'metrics'
+    )
+    
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+        self.connector = None
+        self.lock = threading.Lock()
+        
+        # Values read from the live objects whenever metrics are scraped
+        REGISTRY.gauge_callback('mt5_buffered_rows', 'Rows waiting in write buffers', ('store',),
+                                self._buffered_rows)
+        REGISTRY.gauge_callback('mt5_ring_candles', 'Recent candles held in memory per stream',
+                                ('symbol', 'timeframe'), lambda: self.buffer_stats()['ring_candles'])
+        REGISTRY.gauge_callback('mt5_recording_streams', 'Active recording streams', (),
+                                lambda: {(): len(self.status()['streams'])})
+        REGISTRY.gauge_callback('mt5_scheduler_candles', 'Candles emitted and boundaries missed by the scheduler',
+                                ('outcome',), self._scheduler_stats)
+    
+    def _buffered_rows(self):
+        return {(store,): rows for store, rows in self.buffer_stats()['buffered_rows'].items()}
+    
+    def _scheduler_stats(self):
+        stats = self.status()['scheduler'] or {}
+        return {(name,): stats.get(name) or 0 for name in ('emitted', 'missed')}
+    
+    def _connected(self):
+        """The connector if it is connected, else None"""
+        connector = self.connector
+        if connector is None or not connector.is_connected():
+            return None
+        return connector
+    
+    def connect(self, path=''):
+        """Connect to the MT5 terminal at path
+        
+        Recording starts here, so this is where the write-ahead log of the
+        data manager is recovered and opened.
+        """
+        with self.lock:
+            try:
+                self.data_manager.open_wal()
+            except RuntimeError as e:
+                logger.error(f"Error opening the write-ahead log: {str(e)}")
+                return {'success': False, 'message': str(e)}
+            
+            if self.connector is not None:
+                # Replacing the connection must not leave its streams recording
+                self.connector.disconnect()
+            
+            self.connector = MT5Connector(path)
+            if self.connector.connect():
+                return {'success': True, 'message': 'Connected to MT5 successfully'}
+            return {'success': False, 'message': 'Failed to connect to MT5'}
+    
+    def disconnect(self):
+        """Disconnect from MT5, which also stops every active recording stream"""
+        with self.lock:
+            if self.connector is None:
+                return NOT_CONNECTED
+            self.connector.disconnect()
+            self.connector = None
+            return {'success': True, 'message': 'Disconnected from MT5'}
+    
+    def shutdown(self):
+        """Stop recording before the process exits"""
+        with self.lock:
+            if self.connector is not None:
+                self.connector.disconnect()
+                self.connector = None
+    
+    def status(self):
+        """Connection and recording status"""
+        connector = self.connector
+        streams = connector.get_streams() if connector else []
+        return {
+            'connected': connector is not None and connector.is_connected(),
+            'recording': len(streams) > 0,
+            'current_symbol': streams[0]['symbol'] if streams else None,
+            'streams': streams,
+            'tick_streams': connector.get_tick_streams() if connector else [],
+            'scheduler': connector.get_scheduler_stats() if connector else None
+        }
+    
+    def symbols(self):
+        """Symbols available from MT5"""
+        connector = self._connected()
+        if connector is None:
+            return NOT_CONNECTED
+        return {'success': True, 'symbols': connector.get_symbols()}
+    
+    def start_recording(self, symbol, timeframe='M1', source=None, timeframes=None):
+        """Start recording a stream
+        
+        With source 'ticks' the symbol's tick stream is recorded instead, and
+        bars for every timeframe in timeframes are built from it.
+        """
+        connector = self._connected()
+        if connector is None:
+            return NOT_CONNECTED
+        
+        if source == 'ticks':
+            timeframes = timeframes or [timeframe]
+            if connector.start_tick_recording(symbol, self.data_manager, timeframes):
+                return {'success': True, 'message': f'Started tick recording {symbol} ({", ".join(timeframes)})'}
+            busy = connector.busy_streams([(symbol, tf) for tf in timeframes])
+            if busy:
+                return {'success': False, 'message': f'Already recording {", ".join(busy)}'}
+            return {'success': False, 'message': 'Failed to start tick recording'}
+        
+        if connector.start_recording(symbol, timeframe, self.data_manager):
+            return {'success': True, 'message': f'Started recording {symbol} ({timeframe})'}
+        if connector.busy_streams([(symbol, timeframe)]):
+            return {'success': False, 'message': f'Already recording {symbol} ({timeframe})'}
+        return {'success': False, 'message': 'Failed to start recording'}
+    
+    def stop_recording(self, symbol=None, timeframe=None, source=None):
+        """Stop one stream, one symbol, or every stream"""
+        connector = self._connected()
+        if connector is None:
+            return NOT_CONNECTED
+        
+        if source == 'ticks':
+            if connector.stop_tick_recording(symbol):
+                return {'success': True, 'message': f'Stopped tick recording {symbol or ""}'.strip()}
+            return {'success': False, 'message': 'Not currently recording ticks'}
+        
+        if not connector.recording:
+            return {'success': False, 'message': 'Not currently recording'}
+        
+        if connector.stop_recording(symbol, timeframe):
+            if symbol:
+                target = f'{symbol} ({timeframe})' if timeframe else symbol
+                return {'success': True, 'message': f'Stopped recording {target}'}
+            return {'success': True, 'message': 'Stopped recording'}
+        return {'success': False, 'message': 'No matching recording stream'}
+    
+    def start_backfill(self, symbols, timeframes, start, end=None):
+        """Download history for symbols and timeframes between start and end"""
+        connector = self._connected()
+        if connector is None:
+            return NOT_CONNECTED
+        
+        if connector.start_backfill(symbols, timeframes, start, end, self.data_manager):
+            return {'success': True, 'message': f'Started backfill of {len(symbols) * len(timeframes)} streams'}
+        busy = connector.busy_streams([(symbol, tf) for symbol in symbols for tf in timeframes])
+        if busy:
+            return {'success': False, 'message': f'Already recording {", ".join(busy)}'}
+        return {'success': False, 'message': 'Failed to start backfill'}
+    
+    def backfill_status(self):
+        """Progress of the current or last backfill, or None"""
+        connector = self.connector
+        return connector.get_backfill_status() if connector else None
+    
+    def stop_backfill(self):
+        """Stop the running backfill"""
+        connector = self.connector
+        if connector and connector.stop_backfill():
+            return {'success': True, 'message': 'Stopped backfill'}
+        return {'success': False, 'message': 'No backfill running'}
+    
+    def latest_data(self, count=10, symbol=None, timeframe=None):
+        """Latest candles from the recent-candle rings"""
+        return self.data_manager.get_latest_data(count, symbol, timeframe)
+    
+    def buffer_stats(self):
+        """Write buffer and recent-candle ring sizes"""
+        return self.data_manager.get_buffer_stats()
+    
+    def metrics(self):
+        """Recorder and storage metrics in the Prometheus text format"""
+        return REGISTRY.render(exclude=WEB_METRICS)
+
+def _offer(feed, message, lost):
+    """Queue a message without blocking, dropping the oldest one if full
+    
+    lost is an Event set when a message was dropped.
+    """
+    while True:
+        try:
+            feed.put_nowait(message)
+            return
+        except queue.Full:
+            try:
+                feed.get_nowait()
+                lost.set()
+            except queue.Empty:
+                pass
+
+class RecorderServer:
+    """Serves a Recorder's commands and candle feed on a local socket
+    
+    Each client connection gets its own thread. A connection that sends
+    'follow' instead of a command receives every saved candle from then on,
+    as ('candle', symbol, timeframe, candle_data) and ('bulk', symbol,
+    timeframe) messages. A follower that falls FEED_QUEUE_SIZE messages
+    behind loses the oldest ones and is sent ('resync',) before the next.
+    """
+    
+    def __init__(self, recorder, address, authkey):
+        self.recorder = recorder
+        
+        # A Unix socket left behind by a killed recorder would block the bind
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+    
+    def serve_forever(self):
+        """Accept client connections until the listener is closed"""
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                break
+            except Exception as e:
+                logger.warning(f"Rejected recorder client: {str(e)}")
+                continue
+            
+            threading.Thread(target=self._handle, args=(connection,), name='recorder-client', daemon=True).start()
+    
+    def close(self):
+        self.listener.close()
+    
+    def _handle(self, connection):
+        """Answer one client's commands until it disconnects"""
+        try:
+            while True:
+                command, args, kwargs = connection.recv()
+                if command == 'follow':
+                    self._follow(connection)
+                    break
+                
+                if command not in Recorder.COMMANDS:
+                    connection.send(('error', f'Unknown command: {command}'))
+                    continue
+                
+                try:
+                    result = ('ok', getattr(self.recorder, command)(*args, **kwargs))
+                except Exception as e:
+                    logger.error(f"Error in recorder command {command}: {str(e)}")
+                    result = ('error', str(e))
+                connection.send(result)
+        
+        except (EOFError, OSError):
+            # The client went away
+            pass
+        
+        finally:
+            connection.close()
+    
+    def _follow(self, connection):
+        """Send every saved candle to the client until it disconnects"""
+        data_manager = self.recorder.data_manager
+        feed = queue.Queue(maxsize=FEED_QUEUE_SIZE)
+        lost = threading.Event()
+        
+        def on_candle(symbol, timeframe, candle_data):
+            _offer(feed, ('candle', symbol, timeframe, candle_data), lost)
+        
+        def on_bulk(symbol, timeframe):
+            _offer(feed, ('bulk', symbol, timeframe), lost)
+        
+        data_manager.add_listener(on_candle)
+        data_manager.add_bulk_listener(on_bulk)
+        try:
+            while True:
+                message = feed.get()
+                if lost.is_set():
+                    lost.clear()
+                    connection.send(('resync',))
+                connection.send(message)
+        finally:
+            data_manager.remove_listener(on_candle)
+            data_manager.remove_bulk_listener(on_bulk)
+
+class RecorderClient:
+    """Stand-in for the Recorder in web workers, forwarding commands to the recorder process
+    
+    Has the same command methods as Recorder. Each thread keeps its own
+    connection, which is re-opened once if the recorder was restarted.
+    """
+    
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self.local = threading.local()
+    
+    def __getattr__(self, name):
+        if name not in Recorder.COMMANDS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+    
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = Client(self.address, authkey=self.authkey)
+            self.local.connection = connection
+        return connection
+    
+    def call(self, command, *args, **kwargs):
+        """Run a Recorder command in the recorder process and return its result"""
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.send((command, args, kwargs))
+                status, result = connection.recv()
+                break
+            except (EOFError, OSError):
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+        
+        if status == 'error':
+            raise RuntimeError(result)
+        return result
+    
+    def follow(self, data_manager):
+        """Replay the recorder's saved candles to a local DataManager's listeners
+        
+        After a reconnect, or when the recorder dropped messages, every
+        stream is treated as changed; see DataManager.mirror_resync.
+        """
+        thread = threading.Thread(target=self._follow_worker, args=(data_manager,), name='recorder-follower')
+        thread.daemon = True
+        thread.start()
+    
+    def _follow_worker(self, data_manager):
+        connected_before = False
+        while True:
+            connection = None
+            try:
+                connection = Client(self.address, authkey=self.authkey)
+                connection.send(('follow', (), {}))
+                
+                # Candles saved while disconnected were never sent
+                if connected_before:
+                    data_manager.mirror_resync()
+                connected_before = True
+                
+                while True:
+                    message = connection.recv()
+                    if message[0] == 'candle':
+                        data_manager.mirror_candle(*message[1:])
+                    elif message[0] == 'bulk':
+                        data_manager.mirror_candles(*message[1:])
+                    else:
+                        data_manager.mirror_resync()
+            
+            except Exception as e:
+                logger.warning(f"Lost the recorder's candle feed, reconnecting: {str(e)}")
+            
+            finally:
+                if connection is not None:
+                    connection.close()
+            
+            time.sleep(RECONNECT_DELAY)
+
+def main():
+    """Run the recorder process that the web workers connect to"""
+    from data_manager import data_manager_from_env
+    
+    address = parse_address(os.environ.get('RECORDER_ADDRESS', DEFAULT_ADDRESS))
+    authkey = recorder_authkey()
+    data_manager = data_manager_from_env()
+    recorder = Recorder(data_manager)
+    server = RecorderServer(recorder, address, authkey)
+    
+    # Let SIGTERM from gunicorn or a process manager run the cleanup below
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    logger.info(f"Recorder listening on {server.address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        recorder.shutdown()
+        data_manager.close()
+
+if __name__ == '__main__':
+    main()
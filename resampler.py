@@ -0,0 +1,300 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+from mt5_connector import (
+    TIMEFRAME_M1, TIMEFRAME_M5, TIMEFRAME_M15, TIMEFRAME_M30,
+    TIMEFRAME_H1, TIMEFRAME_H4, TIMEFRAME_D1
+)
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Higher timeframes are derived from this recorded base timeframe
+BASE_TIMEFRAME = 'M1'
+
+# Fixed-length timeframes in minutes; W1 and MN1 follow the calendar
+FIXED_TIMEFRAMES = {
+    'M1': TIMEFRAME_M1,
+    'M5': TIMEFRAME_M5,
+    'M15': TIMEFRAME_M15,
+    'M30': TIMEFRAME_M30,
+    'H1': TIMEFRAME_H1,
+    'H4': TIMEFRAME_H4,
+    'D1': TIMEFRAME_D1
+}
+
+SUPPORTED_TIMEFRAMES = list(FIXED_TIMEFRAMES) + ['W1', 'MN1']
+
+# Maximum number of (symbol, timeframe) rollups kept in memory
+DEFAULT_CACHE_SIZE = 32
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+def bucket_starts(times, timeframe):
+    """Vectorized start of the bar each datetime in a Series falls into"""
+    if timeframe in FIXED_TIMEFRAMES:
+        return times.dt.floor(f"{FIXED_TIMEFRAMES[timeframe]}min")
+    if timeframe == 'W1':
+        # Weeks start on Sunday like MT5
+        return times.dt.normalize() - pd.to_timedelta((times.dt.dayofweek + 1) % 7, unit='D')
+    if timeframe == 'MN1':
+        return times.dt.to_period('M').dt.start_time
+    raise ValueError(f"Unsupported timeframe: {timeframe}")
+
+def bucket_start(timestamp, timeframe):
+    """Start of the bar a single Timestamp falls into (matches bucket_starts)"""
+    if timeframe in FIXED_TIMEFRAMES:
+        return timestamp.floor(f"{FIXED_TIMEFRAMES[timeframe]}min")
+    if timeframe == 'W1':
+        return timestamp.normalize() - pd.Timedelta(days=(timestamp.dayofweek + 1) % 7)
+    if timeframe == 'MN1':
+        return timestamp.normalize().replace(day=1)
+    raise ValueError(f"Unsupported timeframe: {timeframe}")
+
+def resample_candles(df, timeframe):
+    """Aggregate OHLCV candles into bars of a higher timeframe
+    
+    df needs datetime, open, high, low, close and volume columns. Returns a
+    DataFrame indexed by bar start time with the OHLCV columns; buckets
+    without any source candle are omitted.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], name='datetime'))
+    
+    times = pd.to_datetime(df['datetime'])
+    buckets = bucket_starts(times, timeframe).rename('datetime')
+    
+    # Sort by time first so first/last pick the real open/close
+    order = times.argsort(kind='stable')
+    grouped = df[OHLCV_COLUMNS].iloc[order].groupby(buckets.iloc[order].to_numpy(), sort=True)
+    bars = grouped.agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+    bars.index = pd.DatetimeIndex(bars.index, name='datetime')
+    return bars
+
+class RollupCache:
+    """Cached higher-timeframe bars for one symbol, updated as base candles arrive"""
+    
+    __slots__ = ('timeframe', 'bars', 'pending', 'current')
+    
+    def __init__(self, timeframe, bars):
+        self.timeframe = timeframe
+        
+        # Completed bars, bars completed since the last read, and the open bar
+        self.bars = bars.iloc[:-1]
+        self.pending = []
+        self.current = None
+        if len(bars):
+            last = bars.iloc[-1]
+            self.current = [bars.index[-1]] + [last[column] for column in OHLCV_COLUMNS]
+    
+    def update(self, candle_data):
+        """Fold one base candle into the open bar; False if it arrived out of order"""
+        start = bucket_start(pd.Timestamp(candle_data['datetime']), self.timeframe)
+        
+        if self.current is not None and start == self.current[0]:
+            current = self.current
+            current[2] = max(current[2], candle_data['high'])
+            current[3] = min(current[3], candle_data['low'])
+            current[4] = candle_data['close']
+            current[5] += candle_data['volume']
+            return True
+        
+        if self.current is not None and start < self.current[0]:
+            return False
+        
+        if self.current is not None:
+            self.pending.append(self.current)
+        self.current = [
+            start, candle_data['open'], candle_data['high'], candle_data['low'],
+            candle_data['close'], candle_data['volume']
+        ]
+        return True
+    
+    def frame(self):
+        """All bars including the open one, as a DataFrame indexed by start time"""
+        if self.pending:
+            completed = pd.DataFrame(
+                [row[1:] for row in self.pending],
+                columns=OHLCV_COLUMNS,
+                index=pd.DatetimeIndex([row[0] for row in self.pending], name='datetime')
+            )
+            self.bars = pd.concat([self.bars, completed]) if len(self.bars) else completed
+            self.pending = []
+        
+        if self.current is None:
+            return self.bars
+        
+        current = pd.DataFrame(
+            [self.current[1:]],
+            columns=OHLCV_COLUMNS,
+            index=pd.DatetimeIndex([self.current[0]], name='datetime')
+        )
+        return pd.concat([self.bars, current]) if len(self.bars) else current
+
+class CandleResampler:
+    """Serves higher-timeframe candles rolled up from stored M1 data
+    
+    Rollups are built on first request from the full M1 history and cached
+    per (symbol, timeframe). The resampler listens to DataManager.save_candle
+    so new M1 candles extend the cached rollups in place instead of forcing a
+    re-read. The history is read outside the resampler's lock, and base
+    candles saved meanwhile are folded in once it is loaded, so recording
+    never waits for a build.
+    """
+    
+    def __init__(self, data_manager, cache_size=DEFAULT_CACHE_SIZE):
+        self.data_manager = data_manager
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        
+        # Base candles saved while a rollup is being built, per rollup
+        self.warming = {}
+        
+        # One build per rollup at a time
+        self.warm_locks = {}
+        
+        data_manager.add_listener(self.on_candle)
+        data_manager.add_bulk_listener(self.on_bulk_save)
+    
+    def on_candle(self, symbol, timeframe, candle_data):
+        """Extend cached rollups of a symbol with a newly saved base candle"""
+        if timeframe != BASE_TIMEFRAME:
+            return
+        
+        with self.lock:
+            for key, pending in self.warming.items():
+                if key[0] == symbol and pending is not None:
+                    pending.append(candle_data)
+            
+            for key in [key for key in self.cache if key[0] == symbol]:
+                if not self.cache[key].update(candle_data):
+                    # Out-of-order data; rebuild from storage on the next request
+                    del self.cache[key]
+    
+    def on_bulk_save(self, symbol, timeframe):
+        """Drop cached rollups of a symbol after a batch of base candles was stored"""
+        if timeframe != BASE_TIMEFRAME:
+            return
+        
+        with self.lock:
+            for key in self.warming:
+                if key[0] == symbol:
+                    self.warming[key] = None
+            for key in [key for key in self.cache if key[0] == symbol]:
+                del self.cache[key]
+    
+    def _build(self, symbol, timeframe):
+        """Bars of a timeframe from storage, and the time of the last base candle they include
+        
+        Returns (None, None) without base data. The time is None when the
+        backend grouped the bars itself and it is not known.
+        """
+        # Backends that can group in the database do so for fixed-length bars
+        if timeframe in FIXED_TIMEFRAMES:
+            bars = self.data_manager.storage.aggregate(symbol, BASE_TIMEFRAME, FIXED_TIMEFRAMES[timeframe] * 60)
+            if bars is not None:
+                return bars, None
+        
+        df = self.data_manager.get_dataframe(symbol, BASE_TIMEFRAME, columns=OHLCV_COLUMNS)
+        if df is None:
+            return None, None
+        last_time = pd.to_datetime(df['datetime']).max().strftime('%Y-%m-%d %H:%M:%S') if len(df) else None
+        return resample_candles(df, timeframe), last_time
+    
+    def _get_rollup(self, symbol, timeframe):
+        """Get or build a rollup; the lock must not be held
+        
+        A rollup whose build overlapped with base candles it cannot place is
+        returned without being cached, and built again on the next request.
+        """
+        key = (symbol, timeframe)
+        with self.lock:
+            rollup = self.cache.get(key)
+            if rollup is not None:
+                self.cache.move_to_end(key)
+                return rollup
+            warm_lock = self.warm_locks.setdefault(key, threading.Lock())
+        
+        with warm_lock:
+            with self.lock:
+                rollup = self.cache.get(key)
+                if rollup is not None:
+                    return rollup
+                self.warming[key] = []
+            
+            try:
+                bars, last_time = self._build(symbol, timeframe)
+            finally:
+                with self.lock:
+                    pending = self.warming.pop(key)
+            
+            if bars is None:
+                return None
+            rollup = RollupCache(timeframe, bars)
+            
+            with self.lock:
+                # A bulk save during the read made the bars stale
+                if pending is None:
+                    return rollup
+                
+                # Base candles saved after the history was read
+                if pending and last_time is None:
+                    return rollup
+                for candle_data in pending:
+                    if candle_data['datetime'] > last_time and not rollup.update(candle_data):
+                        return rollup
+                
+                self.cache[key] = rollup
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            return rollup
+    
+    def get_frame(self, symbol, timeframe):
+        """Full history of a timeframe as a DataFrame with datetime and OHLCV columns, or None"""
+        if timeframe not in SUPPORTED_TIMEFRAMES:
+            raise ValueError(f"Unsupported timeframe: {timeframe}")
+        
+        if timeframe == BASE_TIMEFRAME:
+            return self.data_manager.get_dataframe(symbol, BASE_TIMEFRAME, columns=OHLCV_COLUMNS)
+        
+        rollup = self._get_rollup(symbol, timeframe)
+        if rollup is None:
+            return None
+        with self.lock:
+            return rollup.frame().reset_index()
+    
+    def get_candles(self, symbol, timeframe, start_date=None, end_date=None):
+        """Get candles for a symbol and timeframe as a list of dicts
+        
+        Bars are included when their start time lies in [start_date, end_date].
+        Returns an empty list if there is no M1 data for the symbol.
+        """
+        if timeframe not in SUPPORTED_TIMEFRAMES:
+            raise ValueError(f"Unsupported timeframe: {timeframe}")
+        
+        # Base candles are served straight from storage
+        if timeframe == BASE_TIMEFRAME:
+            return self.data_manager.get_data_for_symbol(symbol, BASE_TIMEFRAME, start_date, end_date)
+        
+        rollup = self._get_rollup(symbol, timeframe)
+        if rollup is None:
+            return []
+        with self.lock:
+            bars = rollup.frame()
+        
+        if start_date is not None:
+            bars = bars[bars.index >= pd.Timestamp(start_date)]
+        if end_date is not None:
+            bars = bars[bars.index <= pd.Timestamp(end_date)]
+        
+        bars = bars.reset_index()
+        bars['datetime'] = bars['datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        bars['volume'] = bars['volume'].astype('int64')
+        bars.insert(1, 'symbol', symbol)
+        bars.insert(2, 'timeframe', timeframe)
+        return bars.to_dict('records')
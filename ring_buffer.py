@@ -0,0 +1,74 @@
+import time
+import threading
+import numpy as np
+
+from csv_index import datetime_to_epoch
+from binary_storage import CANDLE_DTYPE
+
+# Candle fields plus a sequence number that orders candles across streams
+RING_DTYPE = np.dtype(CANDLE_DTYPE.descr + [('seq', '<i8')])
+
+def _format_time(epoch):
+    """Format unix seconds back into the 'YYYY-MM-DD HH:MM:SS' CSV format"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(epoch))
+
+class CandleRingBuffer:
+    """Fixed-capacity ring of the latest candles for one (symbol, timeframe)
+    
+    Candles live in a preallocated NumPy structured array, so appends never
+    allocate and reading the last k candles touches only k slots.
+    """
+    
+    def __init__(self, symbol, timeframe, capacity=100):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.capacity = capacity
+        self.records = np.zeros(capacity, dtype=RING_DTYPE)
+        self.lock = threading.Lock()
+        
+        # Total candles ever appended; the next slot is count % capacity
+        self.count = 0
+    
+    def __len__(self):
+        return min(self.count, self.capacity)
+    
+    def append(self, candle_data, seq):
+        """Store a candle, overwriting the oldest one once the ring is full"""
+        with self.lock:
+            self.records[self.count % self.capacity] = (
+                datetime_to_epoch(candle_data['datetime']),
+                candle_data['open'],
+                candle_data['high'],
+                candle_data['low'],
+                candle_data['close'],
+                candle_data['volume'],
+                seq
+            )
+            self.count += 1
+    
+    def tail(self, count):
+        """Copy of the last count records, oldest first"""
+        with self.lock:
+            count = max(0, min(count, len(self)))
+            positions = np.arange(self.count - count, self.count) % self.capacity
+            return self.records[positions]
+    
+    def to_dicts(self, records):
+        """Convert ring records to candle dicts in the CSV row format"""
+        return [
+            {
+                'datetime': _format_time(int(record['time'])),
+                'symbol': self.symbol,
+                'timeframe': self.timeframe,
+                'open': float(record['open']),
+                'high': float(record['high']),
+                'low': float(record['low']),
+                'close': float(record['close']),
+                'volume': int(record['volume'])
+            }
+            for record in records
+        ]
+    
+    def latest(self, count):
+        """The last count candles as dicts, oldest first"""
+        return self.to_dicts(self.tail(count))
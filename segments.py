@@ -0,0 +1,208 @@
+import os
+import gzip
+import zlib
+import queue
+import struct
+import logging
+import threading
+import numpy as np
+
+# zstandard is optional; gzip is used when it is not installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Closed segments live in data/segments/{symbol}_{timeframe}/
+SEGMENT_DIR = 'segments'
+
+# Extensions of compressed segments per segment format, preferred first
+COMPRESSED_EXTENSIONS = {
+    'csv': ('.csv.zst', '.csv.gz'),
+    'bin': ('.bin.gor',)
+}
+
+# Encoded binary segments start with this magic and a record count
+GORILLA_MAGIC = b'MT5G'
+GORILLA_HEADER = struct.Struct('<4sq')
+
+# Per column: codec, decimal scale and payload length
+COLUMN_HEADER = struct.Struct('<Bqq')
+
+# Column codecs: delta-of-delta, delta, scaled decimal delta, and XOR of the float bits
+CODEC_DELTA2 = 1
+CODEC_DELTA = 2
+CODEC_DECIMAL = 3
+CODEC_XOR = 4
+
+# Prices are stored with at most this many decimals by the connector
+PRICE_DECIMALS = 5
+
+class Segment:
+    """A closed, time-ordered part of a stream, named {first}_{last}_{rows}{ext}"""
+    
+    __slots__ = ('path', 'first', 'last', 'rows', 'compressed')
+    
+    def __init__(self, path, first, last, rows, compressed):
+        self.path = path
+        self.first = first
+        self.last = last
+        self.rows = rows
+        self.compressed = compressed
+    
+    def overlaps(self, start=None, end=None):
+        """Check whether the segment has candles in [start, end] (unix times)"""
+        return (start is None or self.last >= start) and (end is None or self.first <= end)
+
+def segment_name(first, last, rows):
+    return f"{first}_{last}_{rows}"
+
+def list_segments(stream_dir, segment_format):
+    """Segments of one stream in time order
+    
+    A segment that is being compressed can briefly exist in both forms; the
+    compressed file is preferred.
+    """
+    if not os.path.isdir(stream_dir):
+        return []
+    
+    raw_extension = f".{segment_format}"
+    extensions = COMPRESSED_EXTENSIONS[segment_format] + (raw_extension,)
+    found = {}
+    for filename in os.listdir(stream_dir):
+        extension = next((ext for ext in extensions if filename.endswith(ext)), None)
+        if extension is None:
+            continue
+        
+        parts = filename[:-len(extension)].split('_')
+        if len(parts) != 3 or not all(part.lstrip('-').isdigit() for part in parts):
+            continue
+        
+        first, last, rows = (int(part) for part in parts)
+        segment = Segment(os.path.join(stream_dir, filename), first, last, rows, extension != raw_extension)
+        existing = found.get((first, last, rows))
+        if existing is None or (segment.compressed and not existing.compressed):
+            found[(first, last, rows)] = segment
+    
+    return sorted(found.values(), key=lambda segment: segment.first)
+
+def read_compressed(path):
+    """Read the decompressed bytes of a .gz or .zst file"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def compress_bytes(data, compression):
+    """Compress a whole file's bytes; returns (payload, extension suffix)"""
+    if compression == 'zstd' and zstandard is not None:
+        return zstandard.ZstdCompressor(level=19).compress(data), '.zst'
+    return gzip.compress(data, compresslevel=9), '.gz'
+
+def _shuffle(values):
+    """Group the n-th bytes of all int64 values so runs of zero bytes compress well"""
+    return np.ascontiguousarray(values.astype('<i8').view(np.uint8).reshape(-1, 8).T).tobytes()
+
+def _unshuffle(data, count):
+    return np.ascontiguousarray(np.frombuffer(data, dtype=np.uint8).reshape(8, count).T).view('<i8').ravel()
+
+def _encode_column(values, kind):
+    """Encode one column as (codec, scale, int64 array)"""
+    if kind == 'time':
+        # Bars are evenly spaced, so the second difference is almost always zero
+        return CODEC_DELTA2, 0, np.diff(np.diff(values, prepend=0), prepend=0)
+    
+    if kind == 'int':
+        return CODEC_DELTA, 0, np.diff(values, prepend=0)
+    
+    # Prices with a fixed number of decimals become small integer steps
+    scale = 10 ** PRICE_DECIMALS
+    scaled = np.round(values * scale)
+    if np.all(np.abs(scaled) < 2 ** 52) and np.array_equal(scaled / scale, values):
+        return CODEC_DECIMAL, scale, np.diff(scaled.astype('<i8'), prepend=0)
+    
+    # Otherwise XOR each value's bits with the previous one, as Gorilla does
+    bits = values.astype('<f8').view('<i8')
+    return CODEC_XOR, 0, np.bitwise_xor(bits, np.concatenate(([0], bits[:-1])).astype('<i8'))
+
+def _decode_column(codec, scale, encoded):
+    if codec == CODEC_DELTA2:
+        return np.cumsum(np.cumsum(encoded))
+    if codec == CODEC_DELTA:
+        return np.cumsum(encoded)
+    if codec == CODEC_DECIMAL:
+        return np.cumsum(encoded) / scale
+    if codec == CODEC_XOR:
+        return np.bitwise_xor.accumulate(encoded).view('<f8')
+    raise ValueError(f"Unknown column codec: {codec}")
+
+def encode_records(records, columns):
+    """Gorilla-style encoding of a structured array of candles or ticks
+    
+    columns maps each field to 'time', 'int' or 'price'. Times and volumes
+    are delta encoded, prices as decimal steps or XORed float bits; every
+    column is then byte-shuffled and deflated.
+    """
+    parts = [GORILLA_HEADER.pack(GORILLA_MAGIC, len(records))]
+    for field, kind in columns.items():
+        codec, scale, encoded = _encode_column(np.asarray(records[field]), kind)
+        payload = zlib.compress(_shuffle(encoded), 9)
+        parts.append(COLUMN_HEADER.pack(codec, scale, len(payload)))
+        parts.append(payload)
+    return b''.join(parts)
+
+def decode_records(data, dtype, columns):
+    """Inverse of encode_records"""
+    magic, count = GORILLA_HEADER.unpack_from(data, 0)
+    if magic != GORILLA_MAGIC:
+        raise ValueError('Not an encoded segment')
+    
+    records = np.empty(count, dtype=dtype)
+    offset = GORILLA_HEADER.size
+    for field in columns:
+        codec, scale, length = COLUMN_HEADER.unpack_from(data, offset)
+        offset += COLUMN_HEADER.size
+        encoded = _unshuffle(zlib.decompress(data[offset:offset + length]), count)
+        offset += length
+        records[field] = _decode_column(codec, scale, encoded)
+    return records
+
+class SegmentCompressor:
+    """Background thread that compresses closed segments one at a time"""
+    
+    def __init__(self, compress):
+        """compress(raw_path) writes the compressed segment and removes the raw one"""
+        self.compress = compress
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+    
+    def submit(self, raw_path):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._worker, name='segment-compressor')
+                self.thread.daemon = True
+                self.thread.start()
+        self.queue.put(raw_path)
+    
+    def wait(self):
+        """Block until every submitted segment is compressed"""
+        self.queue.join()
+    
+    def _worker(self):
+        while True:
+            raw_path = self.queue.get()
+            try:
+                if os.path.isfile(raw_path):
+                    self.compress(raw_path)
+            except Exception as e:
+                logger.error(f"Error compressing {raw_path}: {str(e)}")
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,382 @@
+import os
+import time
+import logging
+import threading
+from contextlib import ExitStack
+import pandas as pd
+
+from storage import CSV_HEADERS, StorageBackend, _format_epoch, _to_epoch
+from csv_index import datetime_to_epoch
+from metrics import FLUSH_ROWS
+
+# SQLAlchemy is optional and only required when the sql backend is selected
+try:
+    import sqlalchemy as sa
+except ImportError:
+    sa = None
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Database for the sql backend; a SQLite file in the data directory by default
+DATABASE_URL = os.environ.get('DATA_SQL_URL') or os.environ.get('DATABASE_URL')
+
+# Connections kept open by the pool, plus how many more may be opened under load
+POOL_SIZE = int(os.environ.get('DATA_SQL_POOL_SIZE', '5'))
+POOL_OVERFLOW = int(os.environ.get('DATA_SQL_POOL_OVERFLOW', '10'))
+
+# Approximate stored bytes per candle, used for the size in list_files
+ROW_BYTES = 64
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+def _candle_table(metadata, name):
+    """Candle table keyed by (symbol, timeframe, time), time in unix seconds"""
+    return sa.Table(
+        name,
+        metadata,
+        sa.Column('symbol', sa.String(32), primary_key=True),
+        sa.Column('timeframe', sa.String(8), primary_key=True),
+        sa.Column('time', sa.BigInteger, primary_key=True, autoincrement=False),
+        sa.Column('open', sa.Float, nullable=False),
+        sa.Column('high', sa.Float, nullable=False),
+        sa.Column('low', sa.Float, nullable=False),
+        sa.Column('close', sa.Float, nullable=False),
+        sa.Column('volume', sa.BigInteger, nullable=False)
+    )
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    # Readers in other processes keep working while the recorder writes
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA busy_timeout=5000')
+    cursor.close()
+
+class SQLWriteBuffer:
+    """Rows of one stream waiting for the next multi-row insert"""
+    
+    def __init__(self, storage):
+        self.storage = storage
+        self.lock = threading.Lock()
+        self.rows = []
+        self.last_flush = time.monotonic()
+    
+    def flush(self, fsync_every=None):
+        """Insert pending rows; caller must hold the lock"""
+        if self.rows:
+            self.storage.insert_rows(self.rows)
+            FLUSH_ROWS.labels('sql').observe(len(self.rows))
+            self.rows = []
+        self.last_flush = time.monotonic()
+    
+    def close(self, fsync=False):
+        """Insert pending rows; caller must hold the lock"""
+        self.flush()
+
+class SQLStorage(StorageBackend):
+    """Candles in one SQL table through a pooled SQLAlchemy engine
+    
+    Works with PostgreSQL (psycopg2) and SQLite. Rows are buffered per
+    stream like the other backends and written with executemany inserts;
+    the background flush combines every due stream into a single insert, so
+    recording many streams costs one round trip per flush rather than per
+    candle. Candles already stored are skipped: with ON CONFLICT DO NOTHING
+    on PostgreSQL and SQLite, and on other dialects by inserting the batch
+    again row by row when it hits a duplicate. Range reads, last_candle,
+    stream_stats and fixed-length timeframe aggregation run as queries on
+    the (symbol, timeframe, time) primary key.
+    """
+    
+    name = 'sql'
+    
+    def __init__(self, data_dir, url=None, table='candles', **options):
+        if sa is None:
+            raise ImportError("SQLAlchemy is required for the sql storage backend")
+        
+        options.pop('write_behind', None)
+        super().__init__(data_dir, **options)
+        
+        url = url or DATABASE_URL or f"sqlite:///{os.path.join(data_dir, 'candles.db')}"
+        if url.startswith('sqlite'):
+            self.engine = sa.create_engine(url, pool_pre_ping=True)
+            sa.event.listen(self.engine, 'connect', _configure_sqlite)
+        else:
+            self.engine = sa.create_engine(
+                url, pool_size=POOL_SIZE, max_overflow=POOL_OVERFLOW, pool_pre_ping=True
+            )
+        
+        metadata = sa.MetaData()
+        self.table = _candle_table(metadata, table)
+        metadata.create_all(self.engine)
+        self.skips_duplicates = self.engine.dialect.name in ('postgresql', 'sqlite')
+        self.insert_statement = self._insert_statement()
+    
+    def _insert_statement(self):
+        """INSERT that skips candles already stored, where the dialect supports it"""
+        dialect = self.engine.dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            return sa.insert(self.table)
+        return insert(self.table).on_conflict_do_nothing()
+    
+    def _open_buffer(self, symbol, timeframe):
+        return SQLWriteBuffer(self)
+    
+    def insert_rows(self, rows):
+        """Insert rows (sequences in CSV_HEADERS order) in one transaction"""
+        params = [
+            {
+                'symbol': row[1],
+                'timeframe': row[2],
+                'time': datetime_to_epoch(row[0]),
+                'open': float(row[3]),
+                'high': float(row[4]),
+                'low': float(row[5]),
+                'close': float(row[6]),
+                'volume': int(row[7])
+            }
+            for row in rows
+        ]
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(self.insert_statement, params)
+        except sa.exc.IntegrityError:
+            if self.skips_duplicates:
+                raise
+            self._insert_each(params)
+    
+    def _insert_each(self, params):
+        """Insert rows one by one, each under a savepoint, skipping those already stored"""
+        with self.engine.begin() as connection:
+            for row in params:
+                try:
+                    with connection.begin_nested():
+                        connection.execute(self.insert_statement, row)
+                except sa.exc.IntegrityError:
+                    pass
+    
+    def _restore_buffers(self, keys, buffers):
+        """Put buffers popped by a failed close back, ahead of rows buffered since"""
+        with self.buffers_lock:
+            for key, buffer in zip(keys, buffers):
+                current = self.buffers.setdefault(key, buffer)
+                if current is not buffer:
+                    with current.lock:
+                        current.rows[:0] = buffer.rows
+    
+    def flush(self, symbol=None, timeframe=None, close=False, older_than=None):
+        """Write the buffered candles of all matching streams with one insert"""
+        with self.buffers_lock:
+            keys = [
+                key for key in self.buffers
+                if (symbol is None or key[0] == symbol)
+                and (timeframe is None or key[1] == timeframe)
+            ]
+            buffers = [self.buffers.pop(key) if close else self.buffers[key] for key in keys]
+        
+        now = time.monotonic()
+        with ExitStack() as stack:
+            # Buffers are always locked in the order of self.buffers
+            for buffer in buffers:
+                stack.enter_context(buffer.lock)
+            
+            # Closing writes everything, since the buffers are released
+            due = [
+                buffer for buffer in buffers
+                if buffer.rows and (close or older_than is None or now - buffer.last_flush >= older_than)
+            ]
+            if not due:
+                return
+            
+            try:
+                self.insert_rows([row for buffer in due for row in buffer.rows])
+            except Exception as e:
+                logger.error(f"Error flushing storage buffer: {str(e)}")
+                if close:
+                    # Keep the rows for the next flush instead of dropping them with the buffers
+                    self._restore_buffers(keys, buffers)
+                return
+            
+            FLUSH_ROWS.labels('sql').observe(sum(len(buffer.rows) for buffer in due))
+            for buffer in due:
+                buffer.rows = []
+                buffer.last_flush = now
+    
+    def _stream_filter(self, symbol, timeframe, start=None, end=None):
+        conditions = [self.table.c.symbol == symbol, self.table.c.timeframe == timeframe]
+        if start is not None:
+            conditions.append(self.table.c.time >= start)
+        if end is not None:
+            conditions.append(self.table.c.time <= end)
+        return sa.and_(*conditions)
+    
+    def _has_stream(self, connection, symbol, timeframe):
+        query = sa.select(self.table.c.time).where(self._stream_filter(symbol, timeframe)).limit(1)
+        return connection.execute(query).first() is not None
+    
+    def read(self, symbol, timeframe, start_date=None, end_date=None, columns=None):
+        # Make sure buffered candles are visible to the reader
+        self.flush(symbol, timeframe)
+        
+        value_columns = [column for column in (columns or CSV_HEADERS) if column in OHLCV_COLUMNS]
+        query = (
+            sa.select(self.table.c.time, *(self.table.c[column] for column in value_columns))
+            .where(self._stream_filter(symbol, timeframe, _to_epoch(start_date), _to_epoch(end_date)))
+            .order_by(self.table.c.time)
+        )
+        with self.engine.connect() as connection:
+            rows = connection.execute(query).fetchall()
+            if not rows and not self._has_stream(connection, symbol, timeframe):
+                return None
+        
+        data = pd.DataFrame.from_records(rows, columns=['time'] + value_columns)
+        df = pd.DataFrame({
+            'datetime': pd.to_datetime(data['time'], unit='s'),
+            'symbol': symbol,
+            'timeframe': timeframe,
+            **{column: data[column] for column in value_columns}
+        })
+        
+        if columns:
+            return df[['datetime'] + [column for column in columns if column != 'datetime']]
+        return df[CSV_HEADERS]
+    
+    def read_appended(self, symbol, timeframe, previous=None, columns=None):
+        """Rows newer than the last time previous saw
+        
+        Rows are kept in time order, so rows inserted before that time show
+        up as a row count that no longer adds up and the stream is read again.
+        """
+        seen = previous['rows'] if previous else 0
+        rows, first, last = self._stream_totals(symbol, timeframe)
+        if rows < seen:
+            return None
+        if not rows:
+            return None, {'rows': 0, 'last': None}
+        
+        start = _format_epoch(previous['last'] + 1) if seen else None
+        df = self.read(symbol, timeframe, start, _format_epoch(last), columns=columns)
+        if df is None or seen + len(df) != rows:
+            return None
+        return df, {'rows': rows, 'last': last}
+    
+    def aggregate(self, symbol, timeframe, seconds):
+        """OHLCV bars of a fixed length, grouped in the database"""
+        self.flush(symbol, timeframe)
+        
+        candles = self.table
+        bucket = (candles.c.time // seconds) * seconds
+        buckets = (
+            sa.select(
+                bucket.label('bucket'),
+                sa.func.min(candles.c.time).label('first'),
+                sa.func.max(candles.c.time).label('last'),
+                sa.func.max(candles.c.high).label('high'),
+                sa.func.min(candles.c.low).label('low'),
+                sa.func.sum(candles.c.volume).label('volume')
+            )
+            .where(self._stream_filter(symbol, timeframe))
+            .group_by(bucket)
+            .subquery()
+        )
+        
+        # Open and close come from the first and last candle of each bucket
+        opening = candles.alias('opening')
+        closing = candles.alias('closing')
+        query = (
+            sa.select(
+                buckets.c.bucket, opening.c.open, buckets.c.high, buckets.c.low,
+                closing.c.close, buckets.c.volume
+            )
+            .join(opening, sa.and_(
+                opening.c.symbol == symbol, opening.c.timeframe == timeframe,
+                opening.c.time == buckets.c.first
+            ))
+            .join(closing, sa.and_(
+                closing.c.symbol == symbol, closing.c.timeframe == timeframe,
+                closing.c.time == buckets.c.last
+            ))
+            .order_by(buckets.c.bucket)
+        )
+        with self.engine.connect() as connection:
+            rows = connection.execute(query).fetchall()
+        
+        bars = pd.DataFrame.from_records(rows, columns=['datetime'] + OHLCV_COLUMNS)
+        bars.index = pd.DatetimeIndex(pd.to_datetime(bars.pop('datetime'), unit='s'), name='datetime')
+        bars['volume'] = bars['volume'].astype('int64')
+        return bars
+    
+    def last_candle(self, symbol, timeframe):
+        self.flush(symbol, timeframe)
+        query = (
+            sa.select(self.table)
+            .where(self._stream_filter(symbol, timeframe))
+            .order_by(self.table.c.time.desc())
+            .limit(1)
+        )
+        with self.engine.connect() as connection:
+            row = connection.execute(query).mappings().first()
+        if row is None:
+            return None
+        
+        return {
+            'datetime': _format_epoch(row['time']),
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'open': row['open'],
+            'high': row['high'],
+            'low': row['low'],
+            'close': row['close'],
+            'volume': row['volume']
+        }
+    
+    def _describe(self, symbol, timeframe, rows, last):
+        """list_files entry for a stream; modified is its newest candle"""
+        return {
+            'filename': f"{symbol}_{timeframe}",
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'size': rows * ROW_BYTES,
+            'modified': _format_epoch(last),
+            'modified_time': last
+        }
+    
+    def list_files(self):
+        self.flush()
+        candles = self.table
+        query = (
+            sa.select(candles.c.symbol, candles.c.timeframe, sa.func.count(), sa.func.max(candles.c.time))
+            .group_by(candles.c.symbol, candles.c.timeframe)
+        )
+        with self.engine.connect() as connection:
+            rows = connection.execute(query).fetchall()
+        return [self._describe(*row) for row in rows]
+    
+    def file_info(self, symbol, timeframe):
+        stats = self._stream_totals(symbol, timeframe)
+        if not stats[0]:
+            return None
+        return self._describe(symbol, timeframe, stats[0], stats[2])
+    
+    def _stream_totals(self, symbol, timeframe):
+        """(rows, first time, last time) of a stream"""
+        self.flush(symbol, timeframe)
+        query = (
+            sa.select(sa.func.count(), sa.func.min(self.table.c.time), sa.func.max(self.table.c.time))
+            .where(self._stream_filter(symbol, timeframe))
+        )
+        with self.engine.connect() as connection:
+            return connection.execute(query).one()
+    
+    def stream_stats(self, symbol, timeframe, previous=None):
+        rows, first, last = self._stream_totals(symbol, timeframe)
+        return {
+            'rows': rows,
+            'first': _format_epoch(first) if rows else None,
+            'last': _format_epoch(last) if rows else None
+        }
@@ -142,6 +142,50 @@ class PriceChart {
         this.chart.update();
     }
 
+    // Load a downsampled history range from /api/chart, following every page
+    async loadHistory(symbol, timeframe, start, end, method = 'lttb') {
+        const width = document.getElementById(this.canvasId).clientWidth || 1000;
+        const columns = {time: [], open: [], high: [], low: [], close: [], volume: []};
+        let cursor = null;
+
+        do {
+            const params = new URLSearchParams({symbol, timeframe, width, method});
+            if (start) params.set('start', start);
+            if (end) params.set('end', end);
+            if (cursor !== null) params.set('cursor', cursor);
+
+            const response = await fetch('/api/chart?' + params.toString());
+            const data = await response.json();
+            if (!data.success) throw new Error(data.message);
+
+            Object.keys(columns).forEach(key => columns[key].push(...data.columns[key]));
+            cursor = data.next_cursor;
+        } while (cursor !== null);
+
+        this.updateSeries(symbol, timeframe, columns);
+    }
+
+    // Draw columnar candles (unix times, oldest first)
+    updateSeries(symbol, timeframe, columns) {
+        this.chartData.labels = columns.time.map(
+            time => new Date(time * 1000).toISOString().slice(0, 19).replace('T', ' ')
+        );
+        this.chartData.datasets[0].data = columns.time.map((time, i) => ({
+            y: columns.close[i],
+            o: columns.open[i],
+            h: columns.high[i],
+            l: columns.low[i],
+            c: columns.close[i],
+            v: columns.volume[i]
+        }));
+
+        // Thousands of points read better without markers
+        this.chartData.datasets[0].pointRadius = columns.time.length > 200 ? 0 : 3;
+
+        document.getElementById('chartSymbol').textContent = `${symbol} (${timeframe})`;
+        this.chart.update();
+    }
+
     // Add candle markers (green/red bars)
     addCandleMarkers() {
         // Implementation if needed for more detailed candle visualization
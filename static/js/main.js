@@ -7,6 +7,13 @@
 let priceChart;
 let updateInterval;
 let toastInstance;
+let candleStream = null;
+let candleStreamSymbols = null;
+let candleStreamRefused = false;
+
+// Latest candles shown in the table and chart (oldest first)
+const latestCandles = [];
+const maxLatestCandles = 10;
 
 // Application state
 const appState = {
@@ -84,9 +91,17 @@ function checkStatus() {
             appState.currentSymbol = data.current_symbol;
             appState.lastUpdate = data.last_update;
             
-            // If recording, fetch latest data
+            // While recording, new candles are pushed over the stream;
+            // fall back to polling where EventSource is unavailable
             if (appState.recording) {
-                getLatestData();
+                if (window.EventSource && !candleStreamRefused) {
+                    openCandleStream((data.streams || []).map(stream => stream.symbol));
+                } else {
+                    getLatestData();
+                }
+            } else {
+                closeCandleStream();
+                candleStreamRefused = false;
             }
         })
         .catch(error => {
@@ -113,9 +128,10 @@ function updateStatusIndicators(status) {
     // Update UI buttons based on status
     document.getElementById('connectBtn').disabled = status.connected;
     document.getElementById('disconnectBtn').disabled = !status.connected;
-    document.getElementById('symbolSelect').disabled = !status.connected || status.recording;
-    document.getElementById('timeframeSelect').disabled = !status.connected || status.recording;
-    document.getElementById('startRecordingBtn').disabled = !status.connected || status.recording || !document.getElementById('symbolSelect').value;
+    // Additional symbol/timeframe streams can be started while others are recording
+    document.getElementById('symbolSelect').disabled = !status.connected;
+    document.getElementById('timeframeSelect').disabled = !status.connected;
+    document.getElementById('startRecordingBtn').disabled = !status.connected || !document.getElementById('symbolSelect').value;
     document.getElementById('stopRecordingBtn').disabled = !status.recording;
 }
 
@@ -281,8 +297,9 @@ function startRecording() {
             appState.currentSymbol = symbol;
             appState.currentTimeframe = timeframe;
             
-            // Get initial data
+            // Get initial data, then receive new candles as they are recorded
             getLatestData();
+            openCandleStream();
         } else {
             addStatusLog('Failed to start recording: ' + data.message, 'error');
             showToast('Error', 'Failed to start recording: ' + data.message, 'error');
@@ -331,6 +348,7 @@ function getLatestData() {
         .then(response => response.json())
         .then(data => {
             if (data.success) {
+                latestCandles.splice(0, latestCandles.length, ...data.data);
                 updateDataTable(data.data);
                 
                 // Update chart
@@ -345,6 +363,63 @@ function getLatestData() {
         });
 }
 
+// Open the Server-Sent Events stream of candles for the recorded symbols,
+// reopening it when the set of symbols changes
+function openCandleStream(symbols) {
+    if (!window.EventSource) {
+        return;
+    }
+    
+    const key = [...new Set(symbols)].sort().join(',');
+    if (candleStream && key === candleStreamSymbols) {
+        return;
+    }
+    closeCandleStream();
+    candleStreamSymbols = key;
+    
+    // Seed the table before the first pushed candle arrives
+    if (latestCandles.length === 0) {
+        getLatestData();
+    }
+    
+    const query = key ? '?symbols=' + encodeURIComponent(key) : '';
+    candleStream = new EventSource('/api/stream' + query);
+    
+    candleStream.addEventListener('candle', event => {
+        const candle = JSON.parse(event.data);
+        
+        latestCandles.push(candle);
+        while (latestCandles.length > maxLatestCandles) {
+            latestCandles.shift();
+        }
+        
+        updateDataTable(latestCandles);
+        priceChart.updateChart(latestCandles);
+    });
+    
+    // EventSource reconnects by itself; just note the interruption. A
+    // refused stream (the server is at its stream limit) is closed for good,
+    // and the table is polled instead.
+    candleStream.onerror = () => {
+        if (candleStream.readyState === EventSource.CLOSED) {
+            console.warn('Candle stream refused, polling instead');
+            closeCandleStream();
+            candleStreamRefused = true;
+            return;
+        }
+        console.warn('Candle stream interrupted, reconnecting...');
+    };
+}
+
+// Close the candle stream
+function closeCandleStream() {
+    if (candleStream) {
+        candleStream.close();
+        candleStream = null;
+        candleStreamSymbols = null;
+    }
+}
+
 // Get saved CSV files
 function getFetchSavedFiles() {
     fetch('/api/saved_files')
@@ -523,6 +598,8 @@ window.addEventListener('beforeunload', function() {
         clearInterval(updateInterval);
     }
     
+    closeCandleStream();
+    
     // If recording, try to stop
     if (appState.recording) {
         fetch('/api/stop_recording', {
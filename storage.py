@@ -0,0 +1,950 @@
+import io
+import os
+import csv
+import time
+import calendar
+import logging
+import threading
+from datetime import datetime
+import pandas as pd
+
+from csv_index import CSVTimeIndex, datetime_to_epoch
+from metrics import FLUSH_ROWS
+from segments import (
+    SEGMENT_DIR, SegmentCompressor, compress_bytes, list_segments, read_compressed, segment_name
+)
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+# Define the headers for CSV files
+CSV_HEADERS = [
+    'datetime', 'symbol', 'timeframe', 'open', 'high', 'low', 'close', 'volume'
+]
+
+def describe_file(path, filename):
+    """list_files entry for a {symbol}_{timeframe} file or directory, or None"""
+    parts = filename.split('.')[0].split('_')
+    if len(parts) < 2:
+        return None
+    
+    stat = os.stat(path)
+    return {
+        'filename': filename,
+        'symbol': parts[0],
+        'timeframe': parts[1],
+        'size': stat.st_size,
+        'modified': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+        'modified_time': stat.st_mtime
+    }
+
+def filter_date_range(df, start_date=None, end_date=None):
+    """Filter a candle DataFrame to the given datetime range (inclusive)"""
+    if start_date is None and end_date is None:
+        return df
+    
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    if start_date is not None:
+        df = df[df['datetime'] >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        df = df[df['datetime'] <= pd.Timestamp(end_date)]
+    return df
+
+def _to_epoch(value):
+    """Convert a datetime-like value to whole unix seconds (naive values as UTC)"""
+    if value is None:
+        return None
+    return calendar.timegm(pd.Timestamp(value).timetuple())
+
+def _format_epoch(value):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(value))
+
+def repair_csv_tail(filepath):
+    """Cut a torn final row (one without its newline) left by an interrupted write"""
+    if not os.path.isfile(filepath):
+        return
+    
+    with open(filepath, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+        
+        # Rows are short, so the last newline is within the final block
+        start = max(0, size - 65536)
+        f.seek(start)
+        cut = f.read().rfind(b'\n')
+        keep = start + cut + 1 if cut >= 0 else 0
+        f.truncate(keep)
+    
+    logger.warning(f"Truncated partial row at the end of {filepath}")
+    
+    # Without its header row the file is started over
+    if keep == 0:
+        os.remove(filepath)
+
+class StorageBackend:
+    """Base class for candle storage backends
+    
+    Backends receive candles through append() and may buffer them per
+    (symbol, timeframe) stream until flush() is called. Subclasses implement
+    _open_buffer() and the read/list methods.
+    
+    Backends with a segment_format can rotate a stream's file: with
+    rotate='day' a new file is started for each day, and with rotate_bytes
+    once the file reaches that size. The closed file is moved to
+    data/segments/{symbol}_{timeframe}/ and compressed in the background
+    (compression 'gzip' or 'zstd' for text formats), and reads combine the
+    segments with the active file.
+    """
+    
+    name = None
+    
+    # Extension of closed, not yet compressed segments; None disables rotation
+    segment_format = None
+    
+    def __init__(self, data_dir, batch_size=100, flush_interval=5.0, fsync_every=None,
+                 rotate=None, rotate_bytes=None, compression='gzip'):
+        self.data_dir = data_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_every = fsync_every
+        
+        # Open stream buffers keyed by (symbol, timeframe)
+        self.buffers = {}
+        self.buffers_lock = threading.Lock()
+        
+        # Create data directory if it doesn't exist
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+        
+        if rotate not in (None, 'day'):
+            raise ValueError(f"Unknown rotation: {rotate}")
+        self.rotate = rotate
+        self.rotate_bytes = rotate_bytes
+        self.compression = compression
+        self.rotating = self.segment_format is not None and bool(rotate or rotate_bytes)
+        
+        # Day of the first candle in each stream's active file
+        self.active_days = {}
+        self.rotation_lock = threading.Lock()
+        
+        # Bumped whenever a stream's file is moved into a segment
+        self.generations = {}
+        
+        self.compressor = SegmentCompressor(self._compress_segment)
+        if self.segment_format is not None:
+            self._resume_compression()
+    
+    def _open_buffer(self, symbol, timeframe):
+        """Create the write buffer for a symbol/timeframe stream"""
+        raise NotImplementedError
+    
+    def _get_buffer(self, symbol, timeframe):
+        """Get or open the write buffer for a symbol/timeframe stream"""
+        key = (symbol, timeframe)
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            with self.buffers_lock:
+                buffer = self.buffers.get(key)
+                if buffer is None:
+                    buffer = self._open_buffer(symbol, timeframe)
+                    self.buffers[key] = buffer
+        return buffer
+    
+    def append(self, symbol, timeframe, candle_data):
+        """Buffer a candle and write the batch once it is full or stale"""
+        if self.rotating:
+            self._check_rotation(symbol, timeframe, candle_data['datetime'])
+        
+        buffer = self._get_buffer(symbol, timeframe)
+        with buffer.lock:
+            buffer.rows.append([candle_data.get(field) for field in CSV_HEADERS])
+            
+            # Flush when the batch is full or has been waiting too long
+            if (len(buffer.rows) >= self.batch_size
+                    or time.monotonic() - buffer.last_flush >= self.flush_interval):
+                buffer.flush(self.fsync_every)
+    
+    def append_many(self, symbol, timeframe, rows):
+        """Write a batch of rows (sequences in CSV_HEADERS order) in one go"""
+        for rows in self._split_for_rotation(symbol, timeframe, rows):
+            buffer = self._get_buffer(symbol, timeframe)
+            with buffer.lock:
+                buffer.rows.extend(rows)
+                buffer.flush(self.fsync_every)
+    
+    def prepend_many(self, symbol, timeframe, rows):
+        """Store a time-ordered batch older than every stored candle of the stream
+        
+        Backends with a segment_format write the batch as a closed segment,
+        which sorts before the existing ones by its first time. Other
+        backends order candles by time when reading, so they just append.
+        """
+        if self.segment_format is None:
+            self.append_many(symbol, timeframe, rows)
+            self.flush(symbol, timeframe)
+            return
+        if not rows:
+            return
+        
+        key = (symbol, timeframe)
+        with self.rotation_lock:
+            stream_dir = self.segment_dir(symbol, timeframe)
+            os.makedirs(stream_dir, exist_ok=True)
+            name = segment_name(datetime_to_epoch(rows[0][0]), datetime_to_epoch(rows[-1][0]), len(rows))
+            raw_path = os.path.join(stream_dir, f"{name}.{self.segment_format}")
+            
+            # Write to a temporary name first so readers never see a partial segment
+            tmp_path = raw_path + '.tmp'
+            self._write_segment(tmp_path, rows)
+            os.replace(tmp_path, raw_path)
+            self.generations[key] = self.generations.get(key, 0) + 1
+        
+        self.compressor.submit(raw_path)
+    
+    def _write_segment(self, path, rows):
+        """Write rows to a new raw segment file"""
+        raise NotImplementedError
+    
+    def flush(self, symbol=None, timeframe=None, close=False, older_than=None):
+        """Write buffered candles
+        
+        Flushes every stream by default, or only those matching symbol and/or
+        timeframe. older_than skips buffers flushed less than that many
+        seconds ago, and close=True releases the buffers as well.
+        """
+        with self.buffers_lock:
+            keys = [
+                key for key in self.buffers
+                if (symbol is None or key[0] == symbol)
+                and (timeframe is None or key[1] == timeframe)
+            ]
+            buffers = [self.buffers.pop(key) if close else self.buffers[key] for key in keys]
+        
+        now = time.monotonic()
+        for buffer in buffers:
+            try:
+                with buffer.lock:
+                    if close:
+                        buffer.close(fsync=self.fsync_every is not None)
+                    elif older_than is None or (buffer.rows and now - buffer.last_flush >= older_than):
+                        buffer.flush(self.fsync_every)
+            except Exception as e:
+                logger.error(f"Error flushing storage buffer: {str(e)}")
+    
+    def read(self, symbol, timeframe, start_date=None, end_date=None, columns=None):
+        """Read stored candles as a DataFrame, or None if the stream has no data"""
+        raise NotImplementedError
+    
+    def get_filepath(self, symbol, timeframe):
+        """Path of a stream's active file"""
+        raise NotImplementedError
+    
+    def segment_dir(self, symbol, timeframe):
+        return os.path.join(self.data_dir, SEGMENT_DIR, f"{symbol}_{timeframe}")
+    
+    def get_segments(self, symbol, timeframe, start=None, end=None):
+        """Closed segments of a stream overlapping [start, end] (unix times)"""
+        if self.segment_format is None:
+            return []
+        segments = list_segments(self.segment_dir(symbol, timeframe), self.segment_format)
+        return [segment for segment in segments if segment.overlaps(start, end)]
+    
+    def _first_time(self, symbol, timeframe):
+        """Datetime string of the first candle in a stream's active file, or None"""
+        raise NotImplementedError
+    
+    def aggregate(self, symbol, timeframe, seconds):
+        """OHLCV bars of a fixed length computed by the backend
+        
+        Returns a DataFrame shaped like resampler.resample_candles, or None if
+        the backend leaves resampling to the caller.
+        """
+        return None
+    
+    def read_appended(self, symbol, timeframe, previous=None, columns=None):
+        """Candles stored after the position previous, in storage order
+        
+        Returns (df, position), where df is None if the stream has no data and
+        position is passed as previous to the next call. Returns None if the
+        stream no longer holds the rows previous covered, so the caller has
+        to start over. This fallback reads the whole stream and skips the
+        rows seen before; backends that can seek override it.
+        """
+        seen = previous['rows'] if previous else 0
+        df = self.read(symbol, timeframe, columns=columns)
+        if df is None:
+            return None if seen else (None, {'rows': 0})
+        if len(df) < seen:
+            return None
+        
+        # Candles stored before the first one seen shift every position
+        first = str(df['datetime'].iloc[0]) if len(df) else None
+        if seen and previous.get('first', first) != first:
+            return None
+        return df.iloc[seen:].reset_index(drop=True), {'rows': len(df), 'first': first}
+    
+    def repair_tail(self, symbol, timeframe):
+        """Drop a partial record at the end of a stream's active file
+        
+        Only the writing process may call this, before it appends to the
+        stream.
+        """
+    
+    def _active_stats(self, symbol, timeframe, previous=None):
+        """stream_stats of the active file alone"""
+        raise NotImplementedError
+    
+    def _compress_segment(self, raw_path):
+        """Write the compressed form of a closed segment and remove the raw file"""
+        raise NotImplementedError
+    
+    def _rotation_due(self, symbol, timeframe, day):
+        """Check whether a candle of the given day belongs in a new file"""
+        key = (symbol, timeframe)
+        active_day = self.active_days.get(key)
+        if active_day is None:
+            first = self._first_time(symbol, timeframe)
+            if first is None:
+                return False
+            active_day = self.active_days[key] = first[:10]
+        
+        if self.rotate == 'day' and day != active_day:
+            return True
+        if self.rotate_bytes:
+            filepath = self.get_filepath(symbol, timeframe)
+            return os.path.isfile(filepath) and os.path.getsize(filepath) >= self.rotate_bytes
+        return False
+    
+    def _check_rotation(self, symbol, timeframe, candle_time):
+        """Close the active file into a segment if the candle starts a new one"""
+        if self._rotation_due(symbol, timeframe, candle_time[:10]):
+            self.seal(symbol, timeframe)
+    
+    def _split_for_rotation(self, symbol, timeframe, rows):
+        """Split a time-ordered batch where it crosses into a new file, sealing in between
+        
+        Yields the parts to write; each is written before the next seal.
+        """
+        if not self.rotating or not rows:
+            yield rows
+            return
+        
+        start = 0
+        while start < len(rows):
+            if self._rotation_due(symbol, timeframe, rows[start][0][:10]):
+                self.seal(symbol, timeframe)
+            
+            # With daily rotation a part ends where the day changes
+            end = len(rows)
+            if self.rotate == 'day':
+                day = rows[start][0][:10]
+                end = next((i for i in range(start, len(rows)) if rows[i][0][:10] != day), len(rows))
+            yield rows[start:end]
+            start = end
+    
+    def seal(self, symbol, timeframe):
+        """Close a stream's active file and move it into a segment to be compressed"""
+        key = (symbol, timeframe)
+        with self.rotation_lock:
+            self.flush(symbol, timeframe, close=True)
+            self.active_days.pop(key, None)
+            
+            filepath = self.get_filepath(symbol, timeframe)
+            stats = self._active_stats(symbol, timeframe) if os.path.isfile(filepath) else None
+            if not stats or not stats['rows']:
+                return None
+            
+            stream_dir = self.segment_dir(symbol, timeframe)
+            os.makedirs(stream_dir, exist_ok=True)
+            name = segment_name(datetime_to_epoch(stats['first']), datetime_to_epoch(stats['last']), stats['rows'])
+            raw_path = os.path.join(stream_dir, f"{name}.{self.segment_format}")
+            os.replace(filepath, raw_path)
+            self._after_seal(symbol, timeframe)
+            self.generations[key] = self.generations.get(key, 0) + 1
+        
+        logger.info(f"Rotated {symbol} ({timeframe}) into segment {name}")
+        self.compressor.submit(raw_path)
+        return raw_path
+    
+    def _after_seal(self, symbol, timeframe):
+        """Drop per-file state of a stream whose file was just moved away"""
+    
+    def _resume_compression(self):
+        """Queue segments left uncompressed by a previous run"""
+        root = os.path.join(self.data_dir, SEGMENT_DIR)
+        if not os.path.isdir(root):
+            return
+        for stream in os.listdir(root):
+            for segment in list_segments(os.path.join(root, stream), self.segment_format):
+                if not segment.compressed:
+                    self.compressor.submit(segment.path)
+    
+    def _read_consistent(self, symbol, timeframe, read):
+        """Run read() until no segment was sealed or compressed while it ran
+        
+        Rotation moves files between the active path and the segment
+        directory, so a read that raced with it is simply repeated.
+        """
+        key = (symbol, timeframe)
+        for attempt in range(3):
+            generation = self.generations.get(key, 0)
+            try:
+                result = read()
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+                continue
+            if self.generations.get(key, 0) == generation:
+                break
+        return result
+    
+    def _stream_first(self, symbol, timeframe, segments):
+        """Unix time of a stream's first candle given its segments, or None
+        
+        read_appended keeps it in the position, since candles prepended
+        before it shift every row the position counted.
+        """
+        if segments:
+            return segments[0].first
+        first = self._first_time(symbol, timeframe)
+        return datetime_to_epoch(first) if first else None
+    
+    def _segment_totals(self, symbol, timeframe, stats):
+        """Add a stream's segments to the stats of its active file"""
+        segments = self.get_segments(symbol, timeframe)
+        if not segments:
+            return stats
+        
+        stats = dict(stats)
+        stats['rows'] += sum(segment.rows for segment in segments)
+        stats['first'] = _format_epoch(segments[0].first)
+        stats['last'] = stats['last'] or _format_epoch(segments[-1].last)
+        return stats
+    
+    def list_files(self):
+        """Describe the stored symbol/timeframe streams"""
+        raise NotImplementedError
+    
+    def file_info(self, symbol, timeframe):
+        """Describe one stream like a list_files entry, or None if it has no file"""
+        raise NotImplementedError
+    
+    def stream_stats(self, symbol, timeframe, previous=None):
+        """Row count and first/last candle time of a stream
+        
+        previous is the result of an earlier call for the same stream; backends
+        may use it to only scan data appended since then.
+        """
+        df = self.read(symbol, timeframe, columns=['datetime'])
+        if df is None or df.empty:
+            return {'rows': 0, 'first': None, 'last': None}
+        
+        times = pd.to_datetime(df['datetime'])
+        return {
+            'rows': len(df),
+            'first': times.min().strftime('%Y-%m-%d %H:%M:%S'),
+            'last': times.max().strftime('%Y-%m-%d %H:%M:%S')
+        }
+    
+    def last_candle(self, symbol, timeframe):
+        """The most recently stored candle of a stream as a dict, or None"""
+        df = self.read(symbol, timeframe)
+        if df is None or df.empty:
+            return None
+        
+        candle = df.iloc[-1].to_dict()
+        candle['datetime'] = pd.Timestamp(candle['datetime']).strftime('%Y-%m-%d %H:%M:%S')
+        return candle
+    
+    def _last_segment_candle(self, symbol, timeframe):
+        """Last candle of the newest segment, for a stream without an active file"""
+        segments = self.get_segments(symbol, timeframe)
+        if not segments:
+            return None
+        
+        df = self.read(symbol, timeframe, _format_epoch(segments[-1].last))
+        if df is None or df.empty:
+            return None
+        
+        candle = df.iloc[-1].to_dict()
+        candle['datetime'] = pd.Timestamp(candle['datetime']).strftime('%Y-%m-%d %H:%M:%S')
+        for field in ('open', 'high', 'low', 'close'):
+            candle[field] = float(candle[field])
+        candle['volume'] = int(candle['volume'])
+        return candle
+
+class CSVWriteBuffer:
+    """Open CSV file handle plus the rows still waiting to be written to it"""
+    
+    def __init__(self, filepath, index=None):
+        self.filepath = filepath
+        self.index = index
+        self.lock = threading.Lock()
+        self.rows = []
+        self.rows_since_fsync = 0
+        self.last_flush = time.monotonic()
+        
+        # Appending after a torn row would merge it with the next one
+        repair_csv_tail(filepath)
+        
+        # Keep the file open for the lifetime of the buffer
+        self.file = open(filepath, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        
+        # Write headers if this is a new file
+        if self.file.tell() == 0:
+            self.writer.writerow(CSV_HEADERS)
+        
+        # Byte offset where the next row will start
+        self.offset = self.file.tell()
+    
+    def flush(self, fsync_every=None):
+        """Write pending rows to the file; caller must hold the lock"""
+        written = []
+        start_offset = self.offset
+        if self.rows:
+            for row in self.rows:
+                length = self.writer.writerow(row)
+                written.append((row[0], length))
+                self.offset += length
+            self.rows_since_fsync += len(self.rows)
+            FLUSH_ROWS.labels('csv').observe(len(self.rows))
+            self.rows = []
+        
+        self.file.flush()
+        
+        # Durability: fsync once at least N rows were written since the last one
+        if fsync_every and self.rows_since_fsync >= fsync_every:
+            os.fsync(self.file.fileno())
+            self.rows_since_fsync = 0
+        
+        if written and self.index is not None:
+            with self.index.lock:
+                self.index.record_rows(start_offset, written)
+        
+        self.last_flush = time.monotonic()
+    
+    def close(self, fsync=False):
+        """Flush pending rows and close the file; caller must hold the lock"""
+        self.flush()
+        if fsync and self.rows_since_fsync:
+            os.fsync(self.file.fileno())
+        self.file.close()
+
+class CSVStorage(StorageBackend):
+    """Row-oriented storage in data/{symbol}_{timeframe}.csv
+    
+    With write_behind disabled every candle is written straight through,
+    otherwise rows are batched in an open file per stream. Each file has a
+    sparse time index ({symbol}_{timeframe}.csv.idx) so range reads only
+    parse the rows inside their window. Rotated segments are gzip or zstd
+    compressed copies of a closed file.
+    """
+    
+    name = 'csv'
+    segment_format = 'csv'
+    
+    def __init__(self, data_dir, write_behind=False, read_only=False, **options):
+        super().__init__(data_dir, **options)
+        self.write_behind = write_behind
+        
+        # Readers of files another process writes keep time indexes in memory
+        self.read_only = read_only
+        
+        # Time indexes keyed by (symbol, timeframe), loaded on first use
+        self.indexes = {}
+        self.indexes_lock = threading.Lock()
+        
+        # Streams whose file tail was checked by this process
+        self.repaired = set()
+        
+        # Rows written without write-behind since each stream's last fsync
+        self.rows_since_fsync = {}
+    
+    def get_filepath(self, symbol, timeframe):
+        """Build the CSV file path for a symbol and timeframe"""
+        filename = f"{symbol}_{timeframe}.csv"
+        return os.path.join(self.data_dir, filename)
+    
+    def get_index(self, symbol, timeframe):
+        """Get or load the time index for a symbol/timeframe file"""
+        key = (symbol, timeframe)
+        index = self.indexes.get(key)
+        if index is None:
+            with self.indexes_lock:
+                index = self.indexes.get(key)
+                if index is None:
+                    index = CSVTimeIndex(self.get_filepath(symbol, timeframe), persist=not self.read_only)
+                    self.indexes[key] = index
+        return index
+    
+    def _open_buffer(self, symbol, timeframe):
+        return CSVWriteBuffer(self.get_filepath(symbol, timeframe), self.get_index(symbol, timeframe))
+    
+    def repair_tail(self, symbol, timeframe):
+        repair_csv_tail(self.get_filepath(symbol, timeframe))
+        self.repaired.add((symbol, timeframe))
+    
+    def append(self, symbol, timeframe, candle_data):
+        """Save a candle to the appropriate CSV file"""
+        if self.write_behind:
+            super().append(symbol, timeframe, candle_data)
+            return
+        
+        if self.rotating:
+            self._check_rotation(symbol, timeframe, candle_data['datetime'])
+        
+        filepath = self.get_filepath(symbol, timeframe)
+        if (symbol, timeframe) not in self.repaired:
+            self.repair_tail(symbol, timeframe)
+        index = self.get_index(symbol, timeframe)
+        
+        # Check if file exists to determine if we need to write headers
+        file_exists = os.path.isfile(filepath)
+        
+        # Write to CSV file
+        with open(filepath, 'a', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=CSV_HEADERS)
+            
+            # Write headers if this is a new file
+            if not file_exists:
+                writer.writeheader()
+            
+            # Write the candle data
+            start_offset = csvfile.tell()
+            length = writer.writerow(candle_data)
+            
+            # Durability: fsync once at least N rows were written since the last one
+            if self.fsync_every:
+                key = (symbol, timeframe)
+                self.rows_since_fsync[key] = self.rows_since_fsync.get(key, 0) + 1
+                if self.rows_since_fsync[key] >= self.fsync_every:
+                    csvfile.flush()
+                    os.fsync(csvfile.fileno())
+                    self.rows_since_fsync[key] = 0
+        
+        with index.lock:
+            index.record_rows(start_offset, [(candle_data['datetime'], length)])
+    
+    def append_many(self, symbol, timeframe, rows):
+        """Write a batch of rows, indexing them like buffered writes"""
+        if self.write_behind:
+            super().append_many(symbol, timeframe, rows)
+            return
+        
+        for rows in self._split_for_rotation(symbol, timeframe, rows):
+            # A short-lived buffer writes the header, the rows and the index entries
+            buffer = CSVWriteBuffer(self.get_filepath(symbol, timeframe), self.get_index(symbol, timeframe))
+            with buffer.lock:
+                buffer.rows = list(rows)
+                buffer.close(fsync=self.fsync_every is not None)
+    
+    def read(self, symbol, timeframe, start_date=None, end_date=None, columns=None):
+        # Make sure buffered candles are visible to the reader
+        if self.write_behind:
+            self.flush(symbol, timeframe)
+        
+        # The datetime column is always needed to filter by range
+        usecols = None
+        if columns:
+            usecols = ['datetime'] + [column for column in columns if column != 'datetime']
+        
+        start, end = _to_epoch(start_date), _to_epoch(end_date)
+        
+        def read_files():
+            frames = [
+                self._read_segment(segment, usecols)
+                for segment in self.get_segments(symbol, timeframe, start, end)
+            ]
+            active = self._read_active(symbol, timeframe, start, end, usecols)
+            if active is not None:
+                frames.append(active)
+            return frames
+        
+        frames = self._read_consistent(symbol, timeframe, read_files)
+        if not frames:
+            return None
+        
+        df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+        return filter_date_range(df, start_date, end_date)
+    
+    def _read_active(self, symbol, timeframe, start, end, usecols):
+        """Read the active file, or None if there is none"""
+        filepath = self.get_filepath(symbol, timeframe)
+        if not os.path.isfile(filepath):
+            return None
+        
+        # Seek straight to the requested window when the index allows it
+        window = None
+        if start is not None or end is not None:
+            index = self.get_index(symbol, timeframe)
+            with index.lock:
+                if self.read_only:
+                    index.refresh()
+                window = index.locate(start, end)
+        
+        if window is not None:
+            return self._read_window(filepath, window, usecols)
+        
+        # Load the CSV file using pandas
+        return pd.read_csv(filepath, usecols=usecols)
+    
+    def _read_segment(self, segment, usecols=None):
+        if segment.compressed:
+            return pd.read_csv(io.BytesIO(read_compressed(segment.path)), usecols=usecols)
+        return pd.read_csv(segment.path, usecols=usecols)
+    
+    def read_appended(self, symbol, timeframe, previous=None, columns=None):
+        """Rows appended since previous, reading only what is new
+        
+        Segments are skipped by the row counts in their names. While no
+        segment was sealed the active file is read from the byte offset where
+        the previous call stopped; after a rotation it is read again and the
+        rows already seen are dropped. A torn last row is left for next time.
+        """
+        if self.write_behind:
+            self.flush(symbol, timeframe)
+        
+        usecols = None
+        if columns:
+            usecols = ['datetime'] + [column for column in columns if column != 'datetime']
+        filepath = self.get_filepath(symbol, timeframe)
+        seen = previous['rows'] if previous else 0
+        
+        def read_files():
+            segments = self.get_segments(symbol, timeframe)
+            segment_rows = sum(segment.rows for segment in segments)
+            first = self._stream_first(symbol, timeframe, segments)
+            if seen and previous.get('first', first) != first:
+                return None
+            frames = []
+            offset = 0
+            for segment in segments:
+                if offset + segment.rows > seen:
+                    frames.append(self._read_segment(segment, usecols).iloc[max(seen - offset, 0):])
+                offset += segment.rows
+            
+            if not os.path.isfile(filepath):
+                if seen > segment_rows:
+                    return None
+                position = {'rows': segment_rows, 'segment_rows': segment_rows, 'scanned_size': 0,
+                            'inode': None, 'first': first}
+                return frames, position, segment_rows > 0
+            
+            stat = os.stat(filepath)
+            start, skip = None, max(seen - segment_rows, 0)
+            if (previous and previous.get('inode') == stat.st_ino
+                    and previous.get('segment_rows') == segment_rows
+                    and previous.get('scanned_size', stat.st_size + 1) <= stat.st_size):
+                # Only appended to since the previous call
+                start, skip = previous['scanned_size'], 0
+            
+            active, end_offset = self._read_rows_from(filepath, start, usecols)
+            if skip > len(active):
+                return None
+            frames.append(active.iloc[skip:])
+            
+            rows = seen + sum(len(frame) for frame in frames)
+            position = {'rows': rows, 'segment_rows': segment_rows, 'scanned_size': end_offset,
+                        'inode': stat.st_ino, 'first': first}
+            return frames, position, True
+        
+        result = self._read_consistent(symbol, timeframe, read_files)
+        if result is None:
+            return None
+        
+        frames, position, exists = result
+        if not exists:
+            return None, position
+        if not frames:
+            return pd.DataFrame(columns=usecols or CSV_HEADERS), position
+        return pd.concat(frames, ignore_index=True), position
+    
+    def _read_rows_from(self, filepath, start, usecols):
+        """Parse complete rows from a byte offset (None for the first row) to the end
+        
+        Returns the rows and the offset just past the last complete one.
+        """
+        with open(filepath, 'rb') as f:
+            if start is None:
+                f.readline()
+                start = f.tell()
+            f.seek(start)
+            chunk = f.read()
+        
+        chunk = chunk[:chunk.rfind(b'\n') + 1]
+        if not chunk:
+            return pd.DataFrame(columns=usecols or CSV_HEADERS), start
+        df = pd.read_csv(io.BytesIO(chunk), header=None, names=CSV_HEADERS, usecols=usecols)
+        return df, start + len(chunk)
+    
+    def last_candle(self, symbol, timeframe):
+        """Parse only the last row of the stream's CSV file"""
+        filepath = self.get_filepath(symbol, timeframe)
+        if self.write_behind:
+            self.flush(symbol, timeframe)
+        
+        if not os.path.isfile(filepath):
+            # Just rotated: the newest candle is in the last segment
+            return self._last_segment_candle(symbol, timeframe)
+        
+        # Rows are short, so the last one fits in the final few kilobytes
+        with open(filepath, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 4096))
+            lines = f.read().decode('ascii', errors='replace').splitlines()
+        
+        rows = [row for row in csv.reader(lines[-2:]) if row and row[0] != 'datetime']
+        if not rows or len(rows[-1]) != len(CSV_HEADERS):
+            return None
+        
+        candle = dict(zip(CSV_HEADERS, rows[-1]))
+        for field in ('open', 'high', 'low', 'close'):
+            candle[field] = float(candle[field])
+        candle['volume'] = int(float(candle['volume']))
+        return candle
+    
+    def _read_window(self, filepath, window, usecols):
+        """Parse only the rows between two byte offsets of a CSV file"""
+        start_offset, end_offset = window
+        with open(filepath, 'rb') as f:
+            f.seek(start_offset)
+            chunk = f.read() if end_offset is None else f.read(end_offset - start_offset)
+        
+        if not chunk:
+            return pd.DataFrame(columns=usecols or CSV_HEADERS)
+        
+        return pd.read_csv(io.BytesIO(chunk), header=None, names=CSV_HEADERS, usecols=usecols)
+    
+    def list_files(self):
+        files = []
+        for filename in os.listdir(self.data_dir):
+            if filename.endswith('.csv'):
+                info = describe_file(os.path.join(self.data_dir, filename), filename)
+                if info is not None:
+                    files.append(info)
+        return files
+    
+    def file_info(self, symbol, timeframe):
+        filepath = self.get_filepath(symbol, timeframe)
+        if not os.path.isfile(filepath):
+            return None
+        return describe_file(filepath, os.path.basename(filepath))
+    
+    def stream_stats(self, symbol, timeframe, previous=None):
+        """Stats of the active file plus its segments
+        
+        The active file's own stats are kept under 'active' so the next call
+        can continue counting where this one stopped.
+        """
+        active = self._active_stats(symbol, timeframe, previous.get('active') if previous else None)
+        stats = dict(self._segment_totals(symbol, timeframe, active))
+        stats['active'] = active
+        return stats
+    
+    def _active_stats(self, symbol, timeframe, previous=None):
+        """Count rows by newlines, scanning only bytes appended since previous"""
+        filepath = self.get_filepath(symbol, timeframe)
+        if not os.path.isfile(filepath):
+            return {'rows': 0, 'first': None, 'last': None, 'scanned_size': 0, 'inode': None}
+        
+        stat = os.stat(filepath)
+        size = stat.st_size
+        start, newlines, first = 0, 0, None
+        if (previous and previous.get('scanned_size') is not None and previous['scanned_size'] <= size
+                and previous.get('inode') == stat.st_ino):
+            # The file only grew, so the rows seen before are still there
+            start, newlines, first = previous['scanned_size'], previous['rows'] + 1, previous['first']
+        
+        with open(filepath, 'rb') as f:
+            if start == 0:
+                f.readline()
+                first_row = f.readline()
+                if first_row.endswith(b'\n'):
+                    first = first_row[:19].decode('ascii')
+            
+            f.seek(start)
+            while True:
+                chunk = f.read(1 << 20)
+                if not chunk:
+                    break
+                newlines += chunk.count(b'\n')
+            
+            # Datetime of the last complete row
+            last = None
+            if newlines > 1:
+                f.seek(max(0, size - 4096))
+                lines = f.read().split(b'\n')
+                if len(lines) >= 2 and lines[-2] and not lines[-2].startswith(b'datetime'):
+                    last = lines[-2][:19].decode('ascii')
+        
+        # The header is the first line
+        return {'rows': max(0, newlines - 1), 'first': first, 'last': last, 'scanned_size': size,
+                'inode': stat.st_ino}
+    
+    def _first_time(self, symbol, timeframe):
+        filepath = self.get_filepath(symbol, timeframe)
+        if not os.path.isfile(filepath):
+            return None
+        with open(filepath, 'rb') as f:
+            f.readline()
+            first_row = f.readline()
+        return first_row[:19].decode('ascii') if len(first_row) > 19 else None
+    
+    def _after_seal(self, symbol, timeframe):
+        # The moved file's index no longer describes the active path
+        with self.indexes_lock:
+            self.indexes.pop((symbol, timeframe), None)
+        index_path = self.get_filepath(symbol, timeframe) + '.idx'
+        if os.path.isfile(index_path):
+            os.remove(index_path)
+    
+    def _write_segment(self, path, rows):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADERS)
+            writer.writerows(rows)
+    
+    def _compress_segment(self, raw_path):
+        with open(raw_path, 'rb') as f:
+            data = f.read()
+        payload, suffix = compress_bytes(data, self.compression)
+        
+        # Write to a temporary name first so readers never see a partial file
+        tmp_path = raw_path + suffix + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, raw_path + suffix)
+        os.remove(raw_path)
+        logger.info(f"Compressed {os.path.basename(raw_path)}: {len(data)} -> {len(payload)} bytes")
+
+def create_storage(backend, data_dir, **options):
+    """Create a storage backend by name ('csv', 'parquet', 'binary' or 'sql')
+    
+    read_only=True is for processes that only read files another process
+    writes.
+    """
+    read_only = options.pop('read_only', False)
+    if backend == 'csv':
+        return CSVStorage(data_dir, read_only=read_only, **options)
+    
+    if backend == 'parquet':
+        # Imported lazily so pyarrow is only needed when this backend is used
+        from parquet_storage import ParquetStorage
+        options.pop('write_behind', None)
+        return ParquetStorage(data_dir, **options)
+    
+    if backend == 'binary':
+        from binary_storage import BinaryStorage
+        return BinaryStorage(data_dir, **options)
+    
+    if backend == 'sql':
+        from sql_storage import SQLStorage
+        return SQLStorage(data_dir, **options)
+    
+    raise ValueError(f"Unknown storage backend: {backend}")
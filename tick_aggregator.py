@@ -0,0 +1,137 @@
+import os
+import logging
+import threading
+import numpy as np
+
+from mt5_connector import next_boundary, previous_boundary, format_bar_time
+
+# Configure logging
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+class Bar:
+    """Mutable OHLCV bar that is reused across periods to avoid allocation"""
+    
+    __slots__ = ('timeframe', 'tf_minutes', 'start', 'end', 'open', 'high', 'low', 'close', 'volume')
+    
+    def __init__(self, timeframe, tf_minutes):
+        self.timeframe = timeframe
+        self.tf_minutes = tf_minutes
+        # No period yet: the first tick always rolls the bar over
+        self.start = None
+        self.end = float('-inf')
+        self.open = self.high = self.low = self.close = 0.0
+        self.volume = 0
+    
+    def roll(self, timestamp, price, volume=1):
+        """Start the period containing timestamp with its first price"""
+        self.end = next_boundary(timestamp, self.tf_minutes)
+        self.start = previous_boundary(self.end, self.tf_minutes)
+        self.open = self.high = self.low = self.close = price
+        self.volume = volume
+
+class TickAggregator:
+    """Builds OHLCV bars for several timeframes from one symbol's ticks
+    
+    on_bar(symbol, bar) is called with the finished Bar whenever a tick
+    arrives past its period; the object is reused afterwards, so the
+    callback must copy what it needs. Volume is the tick count, as for MT5
+    tick volume. Ticks are expected in time order; a late tick is folded
+    into the current bar.
+    """
+    
+    def __init__(self, symbol, timeframes, on_bar):
+        self.symbol = symbol
+        self.on_bar = on_bar
+        self.bars = [Bar(timeframe, tf_minutes) for timeframe, tf_minutes in timeframes.items()]
+    
+    def on_tick(self, timestamp, price):
+        """Fold one tick (unix seconds, price) into every timeframe"""
+        for bar in self.bars:
+            if timestamp >= bar.end:
+                if bar.volume:
+                    self.on_bar(self.symbol, bar)
+                bar.roll(timestamp, price)
+                continue
+            
+            if price > bar.high:
+                bar.high = price
+            elif price < bar.low:
+                bar.low = price
+            bar.close = price
+            bar.volume += 1
+    
+    def on_ticks(self, timestamps, prices):
+        """Fold a time-ordered batch of ticks given as NumPy arrays
+        
+        Each bar period inside the batch is reduced with one vectorized
+        max/min instead of a Python step per tick.
+        """
+        count = len(timestamps)
+        for bar in self.bars:
+            i = 0
+            while i < count:
+                if timestamps[i] >= bar.end:
+                    if bar.volume:
+                        self.on_bar(self.symbol, bar)
+                    bar.roll(timestamps[i], prices[i], 0)
+                
+                # Ticks up to the end of the current period
+                j = i + int(np.searchsorted(timestamps[i:], bar.end, side='left'))
+                segment = prices[i:j]
+                high = segment.max()
+                low = segment.min()
+                if high > bar.high:
+                    bar.high = high
+                if low < bar.low:
+                    bar.low = low
+                bar.close = segment[-1]
+                bar.volume += j - i
+                i = j
+
+class TickRecorder:
+    """Stores a symbol's raw ticks and saves the bars aggregated from them
+    
+    Only finished bars are saved. The bars still open when recording stops
+    are dropped rather than saved partial: candles have no partial flag, so
+    a restart within the same period would store a second bar at the same
+    time. Their ticks are in the tick store, so they can be rebuilt.
+    """
+    
+    def __init__(self, symbol, timeframes, data_manager):
+        self.symbol = symbol
+        self.timeframes = list(timeframes)
+        self.data_manager = data_manager
+        self.ticks_recorded = 0
+        self.lock = threading.Lock()
+        
+        # Bars are built from the bid price, like MT5 charts
+        self.aggregator = TickAggregator(symbol, timeframes, self._save_bar)
+    
+    def on_tick(self, symbol, time_ms, bid, ask):
+        """Tick stream callback"""
+        with self.lock:
+            self.data_manager.save_tick(symbol, time_ms, bid, ask)
+            self.aggregator.on_tick(time_ms / 1000.0, bid)
+            self.ticks_recorded += 1
+    
+    def _save_bar(self, symbol, bar):
+        """Save a finished bar through the data manager"""
+        candle_data = {
+            'datetime': format_bar_time(bar.start),
+            'symbol': symbol,
+            'timeframe': bar.timeframe,
+            'open': round(float(bar.open), 5),
+            'high': round(float(bar.high), 5),
+            'low': round(float(bar.low), 5),
+            'close': round(float(bar.close), 5),
+            'volume': int(bar.volume)
+        }
+        self.data_manager.save_candle(symbol, bar.timeframe, candle_data)
+    
+    def to_dict(self):
+        return {
+            'symbol': self.symbol,
+            'timeframes': self.timeframes,
+            'ticks_recorded': self.ticks_recorded
+        }